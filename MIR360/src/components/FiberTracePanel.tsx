@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import api from "../api/client";
 
 type TraceInfo = {
@@ -16,6 +16,27 @@ export default function FiberTracePanel({ onHighlight, onClear }: FiberTracePane
   const [value, setValue] = useState("");
   const [info, setInfo] = useState<TraceInfo | null>(null);
   const [loading, setLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState<string[]>([]);
+
+  // Autocompletado de ids (GET /search)
+  useEffect(() => {
+    const q = value.trim();
+    if (q.length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const kinds = mode === "fiber" ? "filament" : "odf_port";
+    const t = setTimeout(async () => {
+      try {
+        const res = await api.get("/search", { params: { q, kinds, limit: 10 } });
+        const items: { id: string }[] = res?.data?.items ?? [];
+        setSuggestions(items.map((it) => it.id));
+      } catch {
+        setSuggestions([]);
+      }
+    }, 150);
+    return () => clearTimeout(t);
+  }, [value, mode]);
 
   const doTrace = async () => {
     if (!value) return;
@@ -64,8 +85,14 @@ export default function FiberTracePanel({ onHighlight, onClear }: FiberTracePane
           className="select"
           placeholder={mode === "fiber" ? "F-..." : "OP-..."}
           value={value}
+          list="fiber-trace-suggestions"
           onChange={(e) => setValue(e.target.value)}
         />
+        <datalist id="fiber-trace-suggestions">
+          {suggestions.map((id) => (
+            <option key={id} value={id} />
+          ))}
+        </datalist>
       </div>
 
       <div style={{ display: "flex", gap: 8, marginTop: 8 }}>
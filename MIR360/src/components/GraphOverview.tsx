@@ -106,6 +106,41 @@ export default function GraphOverview({ onSelect, onOpenRoute }: GraphOverviewPr
     loadOverview();
   }, []);
 
+  // Cambios de otros usuarios (SSE): parchear posiciones sin recargar todo
+  useEffect(() => {
+    const base = import.meta.env.VITE_API_BASE ?? "";
+    const es = new EventSource(`${base}/events/stream`);
+
+    const reload = async () => {
+      try {
+        const response = await api.get("/graph/overview");
+        setGraph(response.data);
+      } catch (e) {
+        console.error("GET /graph/overview error:", e);
+      }
+    };
+
+    es.addEventListener("positions", (ev) => {
+      const delta = JSON.parse((ev as MessageEvent).data) as {
+        items?: { node_id: string; x: number; y: number }[];
+      };
+      const byId = new Map((delta.items ?? []).map((it) => [it.node_id, it]));
+      if (!byId.size) return;
+      setGraph((g) => ({
+        ...g,
+        nodes: (g.nodes ?? []).map((n) => {
+          const p = byId.get(n.id);
+          return p ? { ...n, x: p.x, y: p.y } : n;
+        }),
+      }));
+    });
+    es.addEventListener("positions_cleared", reload);
+    es.addEventListener("topology", reload);
+    es.addEventListener("resync", reload);
+
+    return () => es.close();
+  }, []);
+
   // Adaptar data del backend al formato de vis-network
   const data = useMemo(() => {
     const nodes = (graph.nodes || []).map((n) => {
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+
+from core.changefeed import feed
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+HEARTBEAT_S = 15.0
+
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    last_event_id: str | None = Header(default=None),
+):
+    """
+    Server-Sent Events con deltas de posiciones y cambios de topología.
+
+    Eventos:
+        positions         {version, items: [{node_id, x, y}]}
+        positions_cleared {version}
+        topology          {version, topology_version, reason}
+        resync            el cliente debe recargar /graph/overview
+
+    Los ids de los eventos son "<epoch>:<version>"; un Last-Event-ID de otro
+    worker o de antes de un reinicio recibe un resync.
+    """
+    sub = feed.subscribe(last_event_id)
+
+    async def gen():
+        try:
+            # versión actual para que el cliente sepa desde dónde escucha
+            hello = {"version": feed.version, "epoch": feed.epoch, "cursor": feed.cursor()}
+            yield f"event: hello\ndata: {json.dumps(hello, separators=(',', ':'))}\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield frame
+                if sub.overflowed and sub.queue.empty():
+                    # ya mandamos el resync; cerramos para que reconecte
+                    break
+        finally:
+            feed.unsubscribe(sub)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/version")
+def events_version():
+    return {
+        "version": feed.version,
+        "epoch": feed.epoch,
+        "cursor": feed.cursor(),
+        "topology_version": feed.topology_version,
+        "subscribers": feed.subscriber_count,
+    }
@@ -0,0 +1,82 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from core.changefeed import feed
+from core.db import fetch_all
+from core.export import LAYERS, ExportFilter, geojson_chunks, kml_chunks, parse_bbox
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+def _filter(
+    route_id: Optional[str], cable_id: Optional[str], bbox: Optional[str], layers: Optional[str]
+):
+    selected = [x.strip() for x in (layers or "").split(",") if x.strip()] or list(LAYERS)
+    invalid = [x for x in selected if x not in LAYERS]
+    if invalid:
+        raise HTTPException(400, f"INVALID_LAYER: {','.join(invalid)} (usar {','.join(LAYERS)})")
+    box = None
+    if bbox:
+        try:
+            box = parse_bbox(bbox)
+        except ValueError as e:
+            raise HTTPException(400, f"INVALID_BBOX: {e}")
+    # Se valida antes de empezar a transmitir: después ya no hay status code
+    try:
+        if route_id is not None and not fetch_all(
+            "SELECT id FROM dbo.odf_route WHERE id = :rid", rid=route_id
+        ):
+            raise HTTPException(404, f"ROUTE_NOT_FOUND: {route_id}")
+        if cable_id is not None and not fetch_all(
+            "SELECT id FROM dbo.cable WHERE id = :cid", cid=cable_id
+        ):
+            raise HTTPException(404, f"CABLE_NOT_FOUND: {cable_id}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_EXPORT: {e}")
+    return ExportFilter(route_id, cable_id, box), [x for x in LAYERS if x in selected]
+
+
+def _headers(filename: str) -> dict:
+    return {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Topology-Version": str(feed.topology_version),
+    }
+
+
+# ENDPOINTS
+# Postes, mufas y nodos como puntos; spans como LineString entre sus postes.
+# Se transmite mientras se lee (cursor del lado del servidor), sin armar
+# la colección completa en memoria.
+@router.get("/geojson")
+def export_geojson(
+    route_id: Optional[str] = None,
+    cable_id: Optional[str] = None,
+    bbox: Optional[str] = None,  # min_lon,min_lat,max_lon,max_lat
+    layers: Optional[str] = None,  # nodos,poles,mufas,spans (vacío = todas)
+):
+    f, selected = _filter(route_id, cable_id, bbox, layers)
+    meta = {"topology_version": feed.topology_version, "filters": f.as_dict(), "layers": selected}
+    return StreamingResponse(
+        geojson_chunks(f, selected, meta),
+        media_type="application/geo+json",
+        headers=_headers("mir.geojson"),
+    )
+
+
+@router.get("/kml")
+def export_kml(
+    route_id: Optional[str] = None,
+    cable_id: Optional[str] = None,
+    bbox: Optional[str] = None,
+    layers: Optional[str] = None,
+):
+    f, selected = _filter(route_id, cable_id, bbox, layers)
+    return StreamingResponse(
+        kml_chunks(f, selected),
+        media_type="application/vnd.google-earth.kml+xml",
+        headers=_headers("mir.kml"),
+    )
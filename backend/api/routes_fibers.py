@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
 from core.db import fetch_all
+from core.loss_budget import Coefficients, LossModel, coefficients, loss_model
+from core.responses import FastJSONResponse
+from typing import List, Optional
 
 router = APIRouter(prefix="/fibers", tags=["fibers"])
 
@@ -50,3 +54,128 @@ def fiber_endpoints(fiber_id: str):
         fid=fiber_id,
     )
     return {"fiber_id": fiber_id, "endpoints": rows}
+
+
+# PRESUPUESTO ÓPTICO (core.loss_budget)
+# Coeficientes por request (opcionales, pisan los de settings):
+#   db_per_km=SM=0.3,MM=2.5  splice_db=0.05  connector_db=0.3  budget_db=25
+def _coef(
+    db_per_km: Optional[str],
+    splice_db: Optional[float],
+    connector_db: Optional[float],
+    budget_db: Optional[float],
+) -> Coefficients:
+    try:
+        return coefficients(db_per_km, splice_db, connector_db, budget_db)
+    except ValueError as e:
+        raise HTTPException(400, f"INVALID_COEFFICIENTS: {e}")
+
+
+def _loss_model() -> LossModel:
+    try:
+        return loss_model.get()
+    except Exception as e:
+        raise HTTPException(500, f"LOSS_BUDGET_ERROR: {e}")
+
+
+@router.get("/{fiber_id}/loss-budget", response_class=FastJSONResponse)
+def fiber_loss_budget(
+    fiber_id: str,
+    db_per_km: Optional[str] = None,
+    splice_db: Optional[float] = None,
+    connector_db: Optional[float] = None,
+    budget_db: Optional[float] = None,
+):
+    """Presupuesto del trazado del hilo, con el detalle hilo a hilo."""
+    coef = _coef(db_per_km, splice_db, connector_db, budget_db)
+    model = _loss_model()
+    sel = model.index([fiber_id])
+    if not len(sel):
+        raise HTTPException(404, f"FIBER_NOT_FOUND: {fiber_id}")
+    return FastJSONResponse(model.trace(int(sel[0]), coef))
+
+
+class FiberIds(BaseModel):
+    fiber_ids: List[str]
+
+
+# Muchos hilos en una sola llamada
+@router.post("/loss-budget", response_class=FastJSONResponse)
+def fibers_loss_budget(
+    body: FiberIds,
+    db_per_km: Optional[str] = None,
+    splice_db: Optional[float] = None,
+    connector_db: Optional[float] = None,
+    budget_db: Optional[float] = None,
+):
+    coef = _coef(db_per_km, splice_db, connector_db, budget_db)
+    model = _loss_model()
+    wanted = list(dict.fromkeys(body.fiber_ids))
+    sel = model.index(wanted)
+    items = model.items(sel, coef)
+    found = {it["fiber_filament_id"] for it in items}
+    return FastJSONResponse(
+        {
+            "summary": model.summary(items),
+            "coefficients": coef.as_dict(),
+            "items": items,
+            "missing": [f for f in wanted if f not in found],
+        }
+    )
+
+
+# Todos los hilos de un cable
+@router.get("/loss-budget/cables/{cable_id}", response_class=FastJSONResponse)
+def cable_loss_budget(
+    cable_id: str,
+    only_failing: bool = False,
+    db_per_km: Optional[str] = None,
+    splice_db: Optional[float] = None,
+    connector_db: Optional[float] = None,
+    budget_db: Optional[float] = None,
+):
+    coef = _coef(db_per_km, splice_db, connector_db, budget_db)
+    model = _loss_model()
+    sel = model.cable_filaments(cable_id)
+    if not len(sel):
+        raise HTTPException(404, f"CABLE_NOT_FOUND: {cable_id}")
+    items = model.items(sel, coef)
+    summary = model.summary(items)
+    if only_failing:
+        items = [it for it in items if not it["closes"]]
+    return FastJSONResponse(
+        {"cable_id": cable_id, "summary": summary, "coefficients": coef.as_dict(), "items": items}
+    )
+
+
+# Todos los hilos conectorizados en los puertos de un ODF
+@router.get("/loss-budget/odfs/{odf_id}", response_class=FastJSONResponse)
+def odf_loss_budget(
+    odf_id: str,
+    only_failing: bool = False,
+    db_per_km: Optional[str] = None,
+    splice_db: Optional[float] = None,
+    connector_db: Optional[float] = None,
+    budget_db: Optional[float] = None,
+):
+    coef = _coef(db_per_km, splice_db, connector_db, budget_db)
+    model = _loss_model()
+    ports = model.odf_ports(odf_id)
+    if not len(ports):
+        # ODF sin hilos conectorizados (200 vacío) o inexistente (404)
+        try:
+            exists = fetch_all("SELECT id FROM dbo.odf WHERE id = :oid", oid=odf_id)
+        except Exception as e:
+            raise HTTPException(500, f"DB_ERROR_LOSS_BUDGET: {e}")
+        if not exists:
+            raise HTTPException(404, f"ODF_NOT_FOUND: {odf_id}")
+    items = model.items(model.port_fil[ports], coef)
+    for it, port in zip(items, model.port_ids[ports].tolist()):
+        it["odf_port_id"] = port
+    items.sort(key=lambda it: it["odf_port_id"])
+    summary = model.summary(items)
+    if only_failing:
+        items = [it for it in items if not it["closes"]]
+    return FastJSONResponse(
+        {"odf_id": odf_id, "summary": summary, "coefficients": coef.as_dict(), "items": items}
+    )
@@ -1,27 +1,41 @@
-from fastapi import APIRouter, HTTPException
-from core.db import fetch_all
-from math import cos, sin
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from core.artifacts import ArtifactStore, accepted_encoding
+from core.changefeed import feed
+from core.config import settings
+from core.snapshot import store
+from core.tables import load_table
+from core.geo_layout import geo_layout_graph
+from core.graph_assembly import assemble_overview
+from core.graph_model import CompactGraph
+from core.history import GraphSnapshot, SnapshotHistory
+from core.materialized import backbone_edges
+from core.offload import offload
+from core.responses import FastJSONResponse, dumps, slim_graph
+from core.singleflight import coalesce
+from core.timing import active as timing_active, lap, mark
 from datetime import datetime
-from typing import Dict, Tuple, List
-from collections import defaultdict
-from core.util import _angle_from_id
+from typing import Dict, Tuple, List, Optional
+import time
 
 router = APIRouter(prefix="/graph", tags=["graph"])
 
 USE_UNIFIED_VIEWS_FOR_FULL = True
 
+_overview_history = SnapshotHistory(settings.OVERVIEW_HISTORY_SIZE)
+
+# Overview completo pre-armado en disco, por variante "layout[-slim]"
+overview_artifacts = ArtifactStore(
+    "overview", settings.OVERVIEW_ARTIFACT_DIR, settings.OVERVIEW_ARTIFACT_KEEP, feed.epoch
+)
+
 
 def _load_positions_map() -> Dict[str, Tuple[float, float]]:
     """
-    Lee posiciones guardadas en dbo.graph_node_position.
+    Lee posiciones guardadas en dbo.graph_node_position (o del snapshot).
     """
     try:
-        rows = fetch_all(
-            """
-            SELECT node_id, x, y
-            FROM dbo.graph_node_position
-            """
-        )
+        rows = load_table("graph_node_position")
         out: Dict[str, Tuple[float, float]] = {}
         for r in rows:
             nid = r.get("node_id")
@@ -34,268 +48,202 @@ def _load_positions_map() -> Dict[str, Tuple[float, float]]:
         return {}
 
 
-@router.get("/overview")
-def get_nodes_overview():
+@router.get("/overview", response_class=FastJSONResponse)
+def get_nodes_overview(
+    request: Request,
+    since: Optional[str] = None,
+    slim: bool = False,
+    layout: str = Query("default", pattern="^(default|geo)$"),
+):
+    """
+    Overview de nodos y rutas. `meta.version` es monotónica dentro del
+    proceso y `meta.cursor` ("<epoch>:<version>") la identifica entre
+    workers y reinicios; con `?since=<cursor>` se devuelven sólo los
+    nodos/aristas agregados, modificados o eliminados desde esa versión.
+    Si el cursor es de otro epoch (otro worker, proceso anterior) o la
+    versión ya salió del historial se devuelve el payload completo
+    (`meta.mode = "full"`).
+    Con `?slim=1` se omiten en `meta` los campos repetidos del nodo/arista.
+    Con `?layout=geo` x/y salen de la proyección de gps_lat/gps_lon.
+
+    El payload completo de la versión vigente se sirve del artefacto
+    pre-comprimido en disco (gzip/br según Accept-Encoding, con ETag),
+    salvo con `?debug_timing=1`, que arma el payload para medir sus etapas.
+    """
+    since_version = feed.parse_cursor(since)
+    if since_version is None:
+        response = _artifact_response(request, layout, slim)
+        if response is not None:
+            return response
+    return FastJSONResponse(_overview_payload(since_version, slim, layout))
+
+
+def _artifact_variants() -> List[Tuple[str, str, bool]]:
+    """OVERVIEW_ARTIFACT_VARIANTS -> [(variante, layout, slim)]."""
+    out = []
+    for v in settings.OVERVIEW_ARTIFACT_VARIANTS.split(","):
+        v = v.strip()
+        if v:
+            layout, _, suffix = v.partition("-")
+            out.append((v, layout, suffix == "slim"))
+    return out
+
+
+def _artifact_response(request: Request, layout: str, slim: bool) -> Optional[Response]:
+    if not overview_artifacts.enabled or timing_active():
+        return None
+    art = overview_artifacts.get(f"{layout}-slim" if slim else layout, feed.version)
+    if art is None or (art.from_snapshot and not store.active()):
+        overview_artifacts.fallbacks += 1
+        return None
+    enc = accepted_encoding(request.headers.get("accept-encoding", ""), art.files)
+    if enc is None:
+        overview_artifacts.fallbacks += 1
+        return None
+    etag = art.etag(enc)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        overview_artifacts.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    overview_artifacts.served += 1
+    return FileResponse(
+        art.files[enc],
+        media_type="application/json",
+        headers={**headers, "Content-Encoding": enc},
+    )
+
+
+def build_overview_artifacts():
     """
-    Las demás rutas se dibujan como enlaces directos:
-        from_nodo -> to_nodo
+    Publica en disco el overview de la versión vigente (hilo de
+    core.artifacts). _current_overview también re-chequea la BD al vencer
+    OVERVIEW_CACHE_TTL_S, así los cambios hechos por fuera se publican igual.
     """
+    for variant, layout, slim in _artifact_variants():
+        if overview_artifacts.get(variant, _current_overview().version) is not None:
+            continue
+        payload = _overview_payload(None, slim, layout)
+        meta = payload["meta"]
+        overview_artifacts.publish(meta["version"], variant, dumps(payload), meta["from_snapshot"])
+
+
+@coalesce("overview")
+def _overview_payload(since: Optional[int], slim: bool, layout: str = "default") -> dict:
+    snap = _current_overview()
+    meta = {
+        "generated_at": snap.generated_at,
+        "source": "overview:nodos+backbone",
+        "version": snap.version,
+        "epoch": feed.epoch,
+        "cursor": feed.cursor(snap.version),
+        "from_snapshot": snap.from_snapshot,
+        "layout": layout,
+    }
+    geo = _geo_graph(snap) if layout == "geo" else None
+    if since is not None:
+        delta = _overview_history.diff(since, snap, geo)
+        if delta is not None:
+            meta.update(mode="delta", since=feed.cursor(since))
+            payload = {**delta, "meta": meta}
+            return slim_graph(payload) if slim else payload
+    meta["mode"] = "full"
+    payload = {
+        "nodes": (geo if geo is not None else snap.graph).node_dicts(),
+        "edges": snap.edge_dicts(),
+        "meta": meta,
+    }
+    return slim_graph(payload) if slim else payload
+
+
+_geo_cache: Tuple[Optional[GraphSnapshot], Optional[CompactGraph]] = (None, None)
+
+
+def _geo_graph(snap: GraphSnapshot) -> CompactGraph:
+    """Grafo del snapshot con layout geográfico (calculado una vez por snapshot)."""
+    global _geo_cache
+    cached_snap, graph = _geo_cache
+    if cached_snap is not snap or graph is None:
+        graph = geo_layout_graph(snap.graph)
+        _geo_cache = (snap, graph)
+    return graph
+
+
+def warm_overview():
+    """Arma el overview vigente; lo usa el refresco del snapshot de arranque."""
+    # sin coalescer: no debe sumarse a un armado en curso desde el snapshot
+    _current_overview.__wrapped__()
 
+
+@coalesce("overview_snapshot")
+def _current_overview() -> GraphSnapshot:
+    """
+    Snapshot del overview para la versión actual del feed. Se reutiliza
+    mientras la versión no cambie y no pase OVERVIEW_CACHE_TTL_S; al
+    reconstruir por TTL, si el contenido cambió (edición directa en BD) se
+    sube la versión para que los clientes lo vean como un cambio más.
+    Un snapshot armado desde el archivo de arranque se descarta en cuanto
+    se vuelve a leer de la BD.
+    """
+    latest = _overview_history.latest()
+    version = feed.version
+    if (
+        latest is not None
+        and latest.version == version
+        and time.monotonic() - latest.built_at < settings.OVERVIEW_CACHE_TTL_S
+        and (not latest.from_snapshot or store.active())
+    ):
+        return latest
+
+    nodes, edges = _build_overview()
+    snap = GraphSnapshot(
+        version,
+        nodes,
+        edges,
+        datetime.utcnow().isoformat() + "Z",
+        store.active(),
+        _overview_history.interner(),
+    )
+    if latest is not None and latest.version == version and not snap.same_content(latest):
+        snap.version = feed.bump_topology("overview_changed")
+    _overview_history.push(snap)
+    return snap
+
+
+def _build_overview() -> Tuple[List[dict], List[dict]]:
+    """
+    Lee las filas del overview y delega el armado en
+    core.graph_assembly.assemble_overview (inline o en un proceso aparte).
+    """
+
+    mark()
     try:
         # 1) NODOS físicos
-        nodes_rows = fetch_all(
-            """
-            SELECT
-                CAST(id AS NVARCHAR(200)) AS id,
-                name AS label,
-                code,
-                type,
-                reference,
-                gps_lat,
-                gps_lon
-            FROM dbo.nodo;
-            """
-        )
-
-        # 2) Rutas NODO-NODO (sin mufas)
-        routes_rows = fetch_all(
-            """
-            SELECT
-                route_id,
-                CAST(from_nodo_id AS NVARCHAR(200)) AS from_nodo_id,
-                CAST(to_nodo_id   AS NVARCHAR(200)) AS to_nodo_id,
-                path_text
-            FROM dbo.vw_backbone_edges;
-            """
-        )
+        nodes_rows = load_table("nodo")
+        lap("nodo")
+
+        # 2) Rutas NODO-NODO (sin mufas), copia materializada
+        routes_rows = backbone_edges.all_rows()
+        lap("backbone_edges")
 
         # 3) Mufas por ruta (usando spans de la ruta + mufa.pole_id)
         # Para cada route_id, obtenemos TODAS las mufas en su recorrido.
-        route_mufa_rows = fetch_all(
-            """
-            SELECT DISTINCT
-                ors.odf_route_id      AS route_id,
-                m.id                  AS mufa_id,
-                m.code                AS mufa_code
-            FROM dbo.odf_route_segment ors
-            JOIN dbo.cable_span cs
-                ON cs.id = ors.cable_span_id
-            JOIN dbo.mufa m
-                ON m.pole_id IN (cs.from_pole_id, cs.to_pole_id);
-            """
-        )
+        route_mufa_rows = load_table("route_mufas")
+        lap("route_mufas")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"BD_ERROR_OVERVIEW: {e}")
 
     pos_map = _load_positions_map()
-
-    # --------------------------------------------------
-    # NODOS BASE: NODOS FÍSICOS (tabla nodo)
-    # --------------------------------------------------
-    vis_nodes: List[dict] = []
-    R = 350.0
-
-    for n in nodes_rows:
-        nid = n["id"]
-        if nid in pos_map:
-            x, y = pos_map[nid]
-            fixed_xy = True
-        else:
-            # Layout circular determinístico por id
-            a = _angle_from_id(nid)
-            x, y = R * cos(a), R * sin(a)
-            fixed_xy = True
-
-        ref = n.get("reference") or n.get("nodo_reference")
-        gps_lat = n.get("gps_lat")
-        gps_lon = n.get("gps_lon")
-
-        vis_nodes.append(
-            {
-                "id": nid,
-                "label": n.get("label") or nid,
-                "group": "nodo",
-                "kind": "NODO",
-                "reference": ref,
-                "tipo": n.get("type"),
-                "gps_lat": gps_lat,
-                "gps_lon": gps_lon,
-                "meta": {
-                    "reference": ref,
-                    "tipo": n.get("type"),
-                    "gps_lat": gps_lat,
-                    "gps_lon": gps_lon,
-                    "nodo_code": n.get("code"),
-                },
-                "x": float(x),
-                "y": float(y),
-                "fixed": {"x": fixed_xy, "y": fixed_xy},
-            }
-        )
-
-    existing_node_ids = {n["id"] for n in vis_nodes}
-
-    # route_id -> (from_nodo_id, to_nodo_id, path_text)
-    route_map: Dict[str, dict] = {}
-    for r in routes_rows:
-        route_map[str(r["route_id"])] = {
-            "from": r["from_nodo_id"],
-            "to": r["to_nodo_id"],
-            "path_text": r.get("path_text"),
-        }
-
-    # route_id -> lista de mufas (id, code)
-    route_mufas: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
-    for rm in route_mufa_rows:
-        rid = str(rm["route_id"])
-        if rid not in route_map:
-            # Ruta física que no está en el summary de backbone (poco probable, pero robustez)
-            continue
-        mid = str(rm["mufa_id"])
-        mcode = rm.get("mufa_code") or mid
-        # evitamos duplicados por ruta+mufa
-        if not any(m[0] == mid for m in route_mufas[rid]):
-            route_mufas[rid].append((mid, mcode))
-
-    # (from_nodo_id, mufa_id) -> set(to_nodo_id)
-    from_mufa_to_dests: Dict[Tuple[str, str], set] = defaultdict(set)
-    # (from_nodo_id, mufa_id) -> lista de route_ids que pasan por esa mufa
-    from_mufa_to_routes: Dict[Tuple[str, str], List[str]] = defaultdict(list)
-    # mufa_id -> code (para labels)
-    mufa_code_map: Dict[str, str] = {}
-
-    for rid, info in route_map.items():
-        from_id = info["from"]
-        to_id = info["to"]
-        mufas_this_route = route_mufas.get(rid, [])
-        for mufa_id, mufa_code in mufas_this_route:
-            key = (from_id, mufa_id)
-            from_mufa_to_dests[key].add(to_id)
-            if rid not in from_mufa_to_routes[key]:
-                from_mufa_to_routes[key].append(rid)
-            if mufa_id not in mufa_code_map:
-                mufa_code_map[mufa_id] = mufa_code
-
-    # Determinamos qué (from_nodo, mufa) son realmente splitters:
-    #   - si tiene 2+ destinos distintos, es splitter
-    splitter_keys = {
-        key for key, dests in from_mufa_to_dests.items() if len(dests) >= 2
-    }
-
-    # Rutas que están en algún grupo con split
-    routes_in_split: set = set()
-    for key in splitter_keys:
-        for rid in from_mufa_to_routes[key]:
-            routes_in_split.add(rid)
-
-    # Conjunto de todas las rutas
-    all_route_ids = set(route_map.keys())
-    # Rutas normales = no participan en splits
-    normal_route_ids = all_route_ids - routes_in_split
-
-    # CONSTRUCCIÓN DE ARISTAS PARA vis-network
-    vis_edges: List[dict] = []
-
-    # 1) Rutas normales: NODO -> NODO directo
-    for rid in sorted(normal_route_ids):
-        info = route_map[rid]
-        vis_edges.append(
-            {
-                "id": rid,
-                "from": info["from"],
-                "to": info["to"],
-                "title": info.get("path_text"),
-                "edge_kind": "NODO_LINK",
-                "meta": {"route_id": rid},
-            }
-        )
-
-    # 2) Rutas con MUFA_SPLIT
-    # Organizamos las mufas alrededor del nodo origen
-    per_from_counter: Dict[str, int] = defaultdict(int)
-
-    for from_id, mufa_id in splitter_keys:
-        # rutas que usan este splitter
-        rids = from_mufa_to_routes[(from_id, mufa_id)]
-        dests = {route_map[rid]["to"] for rid in rids}
-
-        # Nodo MUFA virtual por (from_nodo, mufa)
-        mufa_node_id = f"MUFA_OV_{from_id}_{mufa_id}"
-        if mufa_node_id not in existing_node_ids:
-            idx_for_from = per_from_counter[from_id]
-            per_from_counter[from_id] += 1
-
-            # Buscamos la posición del nodo origen para colocar la mufa cerca
-            base_node = next((n for n in vis_nodes if n["id"] == from_id), None)
-            if base_node is not None:
-                bx, by = float(base_node["x"]), float(base_node["y"])
-                sx = bx + 140.0
-                sy = by - 90.0 * idx_for_from
-                fixed_xy = base_node.get("fixed", {"x": True, "y": True})
-            else:
-                # fallback circular si no encontramos el nodo
-                a = _angle_from_id(mufa_node_id)
-                sx, sy = R * cos(a), R * sin(a)
-                fixed_xy = {"x": True, "y": True}
-
-            label = mufa_code_map.get(mufa_id, mufa_id)
-
-            vis_nodes.append(
-                {
-                    "id": mufa_node_id,
-                    "label": label,
-                    "group": "mufa_split",
-                    "kind": "MUFA_SPLIT",
-                    "x": float(sx),
-                    "y": float(sy),
-                    "fixed": fixed_xy,
-                    "meta": {
-                        "tipo": "MUFA_SPLIT",
-                        "mufa_id": mufa_id,
-                        "mufa_code": label,
-                        "from_nodo_id": from_id,
-                        "source": "overview",
-                    },
-                }
-            )
-            existing_node_ids.add(mufa_node_id)
-
-        # Edge único desde el nodo origen hacia la mufa
-        vis_edges.append(
-            {
-                "id": f"{from_id}::{mufa_id}::FROM",
-                "from": from_id,
-                "to": mufa_node_id,
-                "title": f"Split via MUFA {mufa_id}",
-                "edge_kind": "NODO_TO_MUFA",
-                "meta": {
-                    "mufa_id": mufa_id,
-                    "from_nodo_id": from_id,
-                    "route_ids": rids,
-                },
-            }
-        )
-
-        # Edges desde la mufa hacia cada destino (uno por route_id, conservando route_id)
-        for rid in rids:
-            to_id = route_map[rid]["to"]
-            vis_edges.append(
-                {
-                    "id": f"{mufa_id}::{from_id}::{to_id}::{rid}",
-                    "from": mufa_node_id,
-                    "to": to_id,
-                    "title": route_map[rid].get("path_text"),
-                    "edge_kind": "MUFA_TO_NODO",
-                    "meta": {"route_id": rid},
-                }
-            )
-
-    return {
-        "nodes": vis_nodes,
-        "edges": vis_edges,
-        "meta": {
-            "generated_at": datetime.utcnow().isoformat() + "Z",
-            "source": "overview:nodos+backbone",
-        },
-    }
+    lap("positions")
+
+    overview = offload.run(
+        "overview",
+        assemble_overview,
+        nodes_rows,
+        routes_rows,
+        route_mufa_rows,
+        pos_map,
+        size=len(nodes_rows) + len(routes_rows) + len(route_mufa_rows),
+    )
+    lap("assemble")
+    return overview
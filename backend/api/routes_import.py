@@ -0,0 +1,100 @@
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.importer import ENTITIES, FORMATS, ON_ERROR, ImportJob, imports
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+
+def _format_from(content_type: Optional[str]) -> str:
+    # application/geo+json o application/json -> geojson; el resto, CSV
+    return "geojson" if "json" in (content_type or "").lower() else "csv"
+
+
+async def _spool(request: Request, suffix: str) -> str:
+    """Copia el body a un archivo temporal por chunks (no queda en memoria)."""
+    fd, path = tempfile.mkstemp(
+        prefix="import-", suffix=f".{suffix}", dir=settings.IMPORT_SPOOL_DIR or None
+    )
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.IMPORT_MAX_BYTES:
+                    raise HTTPException(413, f"IMPORT_TOO_LARGE: max {settings.IMPORT_MAX_BYTES} bytes")
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(400, "EMPTY_FILE")
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+# ENDPOINTS
+# El archivo va como body crudo (no multipart), ej.:
+#   curl -X POST --data-binary @postes.csv -H "Content-Type: text/csv" \
+#        "http://host/import/pole?dry_run=true"
+@router.post("/{entity}", status_code=202)
+async def start_import(
+    entity: str,
+    request: Request,
+    response: Response,
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    on_error: str = "abort",
+    wait: bool = False,
+):
+    """
+    entity: pole | cable_span | mufa | splice (cargar en ese orden).
+    format: csv | geojson (por defecto según Content-Type).
+    on_error: abort (rollback si hay filas inválidas) | skip (se omiten).
+    wait=true responde al terminar; si no, 202 con el job para consultar
+    el progreso en /import/jobs/{job_id}.
+    """
+    if entity not in ENTITIES:
+        raise HTTPException(400, f"INVALID_ENTITY: {entity} (usar {', '.join(ENTITIES)})")
+    fmt = (format or _format_from(request.headers.get("content-type"))).lower()
+    if fmt not in FORMATS:
+        raise HTTPException(400, f"INVALID_FORMAT: {fmt}")
+    if on_error not in ON_ERROR:
+        raise HTTPException(400, f"INVALID_ON_ERROR: {on_error}")
+
+    path = await _spool(request, fmt)
+    job = imports.submit(
+        ImportJob(entity, fmt, path, dry_run, on_error, source=request.headers.get("x-filename", ""))
+    )
+    if wait:
+        await run_in_threadpool(job.done.wait)
+        response.status_code = 200
+    return job.status()
+
+
+@router.get("/jobs")
+def list_import_jobs():
+    return {"jobs": [j.status() for j in imports.jobs()]}
+
+
+@router.get("/jobs/{job_id}")
+def get_import_job(job_id: str):
+    job = imports.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"IMPORT_JOB_NOT_FOUND: {job_id}")
+    return job.status()
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_import_job(job_id: str):
+    # cancela un job en cola o en curso (rollback de lo insertado)
+    job = imports.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"IMPORT_JOB_NOT_FOUND: {job_id}")
+    if not job.finished:
+        job.cancel()
+    return job.status()
@@ -4,7 +4,8 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from sqlalchemy import text
 
-from core.db import execute, fetch_all, get_engine
+from core.changefeed import feed
+from core.db import begin_write, execute, fetch_all
 import hashlib
 from math import cos, sin, tau
 from core.util import _angle_from_id
@@ -19,19 +20,31 @@ class NodePos(BaseModel):
     y: float
 
 
-# ENDPOINTS
-@router.post("/")
-def upsert_positions(items: list[NodePos]):  # Guarda posiciones manuales
-    sql = """
+# Upsert por dialecto: MERGE en SQL Server; SQLite para pruebas locales
+_UPSERT_SQL = {
+    "mssql": """
       MERGE dbo.graph_node_position AS tgt
       USING (SELECT :node_id AS node_id, :x AS x, :y AS y) AS src
       ON (tgt.node_id = src.node_id)
       WHEN MATCHED THEN UPDATE SET x=src.x, y=src.y, updated_at=SYSUTCDATETIME()
       WHEN NOT MATCHED THEN INSERT (node_id, x, y) VALUES (src.node_id, src.x, src.y);
-    """
+    """,
+    "sqlite": """
+      INSERT INTO dbo.graph_node_position (node_id, x, y) VALUES (:node_id, :x, :y)
+      ON CONFLICT (node_id) DO UPDATE
+      SET x=excluded.x, y=excluded.y, updated_at=CURRENT_TIMESTAMP;
+    """,
+}
+
+
+# ENDPOINTS
+@router.post("/")
+def upsert_positions(items: list[NodePos]):  # Guarda posiciones manuales
     params = [{"node_id": it.node_id, "x": it.x, "y": it.y} for it in items]
     batch_size = 500
-    with get_engine().begin() as conn:
+    # las lecturas de posiciones van al primario un rato (read-your-writes)
+    with begin_write("graph_node_position") as conn:
+        sql = _UPSERT_SQL.get(conn.dialect.name, _UPSERT_SQL["mssql"])
         for start in range(0, len(params), batch_size):
             batch = params[start : start + batch_size]
             try:
@@ -43,13 +56,15 @@ def upsert_positions(items: list[NodePos]):  # Guarda posiciones manuales
                     failed_ids,
                 )
                 raise
-    return {"ok": True, "count": len(items)}
+    version = feed.publish_positions(params)
+    return {"ok": True, "count": len(items), "version": version}
 
 
 @router.delete("/")
 def clear_positions():
     execute("DELETE FROM dbo.graph_node_position;")
-    return {"ok": True}
+    version = feed.publish("positions_cleared")
+    return {"ok": True, "version": version}
 
 
 @router.post("/seed-defaults")
@@ -63,12 +78,13 @@ def seed_defaults(radius: float = 250.0):
       ON (tgt.node_id = src.node_id)
       WHEN NOT MATCHED THEN INSERT (node_id, x, y) VALUES (src.node_id, src.x, src.y);
     """
-    inserted = 0
+    inserted: list[dict] = []
     for n in nodes:
         if n["id"] in have:
             continue
         a = _angle_from_id(n["id"])
         x, y = radius * cos(a), radius * sin(a)
         execute(sql_merge, node_id=n["id"], x=x, y=y)
-        inserted += 1
-    return {"ok": True, "inserted": inserted}
+        inserted.append({"node_id": n["id"], "x": x, "y": y})
+    version = feed.publish_positions(inserted) if inserted else feed.version
+    return {"ok": True, "inserted": len(inserted), "version": version}
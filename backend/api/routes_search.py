@@ -0,0 +1,42 @@
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core.search import SOURCES, search_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("")
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    kinds: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    fuzzy: bool = True,
+):
+    """
+    Autocompletado por prefijo y búsqueda aproximada (trigramas) sobre
+    códigos/nombres de nodo, poste, mufa, cable, ODF, puertos ODF e hilos.
+    `kinds` filtra por tipo, separado por coma (ej. "pole,mufa").
+    """
+    t0 = time.perf_counter()
+    kind_list = [k.strip() for k in kinds.split(",") if k.strip()] if kinds else None
+    if kind_list:
+        bad = [k for k in kind_list if k not in SOURCES]
+        if bad:
+            raise HTTPException(400, f"UNKNOWN_SEARCH_KINDS: {','.join(bad)}")
+    try:
+        items = search_index.search(q, kind_list, limit=limit, fuzzy=fuzzy)
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_SEARCH: {e}")
+    return {
+        "q": q,
+        "items": items,
+        "meta": {"elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 3)},
+    }
+
+
+@router.get("/status")
+def search_status():
+    return {"segments": search_index.status()}
@@ -1,6 +1,41 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from core.analytics import fetch_analytic
+from core.config import settings
+from core.changefeed import feed
 from core.db import fetch_all
-from typing import List, Dict
+from core.pole_index import pole_index
+from core.routing import PathBudgetExceeded, k_shortest_paths, pole_graph
+from core.utilization import utilization
+from core.impact import impact_index
+from core.geo_layout import geo_layout
+from core.materialized import (
+    backbone_edges,
+    materialized_status,
+    refresh_all,
+    route_segments,
+    route_summary,
+    routes_for_spans,
+)
+from core.graph_assembly import (
+    ROUTE_LAYERS,
+    assemble_route_graph,
+    layer_subgraph,
+    route_graph_node_ids,
+    subgraph_diff,
+)
+from core.offload import offload
+from core.singleflight import coalesce
+from core.timing import lap, mark
+from core.span_quality import CSV_COLUMNS, ISSUES, span_quality
+from core.tables import ROUTE_INVENTORY_SQL, load_table
+from core.responses import FastJSONResponse, slim_graph
+from typing import Optional
+from typing import List, Dict, Iterator, Tuple
+import csv
+import io
+import time
 
 router = APIRouter(prefix="/topology", tags=["topology"])
 
@@ -24,6 +59,52 @@ def get_position_map(node_ids: List[str]) -> Dict[str, tuple[float, float]]:
         return {}
 
 
+# Cambios de topología hechos fuera de la API (cargas, scripts en BD)
+@router.post("/invalidate")
+def invalidate_topology(
+    reason: str = "manual",
+    tables: Optional[str] = None,
+    route_ids: Optional[str] = None,
+    span_ids: Optional[str] = None,
+):
+    """
+    tables: lista separada por coma (ej. "pole,cable_span"); vacío = todas.
+    route_ids / span_ids acotan el cambio a esas rutas (o a las que pasan
+    por esos spans): las vistas materializadas recargan sólo esas rutas.
+    """
+    routes = set(_csv(route_ids))
+    if span_ids:
+        try:
+            routes.update(routes_for_spans(_csv(span_ids)))
+        except Exception as e:
+            raise HTTPException(500, f"DB_ERROR_INVALIDATE: {e}")
+    version = feed.bump_topology(
+        reason, _csv(tables) or None, sorted(routes) if routes or span_ids else None
+    )
+    return {
+        "ok": True,
+        "version": version,
+        "topology_version": feed.topology_version,
+        "routes": sorted(routes) if routes or span_ids else None,
+    }
+
+
+# Vistas materializadas: frescura, rutas pendientes y última recarga
+@router.get("/materialized")
+def get_materialized_status():
+    return {"topology_version": feed.topology_version, "views": materialized_status()}
+
+
+@router.post("/materialized/refresh")
+def refresh_materialized(full: bool = False):
+    # full=true recarga todo; si no, sólo lo pendiente (incremental)
+    try:
+        views = refresh_all(full)
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_MATERIALIZED: {e}")
+    return {"topology_version": feed.topology_version, "views": views}
+
+
 # Listar rutas logicas(ODF-ODF) + resumen fisico
 @router.get("/routes")
 def list_routes():
@@ -33,23 +114,121 @@ def list_routes():
         r.to_odf_id,
         o1.nodo_id as from_nodo_id,
         o2.nodo_id as to_nodo_id,
-        ps.span_list,
         r.path_text
     FROM dbo.odf_route r
     JOIN dbo.odf o1 on o1.id = r.from_odf_id
     JOIN dbo.odf o2 on o2.id = r.to_odf_id
-    LEFT JOIN dbo.vw_route_physical_summary ps ON ps.odf_route_id = r.id
     ORDER BY r.id
     """
     try:
-        return fetch_all(sql)
+        rows = fetch_all(sql)
+        # span_list desde la copia materializada de vw_route_physical_summary
+        summary = {r["odf_route_id"]: r["span_list"] for r in route_summary.all_rows()}
     except Exception as e:
         raise HTTPException(500, f"DB_ERROR_LIST_ROUTES: {e}")
+    return [
+        {
+            "id": r["id"],
+            "from_odf_id": r["from_odf_id"],
+            "to_odf_id": r["to_odf_id"],
+            "from_nodo_id": r["from_nodo_id"],
+            "to_nodo_id": r["to_nodo_id"],
+            "span_list": summary.get(r["id"]),
+            "path_text": r["path_text"],
+        }
+        for r in rows
+    ]
 
 
 # Grafo detallado por ruta (ODF, poste, mufas, segmentos/spans)
-@router.get("/routes/{route_id}/graph")
-def route_graph(route_id: str):
+GRAPH_LAYERS = ("mufas", "odf_links", "siblings")
+
+
+def _layers(value: Optional[str], default: Tuple[str, ...]) -> Tuple[str, ...]:
+    """`?layers=a,b` -> tupla ordenada (clave estable para coalesce)."""
+    if value is None:
+        return default
+    layers = set(_csv(value))
+    unknown = layers.difference(ROUTE_LAYERS)
+    if unknown:
+        raise HTTPException(400, f"UNKNOWN_LAYER: {','.join(sorted(unknown))}")
+    return tuple(sorted(layers))
+
+
+@router.get("/routes/{route_id}/graph", response_class=FastJSONResponse)
+def route_graph(
+    route_id: str,
+    slim: bool = False,
+    layout: str = Query("default", pattern="^(default|geo)$"),
+    layers: Optional[str] = None,
+):
+    """
+    `?layers=` (separadas por coma: siblings, mufas, odf_links, access) elige
+    las capas; las no pedidas no se consultan ni se arman. `?layers=` vacío
+    deja sólo la ruta base. Por defecto todas menos access.
+    `?debug_timing=1` agrega meta.timings por etapa (core.timing).
+    """
+    payload = _route_graph(route_id, _layers(layers, GRAPH_LAYERS))
+    if layout == "geo":
+        payload = _geo_payload(payload)
+        lap("geo_layout")
+    return FastJSONResponse(slim_graph(payload) if slim else payload)
+
+
+def _geo_payload(payload: dict) -> dict:
+    """
+    Copia del grafo con x/y proyectados desde GPS (`?layout=geo`). Postes y
+    mufas traen su GPS; los ODF/routers toman el de su nodo (meta.nodo_id).
+    """
+    nodo_gps = {
+        str(r["id"]): (r["gps_lat"], r["gps_lon"])
+        for r in load_table("nodo")
+        if r.get("gps_lat") is not None and r.get("gps_lon") is not None
+    }
+    anchors = {}
+    for n in payload["nodes"]:
+        nodo_id = (n.get("meta") or {}).get("nodo_id")
+        if nodo_id is not None and str(nodo_id) in nodo_gps:
+            anchors[str(n["id"])] = nodo_gps[str(nodo_id)]
+    nodes = geo_layout(payload["nodes"], payload["edges"], anchors)
+    return {**payload, "nodes": nodes, "meta": {**payload.get("meta", {}), "layout": "geo"}}
+
+
+@router.get("/routes/{route_id}/graph/layers/{layer}", response_class=FastJSONResponse)
+def route_graph_layer(
+    route_id: str,
+    layer: str,
+    context: Optional[str] = None,
+    slim: bool = False,
+):
+    """
+    Sólo los nodos/aristas que agrega `layer` al grafo, para cargar una capa
+    cuando se activa en el cliente. `?context=` son las otras capas ya
+    activas (ej. mufas con context=siblings incluye las mufas de las
+    hermanas).
+    """
+    if layer not in ROUTE_LAYERS:
+        raise HTTPException(404, f"UNKNOWN_LAYER: {layer}")
+    others = tuple(l for l in _layers(context, ()) if l != layer)
+    with_layer = tuple(sorted(others + (layer,)))
+    if layer == "siblings":
+        payload = subgraph_diff(
+            _route_graph(route_id, with_layer), _route_graph(route_id, others)
+        )
+    else:
+        payload = layer_subgraph(_route_graph(route_id, with_layer), layer)
+    payload["meta"] = {"route_id": route_id, "layer": layer, "context": list(others)}
+    return FastJSONResponse(slim_graph(payload) if slim else payload)
+
+
+def _route_graph(route_id: str, layers: Tuple[str, ...]) -> dict:
+    if "access" in layers:
+        return build_route_graph_with_access(route_id, layers)
+    return build_route_graph(route_id, layers)
+
+
+@coalesce("route_graph")
+def build_route_graph(route_id: str, layers: Tuple[str, ...] = GRAPH_LAYERS) -> dict:
     """
     Grafo físico de la ruta, extendido para incluir ramales que COMPARTEN spans
     con la ruta base y salen del mismo nodo origen.
@@ -60,7 +239,12 @@ def route_graph(route_id: str):
 
     Si la ruta base es A-B, el grafo incluirá también el ramal hacia C.
     Y si la base es A-C, incluirá el ramal hacia B.
+
+    `layers` (ROUTE_LAYERS) decide qué partes opcionales se consultan:
+    siblings (ramales), mufas y odf_links; access se agrega aparte.
+    Cada etapa numerada se mide con core.timing.lap (?debug_timing=1).
     """
+    mark()
 
     # 1) Datos de la ruta base (extremos)
     ends_rows = fetch_all(
@@ -79,49 +263,44 @@ def route_graph(route_id: str):
         raise HTTPException(status_code=404, detail=f"ROUTE_NOT_FOUND: {route_id}")
     base_end = ends_rows[0]
     base_from_nodo_id = base_end["from_nodo_id"]
+    lap("ends")
 
     # 2) Rutas "hermanas": mismas spans físicos + mismo nodo origen
-    related_rows = fetch_all(
-        """
-        WITH base_spans AS (
-            SELECT DISTINCT ors.cable_span_id
-            FROM dbo.odf_route_segment ors
-            WHERE ors.odf_route_id = :rid
+    related_rows = []
+    if "siblings" in layers:
+        related_rows = fetch_all(
+            """
+            WITH base_spans AS (
+                SELECT DISTINCT ors.cable_span_id
+                FROM dbo.odf_route_segment ors
+                WHERE ors.odf_route_id = :rid
+            )
+            SELECT DISTINCT r2.id AS route_id
+            FROM base_spans bs
+            JOIN dbo.odf_route_segment ors2
+                ON ors2.cable_span_id = bs.cable_span_id
+            JOIN dbo.odf_route r2
+                ON r2.id = ors2.odf_route_id
+            JOIN dbo.odf o_from2
+                ON o_from2.id = r2.from_odf_id
+            WHERE r2.id <> :rid
+              AND o_from2.nodo_id = :from_nodo_id
+            """,
+            rid=route_id,
+            from_nodo_id=base_from_nodo_id,
         )
-        SELECT DISTINCT r2.id AS route_id
-        FROM base_spans bs
-        JOIN dbo.odf_route_segment ors2
-            ON ors2.cable_span_id = bs.cable_span_id
-        JOIN dbo.odf_route r2
-            ON r2.id = ors2.odf_route_id
-        JOIN dbo.odf o_from2
-            ON o_from2.id = r2.from_odf_id
-        WHERE r2.id <> :rid
-          AND o_from2.nodo_id = :from_nodo_id
-        """,
-        rid=route_id,
-        from_nodo_id=base_from_nodo_id,
-    )
 
     related_ids = [r["route_id"] for r in related_rows] if related_rows else []
     all_route_ids: List[str] = [route_id] + related_ids
+    lap("siblings")
 
     # 3) Spans físicos de TODAS las rutas involucradas
-    #    (base + hermanas)
+    #    (base + hermanas), desde la copia materializada
     placeholders = ",".join(f":r{i}" for i in range(len(all_route_ids)))
     params_routes = {f"r{i}": rid for i, rid in enumerate(all_route_ids)}
 
-    segs = fetch_all(
-        f"""
-        SELECT odf_route_id, seg_seq, cable_span_id, cable_id, cable_seq,
-               from_pole_id, from_pole_code, to_pole_id, to_pole_code,
-               length_m, length_span, capacity_fibers
-        FROM dbo.vw_route_segments_expanded
-        WHERE odf_route_id IN ({placeholders})
-        ORDER BY odf_route_id, seg_seq
-        """,
-        **params_routes,
-    )
+    segs = route_segments.rows_for(all_route_ids)
+    lap("segments")
     if not segs:
         raise HTTPException(
             status_code=404,
@@ -129,33 +308,41 @@ def route_graph(route_id: str):
         )
 
     # 4) Extremos ODF de TODAS las rutas (para poder dibujar B, C, etc.)
-    ends_all_rows = fetch_all(
-        f"""
-        SELECT r.id as route_id, r.from_odf_id, r.to_odf_id,
-               o1.name as from_odf_name, o1.code as from_odf_code, o1.nodo_id as from_nodo_id,
-               o2.name as to_odf_name, o2.code as to_odf_code, o2.nodo_id as to_nodo_id
-        FROM dbo.odf_route r
-        JOIN dbo.odf o1 on o1.id = r.from_odf_id
-        JOIN dbo.odf o2 on o2.id = r.to_odf_id
-        WHERE r.id IN ({placeholders})
-        """,
-        **params_routes,
-    )
+    ends_all_rows = [base_end]
+    if related_ids:
+        ends_all_rows = fetch_all(
+            f"""
+            SELECT r.id as route_id, r.from_odf_id, r.to_odf_id,
+                   o1.name as from_odf_name, o1.code as from_odf_code, o1.nodo_id as from_nodo_id,
+                   o2.name as to_odf_name, o2.code as to_odf_code, o2.nodo_id as to_nodo_id
+            FROM dbo.odf_route r
+            JOIN dbo.odf o1 on o1.id = r.from_odf_id
+            JOIN dbo.odf o2 on o2.id = r.to_odf_id
+            WHERE r.id IN ({placeholders})
+            """,
+            **params_routes,
+        )
     route_end_map = {r["route_id"]: r for r in ends_all_rows}
+    lap("ends_all")
 
     # 5) Postes ordenados y último poste por ruta (para conectar cada ODF destino)
     ordered_poles: List[str] = []
     last_pole_by_route: Dict[str, str] = {}
 
+    seen_poles = set()
+
     for s in segs:
         fp = s["from_pole_id"]
         tp = s["to_pole_id"]
-        if fp not in ordered_poles:
+        if fp not in seen_poles:
+            seen_poles.add(fp)
             ordered_poles.append(fp)
-        if tp not in ordered_poles:
+        if tp not in seen_poles:
+            seen_poles.add(tp)
             ordered_poles.append(tp)
         # último poste donde termina la ruta
         last_pole_by_route[s["odf_route_id"]] = tp
+    lap("pole_order")
 
     # 6) Datos de postes
     poles = []
@@ -169,11 +356,11 @@ def route_graph(route_id: str):
         )
         params_poles = {f"p{i}": pid for i, pid in enumerate(ordered_poles)}
         poles = fetch_all(q_poles, **params_poles)
-    pole_map = {p["id"]: p for p in poles}
+    lap("poles")
 
     # 7) Mufas por poste
     mufas = []
-    if ordered_poles:
+    if ordered_poles and "mufas" in layers:
         q_mufas = """
             SELECT id, code, pole_id, mufa_type, gps_lat, gps_lon
             FROM dbo.mufa
@@ -183,256 +370,53 @@ def route_graph(route_id: str):
         )
         params_mufas = {f"m{i}": pid for i, pid in enumerate(ordered_poles)}
         mufas = fetch_all(q_mufas, **params_mufas)
+    lap("mufas")
 
-    # 8) Construcción de nodos y aristas
-    nodes = []
-    edges = []
-
-    def nid(kind: str, raw_id: str) -> str:
-        # para este grafo usamos el id crudo (consistente con el resto de la app)
-        return f"{raw_id}"
-
-    # 9) Posiciones guardadas
-    candidate_ids: List[str] = []
-
-    base_from_odf_id = base_end["from_odf_id"]
-    from_odf_node_id = nid("ODF", base_from_odf_id)
-
-    # Todos los ODF destino (B, C, ...) de las rutas involucradas
-    to_odf_ids = set()
-    for r_id, info in route_end_map.items():
-        to_odf_ids.add(info["to_odf_id"])
-
-    to_odf_node_ids = [nid("ODF", oid) for oid in to_odf_ids]
-
-    candidate_ids.append(from_odf_node_id)
-    candidate_ids.extend(to_odf_node_ids)
-    candidate_ids.extend(nid("POLE", p) for p in ordered_poles)
-    candidate_ids.extend(nid("MUFA", m["id"]) for m in mufas)
-
-    pos_map = get_position_map(candidate_ids)
-
-    # 10) Layout lineal de postes por defecto
-    SPACING_X = 220.0
-    for i, pid in enumerate(ordered_poles):
-        k = nid("POLE", pid)
-        if k not in pos_map:
-            pos_map[k] = (i * SPACING_X, 0.0)
-
-    # 11) Posición de ODF origen y ODF destino
-    if ordered_poles:
-        x0 = pos_map[nid("POLE", ordered_poles[0])][0]
-        xN = pos_map[nid("POLE", ordered_poles[-1])][0]
-    else:
-        x0, xN = -180.0, 180.0
-
-    if from_odf_node_id not in pos_map:
-        pos_map[from_odf_node_id] = (x0 - 180.0, 0.0)
-
-    # default X para cada ODF destino, basado en el último poste de su ruta
-    default_to_pos: Dict[str, tuple[float, float]] = {}
-    for r_id, info in route_end_map.items():
-        to_oid = info["to_odf_id"]
-        last_pole = last_pole_by_route.get(r_id)
-        if not last_pole:
-            continue
-        pole_k = nid("POLE", last_pole)
-        px, py = pos_map.get(pole_k, (xN, 0.0))
-        default_to_pos[to_oid] = (px + 180.0, py)
-
-    for to_oid in to_odf_ids:
-        k = nid("ODF", to_oid)
-        if k not in pos_map:
-            px, py = default_to_pos.get(to_oid, (xN + 180.0, 0.0))
-            pos_map[k] = (px, py)
-
-    # 12) Nodos ODF
-    # ODF origen (único)
-    nodes.append(
-        {
-            "id": from_odf_node_id,
-            "label": base_end["from_odf_code"]
-            or base_end["from_odf_name"]
-            or base_from_odf_id,
-            "group": "odf",
-            "x": float(pos_map[from_odf_node_id][0]),
-            "y": float(pos_map[from_odf_node_id][1]),
-            "fixed": {"x": True, "y": True},
-            "meta": {
-                "nodo_id": base_end["from_nodo_id"],
-                "odf_id": base_from_odf_id,
-            },
-        }
+    # 8) Posiciones guardadas
+    pos_map = get_position_map(
+        route_graph_node_ids(base_end, route_end_map, ordered_poles, mufas)
     )
-
-    # ODF destino (pueden ser varios: B, C, ...)
-    # Tomamos la info de cualquier ruta que tenga ese to_odf_id
-    to_odf_info: Dict[str, dict] = {}
-    for r_id, info in route_end_map.items():
-        to_oid = info["to_odf_id"]
-        if to_oid not in to_odf_info:
-            to_odf_info[to_oid] = info
-
-    for to_oid, info in to_odf_info.items():
-        k = nid("ODF", to_oid)
-        nodes.append(
-            {
-                "id": k,
-                "label": info["to_odf_code"] or info["to_odf_name"] or to_oid,
-                "group": "odf",
-                "x": float(pos_map[k][0]),
-                "y": float(pos_map[k][1]),
-                "fixed": {"x": True, "y": True},
-                "meta": {
-                    "nodo_id": info["to_nodo_id"],
-                    "odf_id": to_oid,
-                },
-            }
-        )
-
-    # 13) Nodos de postes
-    for pid in ordered_poles:
-        p = pole_map.get(pid, {"code": pid})
-        k = nid("POLE", pid)
-        nodes.append(
-            {
-                "id": k,
-                "label": p.get("code") or pid,
-                "group": "pole",
-                "x": float(pos_map[k][0]),
-                "y": float(pos_map[k][1]),
-                "fixed": {"x": True, "y": True},
-                "meta": {
-                    "pole_id": pid,
-                    "pole_type": p.get("pole_type"),
-                    "status": p.get("status"),
-                    "gps_lat": p.get("gps_lat"),
-                    "gps_lon": p.get("gps_lon"),
-                },
-            }
-        )
-
-    # 14) Nodos de MUFAS (sobre postes)
-    MUFA_DY = -120.0
-
-    for m in mufas:
-        k = nid("MUFA", m["id"])
-        if k not in pos_map:
-            px, py = pos_map[nid("POLE", m["pole_id"])]
-            pos_map[k] = (px, py + MUFA_DY)
-        nodes.append(
-            {
-                "id": k,
-                "label": m["code"],
-                "group": "mufa",
-                "x": float(pos_map[k][0]),
-                "y": float(pos_map[k][1]),
-                "fixed": {"x": True, "y": True},
-                "meta": {
-                    "mufa_id": m["id"],
-                    "pole_id": m["pole_id"],
-                    "mufa_type": m.get("mufa_type"),
-                    "gps_lat": m.get("gps_lat"),
-                    "gps_lon": m.get("gps_lon"),
-                },
-            }
-        )
-
-        # Arista poste-mufa (decorativa)
-        edges.append(
-            {
-                "id": f"PM:{m['pole_id']}:{m['id']}",
-                "from": nid("POLE", m["pole_id"]),
-                "to": k,
-                "group": "pole_mufa",
-                "title": "Mufa",
-            }
-        )
-
-    # 15) Aristas de spans (poste a poste), para todas las rutas
-    for s in segs:
-        edges.append(
-            {
-                "id": f"{s['cable_span_id']}",
-                "from": nid("POLE", s["from_pole_id"]),
-                "to": nid("POLE", s["to_pole_id"]),
-                "group": "span",
-                "title": (
-                    f"{s['cable_id']} | {s['capacity_fibers']} hilos | "
-                    f"{s['length_m'] or 0}m / {s['length_span'] or 0}m"
-                ),
-                "meta": {
-                    "cable_id": s["cable_id"],
-                    "cable_seg_id": s["cable_span_id"],
-                    "length_m": s["length_m"],
-                    "seg_seq": s["seg_seq"],
-                    "capacity_span": s["length_span"],
-                    "capacity_fibers": s["capacity_fibers"],
-                    "odf_route_id": s["odf_route_id"],
-                },
-            }
-        )
-
-    # 16) Arista "virtual" ODF origen -> primer poste
-    if ordered_poles:
-        edges.append(
-            {
-                "id": f"ODF_IN:{route_id}",
-                "from": from_odf_node_id,
-                "to": nid("POLE", ordered_poles[0]),
-                "group": "odf_link",
-                "title": "Entrada a planta externa",
-            }
-        )
-
-    # 17) Aristas "virtuales" último poste de cada ruta -> su ODF destino
-    for r_id, info in route_end_map.items():
-        last_pole = last_pole_by_route.get(r_id)
-        if not last_pole:
-            continue
-        to_oid = info["to_odf_id"]
-        edges.append(
-            {
-                "id": f"ODF_OUT:{r_id}",
-                "from": nid("POLE", last_pole),
-                "to": nid("ODF", to_oid),
-                "group": "odf_link",
-                "title": f"Salida a ODF destino (ruta {r_id})",
-            }
-        )
-
-    return {"nodes": nodes, "edges": edges}
+    lap("positions")
+
+    # 9) Armado de nodos y aristas (posible en un proceso aparte)
+    graph = offload.run(
+        "route_graph",
+        assemble_route_graph,
+        route_id,
+        base_end,
+        route_end_map,
+        segs,
+        ordered_poles,
+        last_pole_by_route,
+        poles,
+        mufas,
+        pos_map,
+        "odf_links" in layers,
+        size=len(segs) + len(poles) + len(mufas),
+    )
+    lap("assemble")
+    return graph
 
 
 # INVENTARIO / KPIS DE LA RUTA
 @router.get("/routes/{route_id}/inventory")
 def route_inventory(route_id: str):
-    # spans
-    spans = fetch_all(
-        """
-        SELECT e.cable_span_id, e.cable_id, e.seg_seq, cs.length_m
-        FROM dbo.vw_route_segments_expanded e
-        JOIN dbo.cable_span cs ON cs.id = e.cable_span_id
-        WHERE e.odf_route_id = :rid
-        ORDER BY e.seg_seq
-    """,
-        rid=route_id,
-    )
+    # spans (copia materializada de vw_route_segments_expanded)
+    segs = route_segments.rows_for([route_id])
+    spans = [
+        {
+            "cable_span_id": s["cable_span_id"],
+            "cable_id": s["cable_id"],
+            "seg_seq": s["seg_seq"],
+            "length_m": s["length_m"],
+        }
+        for s in segs
+    ]
 
     # Recolecta postes reales
-    poles_real = fetch_all(
-        """
-    SELECT DISTINCT cs.from_pole_id as pole_id FROM dbo.vw_route_segments_expanded e
-    JOIN dbo.cable_span cs ON cs.id = e.cable_span_id
-    WHERE e.odf_route_id = :rid
-    UNION
-    SELECT DISTINCT cs.to_pole_id FROM dbo.vw_route_segments_expanded e
-    JOIN dbo.cable_span cs ON cs.id = e.cable_span_id
-    WHERE e.odf_route_id = :rid
-    """,
-        rid=route_id,
+    pole_ids = sorted(
+        {s["from_pole_id"] for s in segs} | {s["to_pole_id"] for s in segs}, key=str
     )
-    pole_ids = [r["pole_id"] for r in poles_real] if poles_real else []
 
     mufa_count = 0
     if pole_ids:
@@ -460,11 +444,54 @@ def route_inventory(route_id: str):
     }
 
 
-@router.get("/routes/{route_id}/graph-with-access")
-def route_graph_with_access(route_id: str):
-    base = route_graph(route_id)
+# Inventario de todas las rutas en una sola agregación (familia analítica)
+@router.get("/inventory")
+def network_inventory():
+    """Totales por ruta, iguales a los de /routes/{route_id}/inventory."""
+    try:
+        rows = fetch_analytic("inventory", ROUTE_INVENTORY_SQL)
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_INVENTORY: {e}")
+    routes = [
+        {
+            "route_id": r["route_id"],
+            "span_count": int(r["span_count"]),
+            "cable_count": int(r["cable_count"]),
+            "total_length_m": round(float(r["total_length_m"] or 0.0), 3),
+            "pole_count": int(r["pole_count"]),
+            "mufa_count": int(r["mufa_count"]),
+        }
+        for r in rows
+    ]
+    return {
+        "topology_version": feed.topology_version,
+        "route_count": len(routes),
+        "total_length_m": round(sum(r["total_length_m"] for r in routes), 3),
+        "routes": routes,
+    }
+
+
+@router.get("/routes/{route_id}/graph-with-access", response_class=FastJSONResponse)
+def route_graph_with_access(
+    route_id: str,
+    slim: bool = False,
+    layout: str = Query("default", pattern="^(default|geo)$"),
+    layers: Optional[str] = None,
+):
+    """Como /graph (mismo `?layers=`), por defecto con todas las capas."""
+    payload = _route_graph(route_id, _layers(layers, ROUTE_LAYERS))
+    if layout == "geo":
+        payload = _geo_payload(payload)
+        lap("geo_layout")
+    return FastJSONResponse(slim_graph(payload) if slim else payload)
+
+
+@coalesce("route_graph_with_access")
+def build_route_graph_with_access(route_id: str, layers: Tuple[str, ...] = ROUTE_LAYERS) -> dict:
+    base = build_route_graph(route_id, tuple(l for l in layers if l != "access"))
     nodes = {n["id"]: n for n in base["nodes"]}
     edges = {e["id"]: e for e in base["edges"]}
+    lap("access_copy")
 
     # Extremos ODF de la ruta
     ends = fetch_all(
@@ -482,6 +509,7 @@ def route_graph_with_access(route_id: str):
     if not ends:
         raise HTTPException(404, f"ROUTE_NOT_FOUND: {route_id}")
     ends = ends[0]
+    lap("access_ends")
 
     lks = fetch_all(
         """
@@ -493,13 +521,14 @@ def route_graph_with_access(route_id: str):
         a=ends["from_odf_id"],
         b=ends["to_odf_id"],
     )
+    lap("access_links")
 
     # Posiciones Guardadas
     def nid(kind: str, raw: str) -> str:
         return f"{raw}"
 
-    pos_rows = fetch_all("SELECT node_id, x, y FROM dbo.graph_node_position")
-    pos_map = {r["node_id"]: (r["x"], r["y"]) for r in pos_rows}
+    pos_map = get_position_map(sorted({nid("RTR", lk["router_id"]) for lk in lks}))
+    lap("access_positions")
 
     # Crear nodos y edges
     DX_ROUTER = 0.0
@@ -543,6 +572,7 @@ def route_graph_with_access(route_id: str):
                 },
             }
 
+    lap("access_build")
     return {"nodes": list(nodes.values()), "edges": list(edges.values())}
 
 
@@ -581,15 +611,13 @@ def node_details(nodo_id: str):
             nid=nodo_id,
         )
 
-        # Rutas relacionadas (desde backbone edges)
-        routes = fetch_all(
-            """
-            SELECT DISTINCT route_id AS id, path_text
-            FROM dbo.vw_backbone_edges
-            WHERE from_nodo_id = :nid OR to_nodo_id = :nid
-            ORDER BY route_id
-        """,
-            nid=nodo_id,
+        # Rutas relacionadas (desde backbone edges materializados)
+        route_ids = backbone_edges.keys_by("from_nodo_id", "to_nodo_id").get(str(nodo_id), [])
+        routes = list(
+            {
+                (r["route_id"], r["path_text"]): {"id": r["route_id"], "path_text": r["path_text"]}
+                for r in backbone_edges.rows_for(route_ids)
+            }.values()
         )
 
         return {
@@ -604,106 +632,39 @@ def node_details(nodo_id: str):
 
 @router.get("/poles/{pole_id}/details")
 def get_pole_details(pole_id: str):
-
+    # Se responde desde el índice de adyacencia en memoria (core.pole_index)
     try:
-        # Datos del Poste
-
-        pole_rows = fetch_all(
-            """
-                SELECT p.*
-                FROM dbo.pole p
-                WHERE p.id = :nid
-            """,
-            nid=pole_id,
-        )
-
-        if not pole_rows:
-            raise HTTPException(status_code=404, detail=f"POLE_NOT_FOUND: {pole_id}")
-        pole = pole_id
-
-        # Mufas en postes con # splices por mufa
-        mufas = fetch_all(
-            """
-                SELECT m.*,
-                    (SELECT COUNT(*) FROM dbo.splice s WHERE s.mufa_id = m.id) AS splice_count
-                FROM dbo.mufa m
-                WHERE m.pole_id = :nid
-            """,
-            nid=pole_id,
-        )
+        details = pole_index.get().details(pole_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"POLE_DETAILS_ERROR: {e}")
+    if details is None:
+        raise HTTPException(status_code=404, detail=f"POLE_NOT_FOUND: {pole_id}")
+    return details
 
-        # Spans conectados en este poste
-        spans = fetch_all(
-            """
-                SELECT s.*,
-                    c.code as cable_code,
-                    c.fiber_count,
-                    c.material_type,
-                    c.jacket_type
-                FROM dbo.cable_span s
-                JOIN dbo.cable c on c.id = s.cable_id
-                WHERE s.from_pole_id = :nid OR s.to_pole_id = :nid
-                ORDER BY s.cable_id, s.seq
-            """,
-            nid=pole_id,
-        )
 
-        # Cables que pasan por este poste
-        cables = fetch_all(
-            """
-                SELECT DISTINCT c.id, c.code, c.fiber_count, c.material_type, c.jacket_type
-                FROM dbo.cable_span s
-                JOIN dbo.cable c on c.id = s.cable_id
-                WHERE s.from_pole_id = :nid OR s.to_pole_id = :nid
-                ORDER BY c.code
-            """,
-            nid=pole_id,
-        )
+class PoleIds(BaseModel):
+    pole_ids: List[str]
 
-        # Postes vecinos
-        neighbors = fetch_all(
-            """
-                SELECT 
-                    CASE WHEN s.from_pole_id = :nid THEN s.to_pole_id ELSE s.from_pole_id END AS neighbor_pole_id,
-                    p.code AS neighbor_pole_code,
-                    s.id AS via_span_id,
-                    s.length_m
-                FROM dbo.cable_span s
-                JOIN dbo.pole p
-                    ON p.id = CASE WHEN s.from_pole_id = :nid THEN s.to_pole_id ELSE s.from_pole_id END
-                WHERE s.from_pole_id = :nid OR s.to_pole_id = :nid
-                ORDER BY p.code
-            """,
-            nid=pole_id,
-        )
 
-        # EXTRAS
-        total_spans = len(spans)
-        total_length_m = (
-            sum([float(s.get("length_m") or 0) for s in spans]) if spans else 0.0
-        )
-        return {
-            "pole": pole_rows,
-            "summary": {
-                "mufa_count": len(mufas),
-                "span_count": total_spans,
-                "total_length_m": total_length_m,
-                "cable_count": len(cables),
-                "neighbor_count": len(neighbors),
-            },
-            "mufas": mufas,
-            "spans": spans,
-            "cables": cables,
-            "neighbors": neighbors,
-        }
-
-    except HTTPException:
-        raise
+# Detalle de muchos postes en una sola llamada (hover sobre una ruta)
+@router.post("/poles/details")
+def get_poles_details(body: PoleIds):
+    try:
+        idx = pole_index.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"POLE_DETAILS_ERROR: {e}")
-
-
-@router.get("/mufas/{mufa_id}/splices")
+    items: Dict[str, dict] = {}
+    missing: List[str] = []
+    for pid in dict.fromkeys(body.pole_ids):
+        d = idx.details(pid)
+        if d is None:
+            missing.append(pid)
+        else:
+            items[pid] = d
+    return {"items": items, "missing": missing}
+
+
+@router.get("/mufas/{mufa_id}/splices", response_class=FastJSONResponse)
 def get_mufa_splices(mufa_id: str):
     # Mufa basica
     mufa = fetch_all(
@@ -780,8 +741,220 @@ def get_mufa_splices(mufa_id: str):
     # print(mufa)
     # print(splices)
     # print(groups)
+    return FastJSONResponse(
+        {
+            "mufa": mufa,
+            "splices": splices,
+            "groups": groups,
+        }
+    )
+
+
+# Caminos físicos más cortos entre nodos (por length_m de cable_span)
+@router.get("/paths")
+def shortest_paths(
+    from_nodo: str = Query(..., alias="from"),
+    to_nodo: str = Query(..., alias="to"),
+    k: int = Query(1, ge=1, le=5),
+    algorithm: str = Query("astar", pattern="^(astar|dijkstra)$"),
+    transit: bool = True,
+):
+    """
+    Hasta `k` caminos (Yen) entre dos nodos sobre el grafo de postes.
+    Con `transit=false` el camino no puede atravesar otros nodos.
+    Búsquedas que superan ROUTING_MAX_EXPANSIONS / ROUTING_TIMEOUT_S -> 422.
+    """
+    t0 = time.perf_counter()
+    try:
+        g = pole_graph.get()
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_PATHS: {e}")
+
+    src = g.nodo_vertex.get(from_nodo)
+    dst = g.nodo_vertex.get(to_nodo)
+    if src is None:
+        raise HTTPException(404, f"NODO_WITHOUT_ACCESS_POLES: {from_nodo}")
+    if dst is None:
+        raise HTTPException(404, f"NODO_WITHOUT_ACCESS_POLES: {to_nodo}")
+
+    try:
+        found, expanded = k_shortest_paths(
+            g,
+            src,
+            dst,
+            k=k,
+            astar=algorithm == "astar",
+            transit=transit,
+            max_expanded=settings.ROUTING_MAX_EXPANSIONS,
+            timeout_s=settings.ROUTING_TIMEOUT_S,
+        )
+    except PathBudgetExceeded as e:
+        raise HTTPException(422, f"PATHS_BUDGET_EXCEEDED: {e} (probar con k menor)")
+
+    paths = []
+    for cost, vertices in found:
+        span_ids = []
+        for u, v in zip(vertices, vertices[1:]):
+            sx = g.edge(u, v)[1]
+            if sx >= 0:
+                span_ids.append(g.span_ids[sx])
+        paths.append(
+            {
+                "length_m": round(cost, 3),
+                "hops": len(span_ids),
+                "path": [
+                    {
+                        "kind": "NODO" if g.is_nodo(v) else "POLE",
+                        "id": g.ids[v],
+                        "code": g.codes[v],
+                    }
+                    for v in vertices
+                ],
+                "span_ids": span_ids,
+            }
+        )
+
+    return {
+        "from": from_nodo,
+        "to": to_nodo,
+        "k": k,
+        "paths": paths,
+        "meta": {
+            "algorithm": algorithm,
+            "expanded": expanded,
+            "topology_version": feed.topology_version,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 3),
+        },
+    }
+
+
+# Ocupación de hilos por span / cable y cuello de botella por ruta
+@router.get("/utilization")
+def topology_utilization(
+    route_id: Optional[str] = None,
+    include_spans: bool = False,
+    include_cables: bool = False,
+):
+    """
+    Sin `route_id`: totales de la red y cuello de botella de cada ruta.
+    Con `route_id`: esa ruta más el detalle de sus spans.
+    `used` de un span cuenta los hilos usados que lo recorren (no todos los
+    de su cable); el de un cable, todos sus hilos usados.
+    """
+    try:
+        u = utilization.get()
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_UTILIZATION: {e}")
+
+    routes = u.routes(route_id)
+    if route_id is not None and not routes:
+        raise HTTPException(404, f"ROUTE_NOT_FOUND: {route_id}")
+
+    out = {
+        "topology_version": feed.topology_version,
+        "totals": u.filament_totals,
+        "routes": routes,
+    }
+    if route_id is not None:
+        out["spans"] = u.spans(u.route_span_mask(route_id))
+    elif include_spans:
+        out["spans"] = u.spans()
+    if include_cables:
+        out["cables"] = u.cables()
+    return out
+
+
+# Calidad de datos: largo registrado de cada span vs distancia GPS entre postes
+@router.get("/span-quality")
+def topology_span_quality(
+    only_flagged: bool = True,
+    issue: Optional[str] = Query(None, pattern="^(" + "|".join(ISSUES) + ")$"),
+    limit: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    format: str = Query("json", pattern="^(json|csv)$"),
+    refresh: bool = False,
+):
+    """
+    Resumen y spans observados, peor desvío primero. El cálculo se cachea
+    hasta el próximo cambio de topología (`?refresh=1` lo fuerza).
+    Con `?format=csv` se exporta la selección completa (sin `limit`, todas).
+    """
+    if refresh:
+        span_quality.invalidate()
+    try:
+        q = span_quality.get()
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_SPAN_QUALITY: {e}")
+
+    sel = q.select(q.mask(only_flagged, issue))
+    total = len(sel)
+    if format == "csv":
+        end = None if limit is None else offset + limit
+        return StreamingResponse(
+            _csv_stream(CSV_COLUMNS, q.csv_rows(sel[offset:end])),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="span_quality.csv"'},
+        )
+    end = offset + (1000 if limit is None else limit)
     return {
-        "mufa": mufa,
-        "splices": splices,
-        "groups": groups,
+        "topology_version": feed.topology_version,
+        "summary": q.summary(),
+        "total": total,
+        "offset": offset,
+        "spans": q.items(sel[offset:end]),
     }
+
+
+def _csv_stream(columns: List[str], rows) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % 1000 == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _csv(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
+# Impacto de cortes: spans / postes / mufas caídos
+@router.get("/impact")
+def topology_impact(
+    span_ids: Optional[str] = None,
+    pole_ids: Optional[str] = None,
+    mufa_ids: Optional[str] = None,
+    max_filaments: int = Query(5000, ge=0, le=100000),
+):
+    """
+    Rutas, pares de nodos e hilos afectados. Los ids van separados por coma.
+    """
+    spans, poles, mufas = _csv(span_ids), _csv(pole_ids), _csv(mufa_ids)
+    if not (spans or poles or mufas):
+        raise HTTPException(400, "IMPACT_REQUIRES_SPAN_POLE_OR_MUFA_IDS")
+    try:
+        idx = impact_index.get()
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_IMPACT: {e}")
+    out = idx.impact(spans, poles, mufas, max_filaments=max_filaments)
+    out["topology_version"] = feed.topology_version
+    return out
+
+
+# Reporte de riesgo: impacto del corte individual de cada span de la red
+@router.get("/impact/spof")
+def topology_impact_spof(
+    limit: int = Query(100, ge=1, le=100000),
+    only_bridges: bool = False,
+):
+    try:
+        idx = impact_index.get()
+    except Exception as e:
+        raise HTTPException(500, f"DB_ERROR_IMPACT: {e}")
+    out = idx.spof_report(limit=limit, only_bridges=only_bridges)
+    out["topology_version"] = feed.topology_version
+    return out
@@ -0,0 +1,150 @@
+"""
+Benchmark: consultas analíticas (familias de core.analytics) en la BD OLTP
+vs. la copia DuckDB, verificando que devuelvan las mismas filas.
+
+    cd backend && python -m bench.bench_analytics --routes 2000 --spans 50
+
+Genera un SQLite sintético con el esquema dbo.* que leen las familias (hace
+de SQL Server: motor por filas, vía DB_URL) y lo exporta a DuckDB con
+core.analytics.export. Cada consulta se mide `--repeat` veces en cada
+backend (mediana).
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from core.config import settings
+
+SCHEMA = """
+CREATE TABLE nodo(id TEXT PRIMARY KEY, name TEXT, code TEXT, type TEXT, reference TEXT,
+                  gps_lat REAL, gps_lon REAL);
+CREATE TABLE odf(id TEXT PRIMARY KEY, nodo_id TEXT, code TEXT, name TEXT, total_ports INT);
+CREATE TABLE odf_port(id TEXT PRIMARY KEY, odf_id TEXT, port_no INT);
+CREATE TABLE odf_port_fiber(odf_port_id TEXT, fiber_filament_id TEXT);
+CREATE TABLE odf_route(id TEXT PRIMARY KEY, from_odf_id TEXT, to_odf_id TEXT, path_text TEXT);
+CREATE TABLE odf_route_segment(odf_route_id TEXT, seq INT, cable_span_id TEXT);
+CREATE TABLE cable(id TEXT PRIMARY KEY, code TEXT, fiber_count INT, material_type TEXT,
+                   jacket_type TEXT);
+CREATE TABLE cable_span(id TEXT PRIMARY KEY, cable_id TEXT, seq INT, from_pole_id TEXT,
+                        to_pole_id TEXT, length_m REAL, length_span REAL);
+CREATE TABLE pole(id TEXT PRIMARY KEY, code TEXT, gps_lat REAL, gps_lon REAL, pole_type TEXT,
+                  status TEXT);
+CREATE TABLE mufa(id TEXT PRIMARY KEY, code TEXT, pole_id TEXT, mufa_type TEXT, gps_lat REAL,
+                  gps_lon REAL);
+CREATE TABLE fiber_filament(id TEXT PRIMARY KEY, cable_id TEXT, filament_no INT);
+CREATE TABLE splice(id TEXT PRIMARY KEY, mufa_id TEXT, a_fiber_filament_id TEXT,
+                    b_fiber_filament_id TEXT);
+CREATE TABLE graph_node_position(node_id TEXT PRIMARY KEY, x REAL, y REAL, updated_at TEXT);
+CREATE INDEX ix_ors_route ON odf_route_segment(odf_route_id);
+CREATE INDEX ix_mufa_pole ON mufa(pole_id);
+CREATE VIEW vw_route_segments_expanded AS
+  SELECT ors.odf_route_id, ors.seq AS seg_seq, cs.id AS cable_span_id, cs.cable_id,
+         cs.seq AS cable_seq, cs.from_pole_id, p1.code AS from_pole_code, cs.to_pole_id,
+         p2.code AS to_pole_code, cs.length_m, cs.length_span, c.fiber_count AS capacity_fibers
+  FROM odf_route_segment ors
+  JOIN cable_span cs ON cs.id = ors.cable_span_id
+  JOIN cable c ON c.id = cs.cable_id
+  JOIN pole p1 ON p1.id = cs.from_pole_id
+  JOIN pole p2 ON p2.id = cs.to_pole_id;
+CREATE VIEW vw_backbone_edges AS
+  SELECT r.id AS route_id, o1.nodo_id AS from_nodo_id, o2.nodo_id AS to_nodo_id, r.path_text
+  FROM odf_route r JOIN odf o1 ON o1.id = r.from_odf_id JOIN odf o2 ON o2.id = r.to_odf_id;
+"""
+
+
+def build_oltp(path: str, n_routes: int, spans_per_route: int, seed: int = 7):
+    """Una ruta = un cable de `spans_per_route` spans; 1 de cada 4 postes con mufa."""
+    rnd = random.Random(seed)
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    n_nodos = max(2, n_routes // 10)
+    con.executemany(
+        "INSERT INTO nodo VALUES (?,?,?,?,?,?,?)",
+        [(f"N{i}", f"Nodo {i}", f"ND{i:05}", "CORE", None, -12 + i * 1e-3, -77.0) for i in range(n_nodos)],
+    )
+    con.executemany(
+        "INSERT INTO odf VALUES (?,?,?,?,?)",
+        [(f"ODF{i}", f"N{i}", f"ODF-{i}", f"Odf {i}", 48) for i in range(n_nodos)],
+    )
+    routes, segs, cables, spans, poles, mufas, fils, splices = [], [], [], [], [], [], [], []
+    for r in range(n_routes):
+        a, b = r % n_nodos, (r * 7 + 1) % n_nodos
+        routes.append((f"R{r}", f"ODF{a}", f"ODF{b}", f"N{a} > N{b}"))
+        cables.append((f"C{r}", f"CAB-{r}", 24, "SM", "PE"))
+        fils.extend((f"C{r}-F{f}", f"C{r}", f) for f in range(24))
+        base_lat = -12 + rnd.random()
+        for k in range(spans_per_route + 1):
+            pid = f"P{r}_{k}"
+            poles.append((pid, f"PC{r}_{k}", base_lat + k * 5e-4, -77 + r * 1e-4, "CONC", "OK"))
+            if k % 4 == 0:
+                mufas.append((f"M{r}_{k}", f"MF{r}_{k}", pid, "DOMO", None, None))
+                splices.append((f"SP{r}_{k}", f"M{r}_{k}", f"C{r}-F{k % 24}", f"C{r}-F{(k + 1) % 24}"))
+        for k in range(spans_per_route):
+            length = 50 + rnd.random() * 30
+            spans.append((f"S{r}_{k}", f"C{r}", k, f"P{r}_{k}", f"P{r}_{k + 1}", length, length * 0.98))
+            segs.append((f"R{r}", k, f"S{r}_{k}"))
+    con.executemany("INSERT INTO odf_route VALUES (?,?,?,?)", routes)
+    con.executemany("INSERT INTO odf_route_segment VALUES (?,?,?)", segs)
+    con.executemany("INSERT INTO cable VALUES (?,?,?,?,?)", cables)
+    con.executemany("INSERT INTO cable_span VALUES (?,?,?,?,?,?,?)", spans)
+    con.executemany("INSERT INTO pole VALUES (?,?,?,?,?,?)", poles)
+    con.executemany("INSERT INTO mufa VALUES (?,?,?,?,?,?)", mufas)
+    con.executemany("INSERT INTO fiber_filament VALUES (?,?,?)", fils)
+    con.executemany("INSERT INTO splice VALUES (?,?,?,?)", splices)
+    con.executemany(
+        "INSERT INTO odf_port VALUES (?,?,?)",
+        [(f"ODF{r % n_nodos}-P{r}", f"ODF{r % n_nodos}", r) for r in range(n_routes)],
+    )
+    con.executemany(
+        "INSERT INTO odf_port_fiber VALUES (?,?)",
+        [(f"ODF{r % n_nodos}-P{r}", f"C{r}-F0") for r in range(n_routes)],
+    )
+    con.commit()
+    con.close()
+    return {"routes": n_routes, "spans": len(spans), "poles": len(poles), "mufas": len(mufas)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=2000)
+    parser.add_argument("--spans", type=int, default=50, help="spans por ruta")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_analytics_")
+    oltp = os.path.join(workdir, "oltp.db")
+    settings.DB_URL = f"sqlite:///{oltp}"
+    settings.DB_READ_REPLICAS = ""
+    settings.ANALYTICS_PATH = os.path.join(workdir, "analytics.duckdb")
+
+    from core import analytics
+    from core.db import fetch_all
+
+    t0 = time.perf_counter()
+    sizes = build_oltp(oltp, args.routes, args.spans)
+    print(f"dataset {sizes} generado en {time.perf_counter() - t0:.1f} s")
+    out = analytics.export()
+    print(f"export DuckDB: {out['export_ms']:.0f} ms, {out['bytes'] / 1e6:.1f} MB")
+
+    print(f"{'consulta':<20} {'filas':>9} {'oltp ms':>10} {'duckdb ms':>10} {'x':>6}  iguales")
+    for name, (_family, sql) in analytics.analytic_queries().items():
+        oltp_ms, duck_ms = [], []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            expected = fetch_all(sql)
+            oltp_ms.append((time.perf_counter() - t) * 1000.0)
+            t = time.perf_counter()
+            got = analytics.analytics.query(sql)
+            duck_ms.append((time.perf_counter() - t) * 1000.0)
+        same = analytics._canonical(expected) == analytics._canonical(got)
+        o, d = statistics.median(oltp_ms), statistics.median(duck_ms)
+        print(f"{name:<20} {len(expected):>9} {o:>10.1f} {d:>10.1f} {o / max(d, 1e-6):>6.1f}  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark: memoria por nodo / arista de un grafo como lista de dicts de
+vis-network vs. core.graph_model.CompactGraph.
+
+    cd backend && python -m bench.bench_graph_memory --nodes 1000000 --edges 1000000
+
+Los nodos imitan los postes de assemble_route_graph (x/y, fixed, meta con
+GPS) y las aristas los spans (title, meta del cable). Como las filas de
+fetch_all, cada valor repetido (cable_id, pole_type...) es un string nuevo
+por fila. Se mide con tracemalloc: lo que ocupan los dicts y lo que queda
+vivo del CompactGraph (arreglos + strings internados + CSR) una vez
+liberados los dicts. Nodos y aristas se miden por separado para no
+sostener ambos juegos de dicts a la vez.
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from core.graph_model import CompactGraph, Interner
+
+
+def pole_nodes(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        pid = f"P{i // 100}_{i % 100}"
+        out.append(
+            {
+                "id": pid,
+                "label": f"PC-{i:07d}",
+                "group": "pole",
+                "x": i % 100 * 220.0,
+                "y": 0.0,
+                "fixed": {"x": True, "y": True},
+                "meta": {
+                    "pole_id": pid,
+                    "pole_type": "CONCRETO"[: 8 - i % 2],  # string nuevo por fila
+                    "status": "".join(("OK",)),
+                    "gps_lat": -12.0 + rnd.random(),
+                    "gps_lon": -77.0 + rnd.random(),
+                },
+            }
+        )
+    return out
+
+
+def span_edges(ids, m: int, seed: int = 11):
+    rnd = random.Random(seed)
+    n = len(ids)
+    out = []
+    for k in range(m):
+        i = k % n
+        cable = f"C{i // 100}"
+        length = 50.0 + rnd.random() * 30.0
+        out.append(
+            {
+                "id": f"S{k}",
+                "from": ids[i],
+                "to": ids[(i + 1) % n],
+                "group": "span",
+                "title": f"{cable} | 24 hilos | {length}m / {length * 0.98}m",
+                "meta": {
+                    "cable_id": cable,
+                    "cable_seg_id": f"S{k}",
+                    "length_m": length,
+                    "seg_seq": i % 100,
+                    "capacity_span": length * 0.98,
+                    "capacity_fibers": 24,
+                    "odf_route_id": f"R{i // 100}",
+                },
+            }
+        )
+    return out
+
+
+def _traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure_nodes(n: int) -> dict:
+    tracemalloc.start()
+    base = _traced()
+    nodes = pole_nodes(n)
+    as_dicts = _traced() - base
+    t0 = time.perf_counter()
+    graph = CompactGraph.from_dicts(nodes, [])
+    build_s = time.perf_counter() - t0
+    del nodes
+    compact = _traced() - base
+    tracemalloc.stop()
+
+    # mejor de 3: la primera pasada suele cargar con una colección del gc
+    sample_ms = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        graph.node_dicts(list(range(0, n, max(1, n // 1000))))
+        sample_ms = min(sample_ms, (time.perf_counter() - t0) * 1000.0)
+    t0 = time.perf_counter()
+    graph.node_dicts()
+    all_s = time.perf_counter() - t0
+    return {
+        "dicts": as_dicts,
+        "compact": compact,
+        "arrays": graph.memory()["nodes"],
+        "build_s": build_s,
+        "sample_ms": sample_ms,
+        "all_s": all_s,
+    }
+
+
+def measure_edges(n: int, m: int) -> dict:
+    # Los ids de los nodos (y su tabla mínima) son costo de los nodos: se
+    # crean antes de medir y se descuentan del CompactGraph.
+    ids = [f"P{i // 100}_{i % 100}" for i in range(n)]
+    interner = Interner()
+    interner.codes(ids, n)
+    node_min = [{"id": s} for s in ids]
+
+    tracemalloc.start()
+    base = _traced()
+    edges = span_edges(ids, m)
+    as_dicts = _traced() - base
+    t0 = time.perf_counter()
+    graph = CompactGraph.from_dicts(node_min, edges, interner)
+    graph.csr()
+    build_s = time.perf_counter() - t0
+    del edges
+    compact = _traced() - base - graph.memory()["nodes"]
+    tracemalloc.stop()
+    mem = graph.memory()
+    return {
+        "dicts": as_dicts,
+        "compact": compact,
+        "arrays": mem["edges"],
+        "csr": mem["csr"],
+        "build_s": build_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=1_000_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    nodes = measure_nodes(args.nodes)
+    edges = measure_edges(args.nodes, args.edges)
+
+    print(f"{'':<8} {'cantidad':>10} {'dicts B/el':>11} {'compact B/el':>13} {'x':>6}")
+    for name, count, r in (("nodos", args.nodes, nodes), ("aristas", args.edges, edges)):
+        d, c = r["dicts"] / count, r["compact"] / count
+        print(f"{name:<8} {count:>10} {d:>11.1f} {c:>13.1f} {d / c:>6.1f}")
+    print(
+        f"nodos:   arreglos {nodes['arrays'] / args.nodes:.1f} B/nodo "
+        f"(resto: strings internados); armado {nodes['build_s']:.2f} s"
+    )
+    print(
+        f"aristas: arreglos {edges['arrays'] / args.edges:.1f} B/arista + "
+        f"CSR {edges['csr'] / args.edges:.1f} B/arista; armado {edges['build_s']:.2f} s"
+    )
+    print(
+        f"dicts al responder: 1000 nodos {nodes['sample_ms']:.1f} ms, "
+        f"todos {nodes['all_s']:.2f} s"
+    )
+    total_d = nodes["dicts"] + edges["dicts"]
+    total_c = nodes["compact"] + edges["compact"]
+    print(f"total: dicts {total_d / 1e6:.0f} MB -> compact {total_c / 1e6:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
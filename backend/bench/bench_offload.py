@@ -0,0 +1,111 @@
+"""
+Benchmark: latencia de un endpoint liviano mientras corren armados pesados
+del overview, con OFFLOAD_MODE inline vs process.
+
+    cd backend && python -m bench.bench_offload --nodos 3000 --routes 20000 --heavy 2
+
+Las filas son sintéticas (no usa BD). El "endpoint liviano" es una función
+Python corta ejecutada en otro hilo del mismo proceso, como los requests
+que FastAPI atiende en su threadpool.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from core.config import settings
+from core.graph_assembly import assemble_overview
+from core.offload import offload
+
+
+def synthetic_rows(n_nodos: int, n_routes: int, mufas_per_route: int):
+    nodes = [
+        {"id": f"N{i}", "label": f"Nodo {i}", "code": f"ND{i}", "type": "CORE",
+         "reference": None, "gps_lat": -12.0 + i * 1e-4, "gps_lon": -77.0}
+        for i in range(n_nodos)
+    ]
+    routes, route_mufas = [], []
+    for r in range(n_routes):
+        a = r % n_nodos
+        b = (r * 7 + 1) % n_nodos
+        routes.append({"route_id": f"R{r}", "from_nodo_id": f"N{a}", "to_nodo_id": f"N{b}",
+                       "path_text": f"N{a} > N{b}"})
+        for k in range(mufas_per_route):
+            # mufas compartidas entre rutas del mismo origen -> splits
+            route_mufas.append({"route_id": f"R{r}", "mufa_id": f"M{a}_{k}", "mufa_code": f"MF{a}_{k}"})
+    return nodes, routes, route_mufas, {}
+
+
+def light_request(think_s: float = 0.002) -> float:
+    """
+    Latencia de un request chico: espera de I/O simulada + trabajo Python.
+    Se mide el exceso sobre `think_s`, que incluye la espera por el GIL.
+    """
+    t0 = time.perf_counter()
+    time.sleep(think_s)
+    payload = {"ok": True, "items": [{"id": i, "v": i * 2} for i in range(200)]}
+    str(payload)
+    return (time.perf_counter() - t0 - think_s) * 1000.0
+
+
+def run(mode: str, rows, heavy: int, seconds: float) -> dict:
+    settings.OFFLOAD_MODE = mode
+    settings.OFFLOAD_MIN_ROWS = 0
+    settings.OFFLOAD_WORKERS = max(heavy, 1)
+    offload.shutdown()
+    offload.start()
+
+    stop = threading.Event()
+    builds = []
+
+    def heavy_loop():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            offload.run("overview", assemble_overview, *rows, size=1)
+            builds.append((time.perf_counter() - t0) * 1000.0)
+
+    threads = [threading.Thread(target=heavy_loop) for _ in range(heavy)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    lat = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        lat.append(light_request())
+    stop.set()
+    for t in threads:
+        t.join()
+    offload.shutdown()
+    lat.sort()
+    q = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))]
+    return {
+        "mode": mode,
+        "light_requests": len(lat),
+        "light_p50_ms": round(statistics.median(lat), 3),
+        "light_p95_ms": round(q(0.95), 3),
+        "light_p99_ms": round(q(0.99), 3),
+        "light_max_ms": round(lat[-1], 3),
+        "heavy_builds": len(builds),
+        "heavy_avg_ms": round(statistics.mean(builds), 1) if builds else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodos", type=int, default=3000)
+    ap.add_argument("--routes", type=int, default=20000)
+    ap.add_argument("--mufas-per-route", type=int, default=3)
+    ap.add_argument("--heavy", type=int, default=2, help="armados concurrentes")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+    rows = synthetic_rows(args.nodos, args.routes, args.mufas_per_route)
+    t0 = time.perf_counter()
+    assemble_overview(*rows)
+    print(f"armado aislado: {(time.perf_counter() - t0) * 1000:.1f} ms")
+    for mode in ("inline", "process"):
+        print(run(mode, rows, args.heavy, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark: /topology/paths (core.routing) sobre una grilla sintética de
+postes, más un chequeo de que A* devuelve los mismos largos que Dijkstra.
+
+    cd backend && python -m bench.bench_routing --poles 100000 --k 1,3,5
+
+El chequeo arma la red de un poste sin GPS (el camino corto pasa por él)
+y redes chicas al azar con postes sin GPS, spans más cortos que su
+distancia GPS y nodos de tránsito; sale con código 1 si A* y Dijkstra no
+coinciden.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from core.routing import PathBudgetExceeded, PoleGraph, k_shortest_paths
+from core.util import haversine_m
+
+
+def _end(nodo: str, pole: str) -> dict:
+    return {"rn_first": 1, "from_nodo_id": nodo, "from_pole_id": pole, "rn_last": 0}
+
+
+def grid_network(n_poles: int, n_nodos: int = 8, seed: int = 3):
+    rnd = random.Random(seed)
+    side = max(2, int(n_poles**0.5))
+    poles, spans = [], []
+    for r in range(side):
+        for c in range(side):
+            poles.append({"id": f"P{r}_{c}", "gps_lat": -12.0 + r * 1e-3, "gps_lon": -77.0 + c * 1e-3})
+    for r in range(side):
+        for c in range(side):
+            for r2, c2 in ((r + 1, c), (r, c + 1)):
+                if r2 < side and c2 < side:
+                    a, b = poles[r * side + c], poles[r2 * side + c2]
+                    d = haversine_m(a["gps_lat"], a["gps_lon"], b["gps_lat"], b["gps_lon"])
+                    spans.append({"id": f"S{len(spans)}", "from_pole_id": a["id"],
+                                  "to_pole_id": b["id"], "length_m": d * (1.0 + rnd.random() * 0.3)})
+    ends = [_end(f"N{i}", poles[rnd.randrange(len(poles))]["id"]) for i in range(n_nodos)]
+    return PoleGraph(poles, spans, ends)
+
+
+def gps_less_network() -> PoleGraph:
+    # N0 - P0 - P1 (sin GPS) - P3 - N1: 12001 m; P0 - P2 - P3: 16000 m
+    poles = [
+        {"id": "P0", "gps_lat": -12.0, "gps_lon": -77.0},
+        {"id": "P1", "gps_lat": None, "gps_lon": None},
+        {"id": "P2", "gps_lat": -12.05, "gps_lon": -77.05},
+        {"id": "P3", "gps_lat": -12.0, "gps_lon": -77.1},
+    ]
+    spans = [
+        {"id": "S1", "from_pole_id": "P0", "to_pole_id": "P1", "length_m": 6000.0},
+        {"id": "S2", "from_pole_id": "P1", "to_pole_id": "P3", "length_m": 6001.0},
+        {"id": "S3", "from_pole_id": "P0", "to_pole_id": "P2", "length_m": 8000.0},
+        {"id": "S4", "from_pole_id": "P2", "to_pole_id": "P3", "length_m": 8000.0},
+    ]
+    return PoleGraph(poles, spans, [_end("N0", "P0"), _end("N1", "P3")])
+
+
+def random_network(rnd: random.Random, n: int) -> PoleGraph:
+    poles = []
+    for i in range(n):
+        gps = rnd.random() > 0.15
+        poles.append({"id": f"P{i}", "gps_lat": -12.0 + rnd.random() * 0.05 if gps else None,
+                      "gps_lon": -77.0 + rnd.random() * 0.05 if gps else None})
+    spans = []
+    for i in range(n * 2):
+        a, b = rnd.sample(poles, 2)
+        if a["gps_lat"] is not None and b["gps_lat"] is not None:
+            d = haversine_m(a["gps_lat"], a["gps_lon"], b["gps_lat"], b["gps_lon"])
+            length = d * rnd.uniform(0.6, 1.5)
+        else:
+            length = rnd.uniform(50.0, 3000.0)
+        spans.append({"id": f"S{i}", "from_pole_id": a["id"], "to_pole_id": b["id"], "length_m": length})
+    ends = []
+    for j in range(6):
+        for p in rnd.sample(poles, rnd.randint(1, 3)):
+            ends.append(_end(f"N{j}", p["id"]))
+    return PoleGraph(poles, spans, ends)
+
+
+def check_astar(cases: int = 300, seed: int = 5) -> int:
+    rnd = random.Random(seed)
+    graphs = [gps_less_network()] + [random_network(rnd, rnd.randint(6, 40)) for _ in range(cases)]
+    bad = 0
+    for gi, g in enumerate(graphs):
+        nodos = sorted(g.nodo_vertex)
+        for a in nodos:
+            for b in nodos:
+                if a == b:
+                    continue
+                for transit in (True, False):
+                    src, dst = g.nodo_vertex[a], g.nodo_vertex[b]
+                    costs = {}
+                    for astar in (True, False):
+                        found, _ = k_shortest_paths(g, src, dst, k=3, astar=astar, transit=transit)
+                        costs[astar] = [round(c, 6) for c, _ in found]
+                    if costs[True] != costs[False]:
+                        bad += 1
+                        print(f"red {gi} {a}->{b} transit={transit}: "
+                              f"astar {costs[True]} dijkstra {costs[False]}")
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--poles", type=int, default=100_000)
+    parser.add_argument("--k", default="1,3,5")
+    parser.add_argument("--max-expanded", type=int, default=2_000_000)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    bad = check_astar()
+    print(f"A* vs Dijkstra: {'OK' if bad == 0 else f'{bad} diferencias'}")
+
+    t0 = time.perf_counter()
+    g = grid_network(args.poles)
+    print(f"grilla: {g.n_poles} postes, armado {time.perf_counter() - t0:.1f} s")
+    nodos = sorted(g.nodo_vertex)
+    pairs = list(zip(nodos, nodos[1:]))
+    for k in (int(x) for x in args.k.split(",")):
+        for algorithm in ("astar", "dijkstra"):
+            times, expanded = [], 0
+            for a, b in pairs:
+                t0 = time.perf_counter()
+                try:
+                    _, exp = k_shortest_paths(
+                        g, g.nodo_vertex[a], g.nodo_vertex[b], k=k,
+                        astar=algorithm == "astar",
+                        max_expanded=args.max_expanded, timeout_s=args.timeout,
+                    )
+                except PathBudgetExceeded as e:
+                    print(f"  k={k} {algorithm} {a}->{b}: {e}")
+                    continue
+                times.append(time.perf_counter() - t0)
+                expanded += exp
+            if times:
+                print(f"k={k} {algorithm:<8} media {sum(times) / len(times) * 1000:8.1f} ms  "
+                      f"máx {max(times) * 1000:8.1f} ms  expandidos/consulta {expanded // len(times)}")
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
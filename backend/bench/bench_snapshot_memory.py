@@ -0,0 +1,153 @@
+"""
+Benchmark: memoria por worker al armar los builders de topología desde el
+snapshot (core.snapshot) materializando filas vs. leyendo columnas.
+
+    cd backend && python -m bench.bench_snapshot_memory --cables 6000 --workers 2
+
+Escribe un snapshot sintético (hilos, empalmes, puertos, segmentos de ruta)
+y levanta `--workers` procesos nuevos (spawn, como los workers de uvicorn)
+por modo. Cada uno mapea el snapshot y arma LossModel, Utilization e
+ImpactIndex:
+
+    filas     todas las tablas con Snapshot.rows (lo que hacía load_table)
+    columnas  las tablas grandes con Snapshot.table (lo que hace load_columns)
+
+Se informa de /proc/self/status: RssAnon (memoria privada del worker, lo que
+se multiplica por worker), RssFile (páginas del mmap, compartidas entre
+workers) y VmHWM (pico).
+"""
+
+import argparse
+import gc
+import multiprocessing as mp
+import os
+import random
+import time
+
+from core.impact import ImpactIndex
+from core.loss_budget import LossModel
+from core.routing import PoleGraph
+from core.snapshot import Snapshot, write_snapshot
+from core.utilization import Utilization
+
+# Tablas que los builders leen con core.tables.load_columns
+COLUMN_TABLES = {"fiber_filament", "used_filament", "odf_route_segment", "splice", "odf_port_fiber"}
+
+
+def synthetic_tables(n_cables: int, fibers: int = 144, spans_per_cable: int = 12, seed: int = 5):
+    rnd = random.Random(seed)
+    n_poles = n_cables * spans_per_cable // 2
+    poles = [
+        {"id": f"P{i}", "gps_lat": -12.0 + rnd.random() * 0.3, "gps_lon": -77.0 + rnd.random() * 0.3}
+        for i in range(n_poles)
+    ]
+    cables, filaments, used, spans, segments = [], [], [], [], []
+    splices, ports, mufas, ends, route_nodos = [], [], [], [], []
+    for c in range(n_cables):
+        cid = f"C{c}"
+        cables.append({"id": cid, "code": f"CAB-{c}", "fiber_count": fibers})
+        start = rnd.randrange(n_poles)
+        chain = [f"P{(start + k) % n_poles}" for k in range(spans_per_cable + 1)]
+        for k in range(spans_per_cable):
+            spans.append({
+                "id": f"S{c}_{k}", "cable_id": cid, "seq": k,
+                "from_pole_id": chain[k], "to_pole_id": chain[k + 1],
+                "length_m": 80.0 + rnd.random() * 60.0, "material_type": "SM",
+            })
+        rid, na, nb = f"RT{c}", f"N{c % 50}", f"N{(c + 1) % 50}"
+        ends.append({"route_id": rid, "from_nodo_id": na, "to_nodo_id": nb,
+                     "from_pole_id": chain[0], "to_pole_id": chain[-1], "rn_first": 1, "rn_last": 1})
+        route_nodos.append({"route_id": rid, "from_nodo_id": na, "to_nodo_id": nb})
+        for k in range(spans_per_cable):
+            segments.append({"odf_route_id": rid, "cable_span_id": f"S{c}_{k}"})
+        mid = f"M{c}"
+        mufas.append({"id": mid, "code": f"MF-{c}", "pole_id": chain[spans_per_cable // 2]})
+        for f in range(fibers):
+            fid = f"{cid}-F{f + 1}"
+            filaments.append({"id": fid, "cable_id": cid})
+            if f % 2 == 0:
+                used.append({"fid": fid})
+            if f % 4 == 0:
+                splices.append({"id": f"SP{c}_{f}", "mufa_id": mid,
+                                "a_fiber_filament_id": fid, "b_fiber_filament_id": f"{cid}-F{f + 2}"})
+            if f % 8 == 0:
+                ports.append({"odf_port_id": f"ODF{c % 50}-P{c}_{f}", "fiber_filament_id": fid,
+                              "odf_id": f"ODF{c % 50}", "nodo_id": na})
+    return {
+        "pole": poles, "cable": cables, "fiber_filament": filaments, "used_filament": used,
+        "cable_span": spans, "odf_route_segment": segments, "splice": splices,
+        "odf_port_fiber": ports, "mufa": mufas, "route_ends": ends, "route_nodos": route_nodos,
+    }
+
+
+def _status() -> dict:
+    out = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM", "RssAnon", "RssFile"):
+                out[key] = int(value.split()[0]) * 1024
+    return out
+
+
+def worker(path: str, mode: str, results):
+    snap = Snapshot(path)
+    gc.collect()
+    base = _status()
+
+    def src(name):
+        if mode == "columnas" and name in COLUMN_TABLES:
+            return snap.table(name)
+        return snap.rows(name)
+
+    t0 = time.perf_counter()
+    loss = LossModel(src("fiber_filament"), src("splice"), src("cable_span"),
+                     src("odf_port_fiber"), src("mufa"), src("route_ends"))
+    util = Utilization(src("cable"), src("fiber_filament"), src("used_filament"),
+                       src("cable_span"), src("odf_route_segment"), loss.paths)
+    graph = PoleGraph(src("pole"), src("cable_span"), src("route_ends"))
+    impact = ImpactIndex(src("cable_span"), src("route_nodos"), src("mufa"), src("splice"), util, graph)
+    build_s = time.perf_counter() - t0
+    gc.collect()
+    end = _status()
+    results.put({"mode": mode, "pid": os.getpid(), "base": base, "end": end, "build_s": build_s})
+    del util, loss, graph, impact
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cables", type=int, default=6000)
+    parser.add_argument("--fibers", type=int, default=144)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--path", default="/tmp/mir_bench_snapshot.bin")
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.cables, args.fibers)
+    info = write_snapshot(args.path, tables)
+    del tables
+    counts = ", ".join(f"{k} {v}" for k, v in info["tables"].items() if k in COLUMN_TABLES)
+    print(f"snapshot {info['bytes'] / 1e6:.0f} MB: {counts}")
+
+    ctx = mp.get_context("spawn")
+    mb = lambda v: f"{v / 2**20:8.0f}"
+    print(f"{'modo':<9} {'pid':>7} {'RssAnon':>8} {'RssFile':>8} {'VmRSS':>8} {'VmHWM':>8} "
+          f"{'Δanon':>8} {'armado':>7}   (MB)")
+    try:
+        for mode in ("filas", "columnas"):
+            results = ctx.Queue()
+            procs = [ctx.Process(target=worker, args=(args.path, mode, results)) for _ in range(args.workers)]
+            for p in procs:
+                p.start()
+            out = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            for r in out:
+                e, b = r["end"], r["base"]
+                print(f"{mode:<9} {r['pid']:>7} {mb(e['RssAnon'])} {mb(e['RssFile'])} {mb(e['VmRSS'])} "
+                      f"{mb(e['VmHWM'])} {mb(e['RssAnon'] - b['RssAnon'])} {r['build_s']:6.1f}s")
+    finally:
+        os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
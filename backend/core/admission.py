@@ -0,0 +1,210 @@
+import asyncio
+import json
+import math
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Pattern, Tuple
+
+from . import timing
+from .config import settings
+
+# Clase de cada endpoint por path (primer match). Lo que no matchea es
+# "light"; "exempt" no pasa por el control de admisión (SSE, health).
+ENDPOINT_CLASSES: List[Tuple[str, Pattern]] = [
+    ("exempt", re.compile(r"^/(health|events/stream)")),
+    ("heavy", re.compile(r"^/graph/overview")),
+    ("heavy", re.compile(r"^/topology/routes/[^/]+/graph")),
+    ("heavy", re.compile(r"^/fibers/(odf-ports/)?[^/]+/trace")),
+    ("heavy", re.compile(r"^/fibers/loss-budget/")),
+    ("heavy", re.compile(r"^/topology/(paths|utilization|impact|span-quality|inventory)")),
+    ("heavy", re.compile(r"^/export/")),
+]
+
+
+def classify(path: str) -> str:
+    for cls, pattern in ENDPOINT_CLASSES:
+        if pattern.match(path):
+            return cls
+    return "light"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Límite de concurrencia de una clase de endpoints con cola de espera
+    acotada (FIFO). Vive en el event loop: acquire/release no usan locks.
+
+    - hasta `limit` requests en curso;
+    - hasta `queue` esperando, cada uno como mucho `wait_s`;
+    - si la cola está llena o vence la espera se rechaza al instante
+      (503 + Retry-After estimado con el tiempo de servicio medio).
+    """
+
+    def __init__(self, name: str, limit: int, queue: int, wait_s: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue = max(0, queue)
+        self.wait_s = wait_s
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # métricas
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.service_ewma_s = 0.0
+
+    def retry_after(self) -> int:
+        # tiempo aproximado hasta que se vacíe la cola actual
+        backlog = len(self._waiters) + 1
+        est = self.service_ewma_s * backlog / self.limit
+        return max(1, math.ceil(est))
+
+    async def acquire(self) -> float:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("ADMISSION_QUEUE_FULL", self.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.wait_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # el cupo llegó justo al vencer: se devuelve
+                self.release(0.0, count=False)
+            else:
+                fut.cancel()
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected_timeout += 1
+            raise AdmissionRejected("ADMISSION_WAIT_TIMEOUT", self.retry_after())
+        waited = time.perf_counter() - t0
+        self.admitted += 1
+        self.wait_total_s += waited
+        self.wait_max_s = max(self.wait_max_s, waited)
+        return waited
+
+    def release(self, service_s: float, count: bool = True):
+        if count:
+            a = 0.2
+            self.service_ewma_s = service_s if self.service_ewma_s == 0 else (
+                (1 - a) * self.service_ewma_s + a * service_s
+            )
+        # el cupo pasa directo al siguiente en la cola (active no cambia)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def status(self) -> dict:
+        waits = self.admitted
+        return {
+            "class": self.name,
+            "limit": self.limit,
+            "queue": self.queue,
+            "wait_s": self.wait_s,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms_avg": round(self.wait_total_s * 1000.0 / waits, 3) if waits else 0.0,
+            "wait_ms_max": round(self.wait_max_s * 1000.0, 3),
+            "service_ms_ewma": round(self.service_ewma_s * 1000.0, 3),
+        }
+
+
+def _build_gates() -> Dict[str, AdmissionGate]:
+    return {
+        "heavy": AdmissionGate(
+            "heavy",
+            settings.ADMISSION_HEAVY_LIMIT,
+            settings.ADMISSION_HEAVY_QUEUE,
+            settings.ADMISSION_HEAVY_WAIT_S,
+        ),
+        "light": AdmissionGate(
+            "light",
+            settings.ADMISSION_LIGHT_LIMIT,
+            settings.ADMISSION_LIGHT_QUEUE,
+            settings.ADMISSION_LIGHT_WAIT_S,
+        ),
+    }
+
+
+gates: Dict[str, AdmissionGate] = _build_gates()
+
+
+def admission_status() -> List[dict]:
+    return [g.status() for g in gates.values()]
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI: cada request toma un cupo de su clase antes de llegar
+    al endpoint (y antes de ocupar un hilo del threadpool o una conexión del
+    pool), y lo libera al terminar de enviar la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        gate = gates.get(classify(scope.get("path", "")))
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            waited = await gate.acquire()
+        except AdmissionRejected as e:
+            await _reject(send, e)
+            return
+        timing.record("admission_wait", waited)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - t0)
+
+
+async def _reject(send, e: AdmissionRejected):
+    body = json.dumps({"detail": e.reason}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(e.retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
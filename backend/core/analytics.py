@@ -0,0 +1,464 @@
+"""
+Backend analítico embebido (DuckDB) para lecturas masivas.
+
+Las consultas se agrupan en familias ("topology": las cargas masivas de
+core.tables; "inventory": inventario de todas las rutas). Con
+ANALYTICS_BACKEND=duckdb las familias de ANALYTICS_FAMILIES se ejecutan
+contra una copia columnar de las tablas dbo.* (archivo ANALYTICS_PATH) en
+vez de SQL Server; el SQL es el mismo, con una traducción mínima de T-SQL.
+
+La copia se regenera en segundo plano cada ANALYTICS_REFRESH_S y cuando
+cambia la topología. Con varios workers exporta uno solo a la vez (lock de
+archivo `ANALYTICS_PATH.lock`); los demás toman el archivo nuevo al verlo
+reemplazado. La frescura se decide por `exported_at` (inicio del export) del
+archivo, no por versiones de topología, que son por proceso. Mientras está
+vieja (o si DuckDB falla) las consultas vuelven a SQL Server, así el
+resultado nunca difiere.
+
+    python -m core.analytics export [ruta]
+    python -m core.analytics verify [ruta]
+    python -m core.analytics info [ruta]
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sqlalchemy import text
+
+from .changefeed import feed
+from .config import settings
+from .db import connect, fetch_all
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - backend opcional
+    duckdb = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+FAMILIES = ("topology", "inventory")
+
+# Tablas y vistas dbo.* que se copian (todo lo que leen las familias)
+EXPORT_TABLES = [
+    "nodo",
+    "odf",
+    "odf_route",
+    "odf_route_segment",
+    "cable",
+    "cable_span",
+    "pole",
+    "mufa",
+    "splice",
+    "fiber_filament",
+    "odf_port",
+    "odf_port_fiber",
+    "vw_backbone_edges",
+    "vw_route_segments_expanded",
+]
+
+_NVARCHAR_RE = re.compile(r"\bN?VARCHAR\s*\(\s*(\d+|MAX)\s*\)", re.IGNORECASE)
+_PARAM_RE = re.compile(r"(?<![:\w]):(\w+)")
+
+
+def translate(sql: str) -> str:
+    """T-SQL de las familias -> DuckDB: tipos de texto y parámetros :x -> $x."""
+    sql = _NVARCHAR_RE.sub("VARCHAR", sql)
+    sql = sql.replace("SYSUTCDATETIME()", "now()")
+    return _PARAM_RE.sub(r"$\1", sql)
+
+
+# ----------------------------------------------------------------------
+# Export: filas de SQL Server -> columnas numpy tipadas -> tabla DuckDB
+# ----------------------------------------------------------------------
+def _column(values: Sequence) -> Tuple[np.ndarray, np.ndarray, str]:
+    """(datos, nulos, tipo DuckDB) de una columna, preservando el tipo Python."""
+    nulls = np.array([v is None for v in values], dtype=bool)
+    sample = [v for v in values if v is not None]
+    kinds = {type(v) for v in sample}
+    if not sample:
+        return np.array([""] * len(values)), nulls, "VARCHAR"
+    if kinds == {bool}:
+        return np.array([bool(v) for v in values]), nulls, "BOOLEAN"
+    if kinds == {int}:
+        return np.array([0 if v is None else v for v in values], dtype=np.int64), nulls, "BIGINT"
+    if kinds <= {float, int}:
+        data = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        return data, nulls, "DOUBLE"
+    if kinds == {Decimal}:
+        scale = max(max(-v.as_tuple().exponent, 0) for v in sample)
+        digits = np.array(["0" if v is None else str(v) for v in values])
+        return digits, nulls, f"DECIMAL(38,{min(scale, 18)})"
+    if kinds == {datetime}:
+        data = np.array([np.datetime64("NaT") if v is None else v for v in values], dtype="datetime64[us]")
+        return data, nulls, "TIMESTAMP"
+    if kinds == {date}:
+        data = np.array([np.datetime64("NaT") if v is None else v for v in values], dtype="datetime64[D]")
+        return data, nulls, "DATE"
+    return np.array(["" if v is None else str(v) for v in values]), nulls, "VARCHAR"
+
+
+def _load_table(con, name: str, rows: List[dict], columns: List[str]):
+    arrays: Dict[str, np.ndarray] = {}
+    exprs = []
+    for i, col in enumerate(columns):
+        data, nulls, sql_type = _column([r[col] for r in rows])
+        arrays[f"c{i}"], arrays[f"n{i}"] = data, nulls
+        exprs.append(f'CASE WHEN n{i} THEN NULL ELSE CAST(c{i} AS {sql_type}) END AS "{col}"')
+    if not rows:
+        # tabla vacía: sin filas no hay tipos; se crea con columnas de texto
+        cols = ", ".join(f'"{c}" VARCHAR' for c in columns)
+        con.execute(f"CREATE TABLE dbo.{name} ({cols})")
+        return
+    con.register("src", arrays)
+    try:
+        con.execute(f"CREATE TABLE dbo.{name} AS SELECT {', '.join(exprs)} FROM src")
+    finally:
+        con.unregister("src")
+
+
+class ExportInProgress(RuntimeError):
+    """Otro proceso está exportando la copia (tiene el lock)."""
+
+
+@contextmanager
+def _export_lock(path: str):
+    """Lock de archivo entre procesos, sin esperar: cede False si está tomado."""
+    f = open(f"{path}.lock", "a+b")
+    try:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is None:
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+def _fetch_with_columns(name: str) -> Tuple[List[dict], List[str]]:
+    with connect() as conn:
+        result = conn.execute(text(f"SELECT * FROM dbo.{name}"))
+        columns = list(result.keys())
+        return [dict(r) for r in result.mappings()], columns
+
+
+def export(path: Optional[str] = None) -> dict:
+    """
+    Copia EXPORT_TABLES desde SQL Server a un archivo DuckDB nuevo. Un solo
+    proceso exporta a la vez: si otro tiene el lock, ExportInProgress.
+    """
+    if duckdb is None:
+        raise RuntimeError("duckdb no está instalado")
+    path = path or settings.ANALYTICS_PATH
+    with _export_lock(path) as locked:
+        if not locked:
+            raise ExportInProgress(f"{path}: export en curso en otro proceso")
+        return _export(path)
+
+
+def _export(path: str) -> dict:
+    """Export con el lock tomado, a un temporal por proceso + os.replace."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    for p in (tmp, f"{tmp}.wal"):
+        if os.path.exists(p):
+            os.remove(p)
+    t0 = time.perf_counter()
+    # inicio del export: los cambios posteriores pueden no estar en la copia
+    exported_at = time.time()
+    counts = {}
+    con = duckdb.connect(tmp)
+    try:
+        con.execute("CREATE SCHEMA dbo")
+        for name in EXPORT_TABLES:
+            rows, columns = _fetch_with_columns(name)
+            _load_table(con, name, rows, columns)
+            counts[name] = len(rows)
+        con.execute("CREATE TABLE _export_info (exported_at DOUBLE)")
+        con.execute("INSERT INTO _export_info VALUES (?)", [exported_at])
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+    os.replace(tmp, path)
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "exported_at": exported_at,
+        "tables": counts,
+        "export_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    }
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+class AnalyticsBackend:
+    """
+    Rutea familias de consultas a DuckDB cuando la copia está fresca: su
+    export empezó después del último cambio de topología visto por este
+    proceso y tiene menos de ANALYTICS_MAX_AGE_S. Si no, o si DuckDB falla,
+    se usa SQL Server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._con = None
+        self._local = threading.local()
+        self._mtime = 0.0
+        self.exported_at: Optional[float] = None
+        # último cambio de topología de este proceso (hora de pared, para
+        # compararla con exported_at de un export hecho en cualquier worker)
+        self._seen_version = feed.topology_version
+        self.topology_changed_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.last_error: Optional[str] = None
+        self.duckdb_queries = 0
+        self.sqlserver_queries = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ANALYTICS_BACKEND == "duckdb" and duckdb is not None
+
+    def families(self) -> List[str]:
+        return [f.strip() for f in settings.ANALYTICS_FAMILIES.split(",") if f.strip()]
+
+    def _open(self):
+        """Conexión de sólo lectura; se reabre si el archivo fue reemplazado."""
+        path = settings.ANALYTICS_PATH
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if self._con is not None and mtime == self._mtime:
+            return self._con
+        with self._lock:
+            if self._con is None or mtime != self._mtime:
+                # DuckDB reutiliza la instancia abierta de la misma ruta: hay
+                # que cerrar la vieja antes, si no se sigue leyendo el archivo
+                # reemplazado. Las consultas en curso sobre ella fallan y
+                # vuelven a SQL Server (fetch_all).
+                if self._con is not None:
+                    self._con.close()
+                    self._con = None
+                self._local = threading.local()
+                con = duckdb.connect(path, read_only=True)
+                (exported_at,) = con.execute("SELECT exported_at FROM _export_info").fetchone()
+                self._con, self._mtime, self.exported_at = con, mtime, exported_at
+        return self._con
+
+    def _changed_at(self) -> float:
+        tv = feed.topology_version
+        if tv != self._seen_version:
+            self._seen_version, self.topology_changed_at = tv, time.time()
+        return self.topology_changed_at
+
+    def fresh(self) -> bool:
+        if self._open() is None:
+            return False
+        exported_at = self.exported_at or 0.0
+        return (
+            exported_at >= self._changed_at()
+            and time.time() - exported_at < settings.ANALYTICS_MAX_AGE_S
+        )
+
+    def routes(self, family: str) -> bool:
+        return self.enabled and family in self.families() and self.fresh()
+
+    def _cursor(self):
+        cur = getattr(self._local, "cursor", None)
+        if cur is None:
+            cur = self._local.cursor = self._open().cursor()
+        return cur
+
+    def query(self, sql: str, params: Optional[dict] = None) -> List[dict]:
+        cur = self._cursor()
+        cur.execute(translate(sql), params or {})
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def fetch_all(self, family: str, sql: str, params: dict) -> List[dict]:
+        if self.routes(family):
+            try:
+                rows = self.query(sql, params)
+                self.duckdb_queries += 1
+                return rows
+            except Exception as e:
+                self.last_error = str(e)[:300]
+                self.fallbacks += 1
+                logger.warning("Consulta analítica %s falló en DuckDB, se usa SQL Server: %s", family, e)
+        self.sqlserver_queries += 1
+        return fetch_all(sql, **params)
+
+    def refresh(self, newer_than: Optional[float] = None) -> Optional[dict]:
+        """
+        Exporta con el lock entre procesos. Con `newer_than`, si ya hay una
+        copia exportada después (otro worker la regeneró mientras se
+        esperaba), no hace nada y devuelve None.
+        """
+        if duckdb is None:
+            raise RuntimeError("duckdb no está instalado")
+        path = settings.ANALYTICS_PATH
+        with _export_lock(path) as locked:
+            if not locked:
+                raise ExportInProgress(f"{path}: export en curso en otro proceso")
+            if newer_than is not None and self._open() is not None:
+                if (self.exported_at or 0.0) > newer_than:
+                    return None
+            out = _export(path)
+        self._open()
+        return out
+
+    def start_refresh(self):
+        """Re-exporta cuando cambia la topología o vence ANALYTICS_REFRESH_S."""
+        if not self.enabled or settings.ANALYTICS_REFRESH_S <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="analytics-refresh", daemon=True)
+        self._thread.start()
+
+    def _refresh_loop(self):
+        retry_at = 0.0
+        while not self._stop.wait(1.0):
+            try:
+                self._open()
+            except Exception as e:
+                self.last_error = str(e)[:300]
+            exported_at = self.exported_at or 0.0
+            # la copia tiene que haber empezado después de esto
+            due = max(self._changed_at(), time.time() - settings.ANALYTICS_REFRESH_S)
+            if exported_at > due or time.monotonic() < retry_at:
+                continue
+            try:
+                out = self.refresh(newer_than=due)
+                self.last_error = None
+                if out is not None:
+                    logger.info("Copia analítica regenerada en %s ms", out["export_ms"])
+            except ExportInProgress:
+                # otro worker la está regenerando: se toma su archivo al verlo
+                continue
+            except Exception as e:
+                self.last_error = str(e)[:300]
+                retry_at = time.monotonic() + settings.ANALYTICS_REFRESH_S
+                logger.warning("No se pudo regenerar la copia analítica: %s", e)
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        return {
+            "backend": settings.ANALYTICS_BACKEND,
+            "available": duckdb is not None,
+            "enabled": self.enabled,
+            "families": self.families(),
+            "path": settings.ANALYTICS_PATH,
+            "fresh": self.enabled and self.fresh(),
+            "exported_at": self.exported_at,
+            "topology_changed_at": self._changed_at() or None,
+            "duckdb_queries": self.duckdb_queries,
+            "sqlserver_queries": self.sqlserver_queries,
+            "fallbacks": self.fallbacks,
+            "last_error": self.last_error,
+        }
+
+
+analytics = AnalyticsBackend()
+
+
+def fetch_analytic(family: str, sql: str, **params) -> List[dict]:
+    """fetch_all para consultas de una familia analítica."""
+    return analytics.fetch_all(family, sql, params)
+
+
+# ----------------------------------------------------------------------
+# Verificación: mismas filas en SQL Server y DuckDB
+# ----------------------------------------------------------------------
+def _normalize(v):
+    if isinstance(v, float):
+        return round(v, 6)
+    if isinstance(v, Decimal):
+        return round(float(v), 6)
+    return v
+
+
+def _canonical(rows: List[dict]) -> List[tuple]:
+    return sorted(
+        (tuple((k, _normalize(v)) for k, v in sorted(r.items())) for r in rows), key=repr
+    )
+
+
+def analytic_queries() -> Dict[str, Tuple[str, str]]:
+    """{nombre: (familia, sql)} de todas las consultas que pueden ir a DuckDB."""
+    from .tables import ANALYTIC_TABLES, ROUTE_INVENTORY_SQL, TABLES
+
+    out = {name: ("topology", TABLES[name]) for name in ANALYTIC_TABLES}
+    out["route_inventory"] = ("inventory", ROUTE_INVENTORY_SQL)
+    return out
+
+
+def verify() -> Dict[str, dict]:
+    """Compara cada consulta en ambos backends (floats a 6 decimales)."""
+    out = {}
+    for name, (_family, sql) in analytic_queries().items():
+        t0 = time.perf_counter()
+        expected = fetch_all(sql)
+        t1 = time.perf_counter()
+        got = analytics.query(sql)
+        t2 = time.perf_counter()
+        out[name] = {
+            "rows": len(expected),
+            "identical": _canonical(expected) == _canonical(got),
+            "sqlserver_ms": round((t1 - t0) * 1000.0, 1),
+            "duckdb_ms": round((t2 - t1) * 1000.0, 1),
+        }
+    return out
+
+
+def _main(argv: List[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m core.analytics")
+    parser.add_argument("command", choices=["export", "verify", "info"])
+    parser.add_argument("path", nargs="?", default=None)
+    args = parser.parse_args(argv)
+    if args.path:
+        settings.ANALYTICS_PATH = args.path
+    if args.command == "export":
+        out = export()
+    elif args.command == "verify":
+        out = verify()
+    else:
+        analytics._open()
+        out = analytics.status()
+    print(json.dumps(out, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+
+def str_array(rows: Iterable[dict], key: str) -> np.ndarray:
+    """
+    Columna `key` de filas de fetch_all como arreglo de strings (None -> "").
+    También acepta una tabla columnar (core.snapshot.SnapshotTable).
+    """
+    if hasattr(rows, "str_array"):
+        return rows.str_array(key)  # type: ignore[union-attr]
+    return np.array([("" if r[key] is None else str(r[key])) for r in rows], dtype=str)
+
+
+def float_array(rows: Iterable[dict], key: str) -> np.ndarray:
+    """Columna `key` como float64 (None -> nan). Acepta Decimal de SQL Server."""
+    if hasattr(rows, "float_array"):
+        return rows.float_array(key)  # type: ignore[union-attr]
+    return np.array(
+        [(np.nan if r[key] is None else float(r[key])) for r in rows], dtype=np.float64
+    )
+
+
+def has_column(rows, key: str) -> bool:
+    """Si las filas (o la tabla columnar) traen `key`."""
+    if hasattr(rows, "columns"):
+        return key in rows.columns
+    return not rows or key in rows[0]
+
+
+def encode(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Codifica `values` como índices enteros dentro de `keys` (ordenado y sin
+    repetidos). Devuelve (índices, válido); los inválidos quedan en 0.
+    """
+    if len(keys) == 0:
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(keys, values)
+    idx = np.minimum(idx, len(keys) - 1)
+    valid = keys[idx] == values
+    return np.where(valid, idx, 0).astype(np.int64), valid
+
+
+def group_argmin(groups: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Para cada grupo 0..n_groups-1, la posición (en `values`) de su mínimo;
+    -1 si el grupo no tiene elementos.
+    """
+    out = np.full(n_groups, -1, dtype=np.int64)
+    if len(values) == 0:
+        return out
+    order = np.lexsort((values, groups))
+    g_sorted = groups[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = g_sorted[1:] != g_sorted[:-1]
+    out[g_sorted[first]] = order[first]
+    return out
+
+
+def to_list(a: np.ndarray) -> List:
+    """Arreglo numpy -> lista de tipos Python (nan -> None) para JSON."""
+    if a.dtype.kind == "f":
+        return [None if v != v else v for v in a.tolist()]
+    return a.tolist()
+
+
+def csr_adjacency(
+    n: int, a: np.ndarray, b: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Adyacencia no dirigida en formato CSR para `n` nodos y aristas a[k]-b[k]
+    (índices; -1 = extremo fuera del grafo, se ignora, igual que los lazos).
+    Devuelve (indptr, vecinos, arista): los vecinos de i son
+    vecinos[indptr[i]:indptr[i + 1]], en el orden de las aristas.
+    """
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    edge = np.arange(len(a), dtype=np.int64)
+    ok = (a >= 0) & (b >= 0) & (a != b)
+    a, b, edge = a[ok], b[ok], edge[ok]
+    # (a->b, b->a) intercalados: el orden estable conserva el de las aristas
+    src = np.stack([a, b], axis=1).ravel()
+    dst = np.stack([b, a], axis=1).ravel()
+    edge = np.repeat(edge, 2)
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32), edge[order].astype(np.int32)
@@ -0,0 +1,257 @@
+import gzip
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - sin brotli sólo se publica gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# nombre-pid-vVERSION-variante.json.gz|br
+_FILE_RE = re.compile(
+    r"^(?P<name>[a-z_]+)-(?P<pid>\d+)-v(?P<version>\d+)-(?P<variant>[\w-]+)\.json\.(?:gz|br)$"
+)
+
+_EXT = {"br": "br", "gzip": "gz"}
+
+# preferencia del servidor ante q iguales
+_PREFERENCE = ("br", "gzip")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def accepted_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Mejor codificación de `available` según Accept-Encoding (None = ninguna)."""
+    q: Dict[str, float] = {}
+    for part in (accept_encoding or "").lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[token.strip()] = weight
+    best, best_q = None, 0.0
+    for enc in _PREFERENCE:
+        if enc not in available:
+            continue
+        weight = q.get(enc, q.get("*", 0.0))
+        if weight > best_q:
+            best, best_q = enc, weight
+    return best
+
+
+class Artifact:
+    """Un payload ya serializado y comprimido en disco (una versión, una variante)."""
+
+    def __init__(self, version: int, variant: str, from_snapshot: bool, epoch: str = ""):
+        self.version = version
+        self.variant = variant
+        self.from_snapshot = from_snapshot
+        self.epoch = epoch
+        self.files: Dict[str, str] = {}  # codificación -> ruta
+        self.sizes: Dict[str, int] = {"identity": 0}
+        self.built_at = time.time()
+        self.build_ms = 0.0
+
+    def etag(self, encoding: str) -> str:
+        # con el epoch: la misma versión de otro worker o proceso es otro payload
+        return f'"{self.epoch}-{self.version}-{self.variant}-{encoding}"'
+
+
+class ArtifactStore:
+    """
+    Payloads pre-armados y pre-comprimidos (gzip y, si está instalado,
+    brotli) en un directorio local, con la versión en el nombre del archivo.
+    El endpoint sirve el archivo tal cual (FileResponse) en vez de armar y
+    serializar por request.
+
+    Un hilo llama a `builder` cada `poll_s`; el builder decide si hay una
+    versión nueva y la publica con `publish()`. Se conservan las últimas
+    `keep` versiones por variante (un request puede estar enviando la
+    anterior) y se borran los archivos de procesos que ya no existen. El pid
+    va en el nombre: cada worker tiene su propia numeración de versiones.
+    """
+
+    def __init__(self, name: str, directory: str, keep: int = 2, epoch: str = ""):
+        self.name = name
+        self.directory = directory
+        self.epoch = epoch
+        self.keep = max(1, keep)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._current: Dict[str, Artifact] = {}
+        self._history: Dict[str, List[Artifact]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.builds = 0
+        self.served = 0
+        self.not_modified = 0
+        self.fallbacks = 0
+        self.removed = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def encodings(self) -> Tuple[str, ...]:
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def _path(self, version: int, variant: str, encoding: str) -> str:
+        filename = f"{self.name}-{self._pid}-v{version}-{variant}.json.{_EXT[encoding]}"
+        return os.path.join(self.directory, filename)
+
+    # ------------------------------------------------------------------
+    # Publicación
+    # ------------------------------------------------------------------
+    def get(self, variant: str, version: int) -> Optional[Artifact]:
+        art = self._current.get(variant)
+        if art is None or art.version != version:
+            return None
+        return art
+
+    def publish(
+        self, version: int, variant: str, body: bytes, from_snapshot: bool = False
+    ) -> Artifact:
+        t0 = time.perf_counter()
+        art = Artifact(version, variant, from_snapshot, self.epoch)
+        art.sizes["identity"] = len(body)
+        for enc in self.encodings():
+            if enc == "br":
+                data = brotli.compress(body, quality=settings.OVERVIEW_ARTIFACT_BROTLI_QUALITY)
+            else:
+                data = gzip.compress(
+                    body, compresslevel=settings.OVERVIEW_ARTIFACT_GZIP_LEVEL, mtime=0
+                )
+            path = self._path(version, variant, enc)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            art.files[enc] = path
+            art.sizes[enc] = len(data)
+        art.build_ms = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            self._current[variant] = art
+            history = self._history.setdefault(variant, [])
+            history.append(art)
+            self._history[variant] = history[-self.keep :]
+        self.builds += 1
+        self.gc()
+        logger.info(
+            "Artefacto %s v%s (%s) publicado en %.1f ms: %s",
+            self.name,
+            version,
+            variant,
+            art.build_ms,
+            ", ".join(f"{k}={v}" for k, v in art.sizes.items()),
+        )
+        return art
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+                self.removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("No se pudo borrar el artefacto %s: %s", path, e)
+
+    def gc(self):
+        """
+        Borra los archivos de este store que no son de las versiones
+        vigentes: los propios y los de procesos que ya terminaron.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        with self._lock:
+            live = {p for arts in self._history.values() for a in arts for p in a.files.values()}
+        stale = []
+        for entry in os.scandir(self.directory):
+            name = entry.name[:-4] if entry.name.endswith(".tmp") else entry.name
+            m = _FILE_RE.match(name)
+            if m is None or m["name"] != self.name or entry.path in live:
+                continue
+            pid = int(m["pid"])
+            if pid == self._pid or not _pid_alive(pid):
+                stale.append(entry.path)
+        self._remove(stale)
+
+    # ------------------------------------------------------------------
+    # Hilo de armado
+    # ------------------------------------------------------------------
+    def start(self, builder: Callable[[], None], poll_s: float):
+        if not self.enabled or self._thread is not None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.gc()
+        except OSError as e:
+            logger.warning("Directorio de artefactos %s no disponible: %s", self.directory, e)
+            self.directory = ""
+            return
+        self._stop.clear()
+
+        def loop():
+            while True:
+                try:
+                    builder()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning("No se pudo armar el artefacto %s: %s", self.name, e)
+                if self._stop.wait(poll_s):
+                    return
+
+        self._thread = threading.Thread(target=loop, name=f"artifacts-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "encodings": list(self.encodings()),
+            "builds": self.builds,
+            "served": self.served,
+            "not_modified": self.not_modified,
+            "fallbacks": self.fallbacks,
+            "removed": self.removed,
+            "last_error": self.last_error,
+            "current": {
+                variant: {
+                    "version": a.version,
+                    "from_snapshot": a.from_snapshot,
+                    "sizes": a.sizes,
+                    "build_ms": round(a.build_ms, 3),
+                    "age_s": round(time.time() - a.built_at, 3),
+                }
+                for variant, a in self._current.items()
+            },
+        }
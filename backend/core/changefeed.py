@@ -0,0 +1,216 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+
+class Subscription:
+    """
+    Cola de un suscriptor (un cliente SSE). Vive en el event loop de la app;
+    publish() le entrega frames ya serializados desde cualquier hilo.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int, resync: Callable[[], str]):
+        self.loop = loop
+        self._resync = resync
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _put(self, frame: str):
+        # corre dentro del loop (call_soon_threadsafe)
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # cliente lento: vaciamos y le pedimos que recargue completo
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self._resync())
+
+
+def _sse_frame(event_id: str, event_type: str, data: dict) -> str:
+    body = json.dumps(data, separators=(",", ":"), default=str)
+    return f"id: {event_id}\nevent: {event_type}\ndata: {body}\n\n"
+
+
+class ChangeFeed:
+    """
+    Feed de cambios en memoria (por proceso).
+
+    - `version` es monotónica y sube con cada evento publicado (posiciones o
+      topología). Arranca en 0 en cada proceso: los cursores que ven los
+      clientes (`Last-Event-ID`, `?since=`) son "<epoch>:<version>", con un
+      `epoch` distinto por proceso, y un cursor de otro worker o de antes de
+      un reinicio se trata como desconocido (resync / payload completo).
+    - `topology_version` sólo sube cuando cambia la topología física; los
+      índices en memoria se invalidan contra ella.
+
+    Cada evento se serializa UNA vez y se reparte a todos los suscriptores,
+    sin queries por suscriptor.
+    """
+
+    def __init__(self, backlog: int = 1000, queue_size: int = 256):
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:12]
+        self._version = 0
+        self._topology_version = 0
+        # versión de topología en la que cambió cada tabla (o todas a la vez)
+        self._table_versions: Dict[str, int] = {}
+        self._all_tables_version = 0
+        # (topology_version, tablas, rutas) de cada cambio; None = todas
+        self._topology_log: Deque[
+            Tuple[int, Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]
+        ] = deque(maxlen=backlog)
+        self._backlog: Deque[Tuple[int, str]] = deque(maxlen=backlog)
+        self._subs: Set[Subscription] = set()
+        self._queue_size = queue_size
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def cursor(self, version: Optional[int] = None) -> str:
+        """Cursor "<epoch>:<version>" (por defecto de la versión actual)."""
+        return f"{self.epoch}:{self._version if version is None else version}"
+
+    def parse_cursor(self, value: Optional[str]) -> Optional[int]:
+        """
+        Versión de un cursor de este proceso; None si es de otro epoch o no
+        se entiende. Acepta también el id de un frame de resync
+        ("<epoch>:<version>:resync"), que apunta a la versión del resync.
+        """
+        if not value:
+            return None
+        parts = value.strip().split(":")
+        if len(parts) == 3 and parts[2] == "resync":
+            parts = parts[:2]
+        if len(parts) != 2 or parts[0] != self.epoch:
+            return None
+        try:
+            version = int(parts[1])
+        except ValueError:
+            return None
+        return version if 0 <= version <= self._version else None
+
+    def _resync_frame(self) -> str:
+        # id propio: no es un evento del backlog, pero al reconectar con él
+        # se reenvía lo publicado después del resync
+        v = self._version
+        return _sse_frame(f"{self.cursor(v)}:resync", "resync", {"type": "resync", "version": v})
+
+    @property
+    def topology_version(self) -> int:
+        return self._topology_version
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def publish(self, event_type: str, payload: Optional[dict] = None) -> int:
+        with self._lock:
+            self._version += 1
+            v = self._version
+            data = {"type": event_type, "version": v, **(payload or {})}
+            frame = _sse_frame(self.cursor(v), event_type, data)
+            self._backlog.append((v, frame))
+            subs = list(self._subs)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, frame)
+            except RuntimeError:
+                # loop cerrado: el suscriptor ya no existe
+                self._subs.discard(sub)
+        return v
+
+    def publish_positions(self, items: List[dict]) -> int:
+        """items: [{node_id, x, y}, ...]"""
+        return self.publish("positions", {"items": items})
+
+    def table_version(self, table: str) -> int:
+        """Última versión de topología que tocó `table`."""
+        return max(self._table_versions.get(table, 0), self._all_tables_version)
+
+    def bump_topology(
+        self,
+        reason: str = "",
+        tables: Optional[List[str]] = None,
+        routes: Optional[List[str]] = None,
+    ) -> int:
+        """
+        Sube la versión de topología. Si se indica `tables`, sólo esas tablas
+        quedan marcadas como cambiadas (permite reconstrucciones parciales);
+        si no, se asume que pudo cambiar cualquiera. `routes` acota el cambio
+        a esas rutas (refresco incremental de core.materialized); una lista
+        vacía indica que no afecta a ninguna ruta.
+        """
+        with self._lock:
+            self._topology_version += 1
+            tv = self._topology_version
+            if tables:
+                for t in tables:
+                    self._table_versions[t] = tv
+            else:
+                self._all_tables_version = tv
+            self._topology_log.append(
+                (
+                    tv,
+                    tuple(tables) if tables else None,
+                    tuple(routes) if routes is not None else None,
+                )
+            )
+        payload = {"topology_version": tv, "reason": reason}
+        if tables:
+            payload["tables"] = list(tables)
+        if routes is not None:
+            payload["routes"] = list(routes)
+        return self.publish("topology", payload)
+
+    def topology_changes_since(
+        self, version: int
+    ) -> Optional[List[Tuple[int, Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]]]:
+        """
+        Cambios de topología posteriores a `version` como
+        (topology_version, tablas, rutas). None si el log ya no llega tan
+        atrás (hay que asumir que cambió todo).
+        """
+        with self._lock:
+            if version >= self._topology_version:
+                return []
+            log = list(self._topology_log)
+        if not log or log[0][0] > version + 1:
+            return None
+        return [c for c in log if c[0] > version]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Crea un suscriptor en el loop actual. Si trae `last_event_id`, se
+        reenvían los eventos posteriores que sigan en el backlog; si ya no
+        están, o el id es de otro proceso, se le pide un resync.
+        """
+        sub = Subscription(asyncio.get_running_loop(), self._queue_size, self._resync_frame)
+        with self._lock:
+            if last_event_id is not None:
+                since = self.parse_cursor(last_event_id)
+                oldest = self._backlog[0][0] if self._backlog else None
+                if since is None:
+                    sub._put(self._resync_frame())
+                elif since < self._version:
+                    if oldest is None or since + 1 < oldest:
+                        sub._put(self._resync_frame())
+                    else:
+                        for v, frame in self._backlog:
+                            if v > since:
+                                sub._put(frame)
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.discard(sub)
+
+
+feed = ChangeFeed()
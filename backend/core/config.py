@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,5 +13,107 @@ class Settings(BaseSettings):
     DB_NAME: str
     CORS_ORIGINS: str
 
+    # Pool de conexiones (SQLAlchemy QueuePool)
+    DB_POOL_SIZE: int = 5  # conexiones persistentes
+    DB_MAX_OVERFLOW: int = 10  # conexiones extra temporales sobre DB_POOL_SIZE
+    DB_POOL_TIMEOUT: float = 30.0  # segundos esperando una conexion libre
+    DB_POOL_RECYCLE: int = 1800  # segundos antes de reciclar una conexion
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP: int = 2  # conexiones abiertas al arrancar la app (0 = no)
+
+    # Réplicas de lectura (core.db.ReadRouter)
+    DB_URL: str = ""  # URL SQLAlchemy del primario; vacío = SQL Server de DB_SERVER
+    DB_READ_REPLICAS: str = ""  # servidores o URLs separados por coma; vacío = todo al primario
+    DB_REPLICA_CHECK_S: float = 10.0  # intervalo del health check (SELECT 1)
+    DB_REPLICA_RETRY_S: float = 30.0  # tiempo fuera de una réplica que falló
+    DB_READ_YOUR_WRITES_S: float = 5.0  # lecturas de una tabla recién escrita van al primario
+    DB_FAST_EXECUTEMANY: bool = True  # pyodbc: executemany en un solo viaje (SQL Server)
+
+    # Backend analítico embebido (core.analytics)
+    ANALYTICS_BACKEND: str = "sqlserver"  # "sqlserver" | "duckdb"
+    ANALYTICS_PATH: str = "analytics.duckdb"
+    ANALYTICS_FAMILIES: str = "topology,inventory"  # familias que van a DuckDB
+    ANALYTICS_REFRESH_S: float = 300.0  # re-export periódico (0 = sólo CLI)
+    ANALYTICS_MAX_AGE_S: float = 900.0  # copia más vieja -> SQL Server
+
+    # Overview versionado
+    OVERVIEW_HISTORY_SIZE: int = 16  # snapshots guardados para ?since=
+    OVERVIEW_CACHE_TTL_S: float = 30.0  # re-chequeo contra BD aunque no haya eventos
+
+    # Overview pre-armado y pre-comprimido en disco (core.artifacts)
+    OVERVIEW_ARTIFACT_DIR: str = "artifacts"  # vacío = deshabilitado
+    OVERVIEW_ARTIFACT_VARIANTS: str = "default,default-slim"  # layout[-slim]
+    OVERVIEW_ARTIFACT_POLL_S: float = 1.0  # chequeo de versión nueva
+    OVERVIEW_ARTIFACT_KEEP: int = 2  # versiones conservadas por variante
+    OVERVIEW_ARTIFACT_GZIP_LEVEL: int = 6
+    OVERVIEW_ARTIFACT_BROTLI_QUALITY: int = 9  # 11 es mucho más lento al armar
+
+    # Índices en memoria derivados de la topología (core.topo_cache)
+    TOPOLOGY_CACHE_TTL_S: float = 300.0  # 0 = sólo se invalidan por versión
+
+    # Caminos físicos entre nodos (core.routing)
+    ROUTING_MAX_EXPANSIONS: int = 2_000_000  # vértices expandidos por request (0 = sin límite)
+    ROUTING_TIMEOUT_S: float = 5.0  # tiempo máximo de búsqueda por request (0 = sin límite)
+
+    # Snapshot binario de topología (core.snapshot) para arranque en frío
+    SNAPSHOT_PATH: str = ""  # vacío = deshabilitado
+    SNAPSHOT_RETRY_S: float = 30.0  # reintento del refresco desde BD
+
+    # Armado de grafos en procesos aparte (core.offload)
+    OFFLOAD_MODE: str = "inline"  # "inline" | "process"
+    OFFLOAD_WORKERS: int = 2
+    OFFLOAD_QUEUE_SIZE: int = 8  # tareas en espera además de las en curso
+    OFFLOAD_TIMEOUT_S: float = 30.0
+    OFFLOAD_MIN_ROWS: int = 2000  # debajo de esto se arma inline (IPC no compensa)
+
+    # Coalescencia de requests idénticos concurrentes (core.singleflight)
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    # Control de admisión por clase de endpoint (core.admission)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_HEAVY_LIMIT: int = 4  # overview, grafos de ruta, trazas, caminos
+    ADMISSION_HEAVY_QUEUE: int = 16  # requests esperando un cupo
+    ADMISSION_HEAVY_WAIT_S: float = 15.0  # espera máxima en cola antes del 503
+    ADMISSION_LIGHT_LIMIT: int = 32  # resto; heavy+light < hilos del threadpool (40)
+    ADMISSION_LIGHT_QUEUE: int = 64
+    ADMISSION_LIGHT_WAIT_S: float = 5.0
+
+    # Diagnóstico por request (core.timing): ?debug_timing=1 y ?profile=1
+    ADMIN_TOKEN: str = ""  # header X-Admin-Token para ?profile=; vacío = deshabilitado
+    PROFILE_INTERVAL_MS: float = 2.0  # período de muestreo del profiler
+
+    # Layout geográfico ?layout=geo (core.geo_layout)
+    GEO_PX_PER_M: float = 0.2  # escala en el origen de la proyección
+    GEO_SPREAD_PX: float = 40.0  # radio del anillo para elementos en el mismo punto
+    GEO_ORIGIN_LAT: Optional[float] = None  # None = centroide de la red
+    GEO_ORIGIN_LON: Optional[float] = None
+
+    # Validación de largos de span (core.span_quality)
+    SPAN_LENGTH_TOL_PCT: float = 0.25  # desvío relativo permitido sobre la distancia GPS
+    SPAN_LENGTH_TOL_M: float = 15.0  # mínimo absoluto (spans cortos / error de GPS)
+
+    # Presupuesto óptico de los trazados de hilos (core.loss_budget)
+    LOSS_DB_PER_KM: str = "SM=0.35,MM=3.0"  # atenuación por cable.material_type (dB/km)
+    LOSS_DB_PER_KM_DEFAULT: float = 0.35  # material_type sin coeficiente
+    LOSS_SPLICE_DB: float = 0.1  # por empalme (dbo.splice)
+    LOSS_CONNECTOR_DB: float = 0.5  # por puerto ODF conectorizado
+    LOSS_BUDGET_DB: float = 28.0  # pérdida máxima admisible del enlace
+
+    # Vistas materializadas en memoria (core.materialized)
+    MATERIALIZED_MAX_PARTIAL_ROUTES: int = 500  # más rutas afectadas -> recarga completa
+    MATERIALIZED_FULL_REFRESH_S: float = 3600.0  # recarga completa periódica (0 = nunca)
+
+    # Importación masiva de relevamientos CSV/GeoJSON (core.importer)
+    IMPORT_BATCH_SIZE: int = 1000  # filas por executemany dentro de la transacción
+    IMPORT_ID_FETCH_SIZE: int = 50000  # ids por lote al cargar los sets de referencias
+    IMPORT_MAX_ERRORS: int = 1000  # errores detallados por job (el conteo sigue)
+    IMPORT_MAX_BYTES: int = 2 * 1024**3  # tamaño máximo del archivo subido
+    IMPORT_SPOOL_DIR: str = ""  # archivos subidos en curso; vacío = temporal del sistema
+    IMPORT_KEEP_JOBS: int = 50  # jobs terminados que se conservan para consulta
+
+    # Exportación GeoJSON/KML en streaming (core.export)
+    EXPORT_FETCH_SIZE: int = 5000  # filas por lote del cursor del lado del servidor
+    EXPORT_CHUNK_BYTES: int = 64 * 1024  # tamaño aproximado de cada chunk enviado
+
 
 settings = Settings()
@@ -1,7 +1,17 @@
-from sqlalchemy import create_engine, text
+import itertools
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import create_engine, event, exc, text
 from urllib.parse import quote_plus
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 # Windows Authentication (Trusted_Connection) SQL Server
 ODBC_STR = (
     "DRIVER={ODBC Driver 17 for SQL Server};"
@@ -12,33 +22,420 @@ ODBC_STR = (
 )
 
 _engine = None
+_engine_lock = threading.Lock()
+
+
+def _odbc_str(server: str, read_only: bool = False) -> str:
+    return (
+        "DRIVER={ODBC Driver 17 for SQL Server};"
+        f"SERVER={server};"
+        f"DATABASE={settings.DB_NAME};"
+        "Trusted_Connection=yes;"
+        "TrustServerCertificate=yes;"
+        + ("ApplicationIntent=ReadOnly;" if read_only else "")
+    )
+
+
+def _url(target: str, read_only: bool = False) -> str:
+    """URL SQLAlchemy completa (ej. sqlite:///x.db) o nombre de servidor SQL Server."""
+    if "://" in target:
+        return target
+    return f"mssql+pyodbc:///?odbc_connect={quote_plus(_odbc_str(target, read_only))}"
+
+
+def _create(url: str):
+    kwargs = {}
+    if url.startswith("mssql+pyodbc"):
+        # lotes de INSERT/MERGE (positions, core.importer) en un solo viaje
+        kwargs["fast_executemany"] = settings.DB_FAST_EXECUTEMANY
+    eng = create_engine(
+        url,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        **kwargs,
+    )
+    if url.startswith("sqlite") and eng.url.database not in (None, "", ":memory:"):
+        # pruebas locales: el esquema "dbo" es el mismo archivo
+        path = eng.url.database
+
+        @event.listens_for(eng, "connect")
+        def _attach_dbo(dbapi_conn, _rec):
+            dbapi_conn.execute(f"ATTACH DATABASE '{path}' AS dbo")
+
+    return eng
+
+
+class PoolMetrics:
+    """
+    Contadores del pool (thread-safe). Los tiempos de espera se miden al
+    pedir una conexion al pool (checkout + pre-ping).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0  # conexiones DBAPI nuevas (costo ODBC)
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated = 0
+        self.waits = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.wait_last_s = 0.0
+
+    def incr(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_total_s += seconds
+            self.wait_last_s = seconds
+            if seconds > self.wait_max_s:
+                self.wait_max_s = seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = self.wait_total_s / self.waits if self.waits else 0.0
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidated": self.invalidated,
+                "wait_count": self.waits,
+                "wait_avg_ms": round(avg * 1000.0, 3),
+                "wait_max_ms": round(self.wait_max_s * 1000.0, 3),
+                "wait_last_ms": round(self.wait_last_s * 1000.0, 3),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+def _attach_pool_events(engine, metrics: PoolMetrics = pool_metrics):
+    event.listen(engine, "connect", lambda *a: metrics.incr("connects"))
+    event.listen(engine, "checkout", lambda *a: metrics.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *a: metrics.incr("checkins"))
+    event.listen(engine, "invalidate", lambda *a: metrics.incr("invalidated"))
 
 
 def get_engine():
     global _engine
     if _engine is not None:
         return _engine
+    with _engine_lock:
+        # doble chequeo: otro hilo pudo crearlo mientras esperábamos el lock
+        if _engine is not None:
+            return _engine
+        try:
+            eng = _create(
+                settings.DB_URL or f"mssql+pyodbc:///?odbc_connect={quote_plus(ODBC_STR)}"
+            )
+        except Exception as e:
+            raise RuntimeError(
+                "No se pudo crear el engine de SQL Server. Verifica:\n"
+                f"- DRIVER 18 instalado (x64)\n"
+                f"- SERVER={settings.DB_SERVER} / DB={settings.DB_NAME}\n"
+                "- Usuario Windows con acceso (Trusted_Connection)\n"
+                f"Detalle: {e!r}"
+            ) from e
+        _attach_pool_events(eng)
+        _engine = eng
+        return _engine
+
+
+@contextmanager
+def _timed(ctx_factory):
+    t0 = time.perf_counter()
+    with ctx_factory() as conn:
+        pool_metrics.record_wait(time.perf_counter() - t0)
+        yield conn
+
+
+def connect():
+    """Conexion del pool midiendo el tiempo de espera."""
+    return _timed(get_engine().connect)
+
+
+def begin():
+    """Conexion transaccional del pool midiendo el tiempo de espera."""
+    return _timed(get_engine().begin)
+
+
+def warm_pool(n: int | None = None) -> int:
+    """
+    Abre `n` conexiones a la vez (sin pasar de DB_POOL_SIZE) y las devuelve
+    al pool, para que los primeros requests no paguen el connect ODBC.
+    """
+    n = settings.DB_POOL_WARMUP if n is None else n
+    n = max(0, min(n, settings.DB_POOL_SIZE))
+    eng = get_engine()
+    conns = []
     try:
-        _engine = create_engine(
-            f"mssql+pyodbc:///?odbc_connect={quote_plus(ODBC_STR)}",
-            pool_pre_ping=True,
+        for _ in range(n):
+            conns.append(eng.connect())
+    finally:
+        for c in conns:
+            c.close()
+    return len(conns)
+
+
+def pool_status() -> dict:
+    """Estado del pool sin abrir conexiones nuevas."""
+    if _engine is None:
+        return {"initialized": False, **pool_metrics.snapshot()}
+    pool = _engine.pool
+    return {
+        "initialized": True,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "status": pool.status(),
+        **pool_metrics.snapshot(),
+    }
+
+
+class Replica:
+    """Réplica de lectura con su propio pool y estado de salud."""
+
+    def __init__(self, name: str, target: str):
+        self.name = name
+        self.target = target
+        self.metrics = PoolMetrics()
+        self.engine = _create(_url(target, read_only=True))
+        _attach_pool_events(self.engine, self.metrics)
+        self.healthy = True
+        self.down_until = 0.0
+        self.failures = 0
+        self.reads = 0
+        self.last_error: Optional[str] = None
+        self.last_check_ms: Optional[float] = None
+
+    def available(self) -> bool:
+        return self.healthy or time.monotonic() >= self.down_until
+
+    def mark_down(self, err: BaseException):
+        self.healthy = False
+        self.failures += 1
+        self.last_error = str(err)[:300]
+        self.down_until = time.monotonic() + settings.DB_REPLICA_RETRY_S
+
+    def check(self) -> bool:
+        t0 = time.perf_counter()
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            self.mark_down(e)
+            return False
+        finally:
+            self.last_check_ms = round((time.perf_counter() - t0) * 1000.0, 3)
+        self.healthy = True
+        return True
+
+    def status(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "available": self.available(),
+            "reads": self.reads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_check_ms": self.last_check_ms,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            **self.metrics.snapshot(),
+        }
+
+
+# errores de conexión: la lectura se reintenta en el primario
+_REPLICA_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+_TABLE_RE = re.compile(r"\bdbo\.(\w+)", re.IGNORECASE)
+
+
+class ReadRouter:
+    """
+    Enruta las lecturas de fetch_all a las réplicas (DB_READ_REPLICAS,
+    round-robin entre las sanas) y todo lo demás al primario.
+
+    - Una réplica que falla al leer queda fuera DB_REPLICA_RETRY_S segundos
+      y esa lectura se repite en el primario; un hilo la re-chequea con
+      SELECT 1 cada DB_REPLICA_CHECK_S.
+    - Read-your-writes: tras escribir una tabla (execute, begin_write), las
+      lecturas que la mencionan van al primario durante DB_READ_YOUR_WRITES_S,
+      para no leer de una réplica atrasada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._replicas: Optional[List[Replica]] = None
+        self._rr = itertools.count()
+        self._written: Dict[str, float] = {}  # tabla -> vence el pin al primario
+        self._stop = threading.Event()
+        self._checker: Optional[threading.Thread] = None
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.failovers = 0
+
+    @property
+    def replicas(self) -> List[Replica]:
+        if self._replicas is None:
+            with self._lock:
+                if self._replicas is None:
+                    targets = [t.strip() for t in settings.DB_READ_REPLICAS.split(",") if t.strip()]
+                    self._replicas = [Replica(f"replica{i}", t) for i, t in enumerate(targets)]
+        return self._replicas
+
+    def note_write(self, sql_or_tables):
+        """Fija al primario las lecturas de las tablas escritas."""
+        tables = (
+            _TABLE_RE.findall(sql_or_tables)
+            if isinstance(sql_or_tables, str)
+            else list(sql_or_tables)
         )
-        return _engine
-    except Exception as e:
-        raise RuntimeError(
-            "No se pudo crear el engine de SQL Server. Verifica:\n"
-            f"- DRIVER 18 instalado (x64)\n"
-            f"- SERVER={settings.DB_SERVER} / DB={settings.DB_NAME}\n"
-            "- Usuario Windows con acceso (Trusted_Connection)\n"
-            f"Detalle: {e!r}"
-        ) from e
+        if not tables or not self.replicas:
+            return
+        until = time.monotonic() + settings.DB_READ_YOUR_WRITES_S
+        with self._lock:
+            for t in tables:
+                self._written[t.lower()] = until
+
+    def _pinned(self, sql: str) -> bool:
+        if not self._written:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            for t, until in list(self._written.items()):
+                if until <= now:
+                    del self._written[t]
+            tables = list(self._written)
+        low = sql.lower()
+        return any(t in low for t in tables)
+
+    def pick(self, sql: str) -> Optional[Replica]:
+        replicas = self.replicas
+        if not replicas:
+            return None
+        if self._pinned(sql):
+            self.pinned_reads += 1
+            return None
+        n = len(replicas)
+        start = next(self._rr)
+        for k in range(n):
+            r = replicas[(start + k) % n]
+            if r.available():
+                return r
+        return None
+
+    def fetch_all(self, sql: str, params: dict) -> List[dict]:
+        replica = self.pick(sql)
+        if replica is not None:
+            try:
+                with replica.engine.connect() as conn:
+                    rows = [dict(r) for r in conn.execute(text(sql), params).mappings()]
+                replica.reads += 1
+                replica.healthy = True
+                return rows
+            except _REPLICA_ERRORS as e:
+                logger.warning("Réplica %s no disponible, se lee del primario: %s", replica.name, e)
+                replica.mark_down(e)
+                self.failovers += 1
+        self.primary_reads += 1
+        with connect() as conn:
+            return [dict(r) for r in conn.execute(text(sql), params).mappings()]
+
+    def stream(self, sql: str, params: dict, size: int) -> Iterator[List[dict]]:
+        """
+        Como fetch_all pero en lotes de `size` filas con cursor del lado del
+        servidor: el resultado nunca está entero en memoria. Sólo se pasa al
+        primario si la réplica falla antes de entregar el primer lote.
+        """
+        replica = self.pick(sql)
+        if replica is not None:
+            started = False
+            try:
+                with replica.engine.connect() as conn:
+                    result = conn.execution_options(stream_results=True).execute(
+                        text(sql), params
+                    )
+                    for part in result.mappings().partitions(size):
+                        started = True
+                        yield [dict(r) for r in part]
+                replica.reads += 1
+                replica.healthy = True
+                return
+            except _REPLICA_ERRORS as e:
+                if started:
+                    raise
+                logger.warning("Réplica %s no disponible, se lee del primario: %s", replica.name, e)
+                replica.mark_down(e)
+                self.failovers += 1
+        self.primary_reads += 1
+        with connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(sql), params)
+            for part in result.mappings().partitions(size):
+                yield [dict(r) for r in part]
+
+    def check_all(self) -> List[bool]:
+        return [r.check() for r in self.replicas]
+
+    def start_checks(self):
+        if not self.replicas or self._checker is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(settings.DB_REPLICA_CHECK_S):
+                self.check_all()
+
+        self._checker = threading.Thread(target=loop, name="db-replica-check", daemon=True)
+        self._checker.start()
+
+    def stop_checks(self):
+        self._stop.set()
+        self._checker = None
+
+    def status(self) -> dict:
+        return {
+            "replicas": [r.status() for r in self.replicas],
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "failovers": self.failovers,
+            "pinned_tables": sorted(
+                t for t, until in self._written.items() if until > time.monotonic()
+            ),
+            "read_your_writes_s": settings.DB_READ_YOUR_WRITES_S,
+        }
+
+
+read_router = ReadRouter()
+
+
+@contextmanager
+def begin_write(*tables: str):
+    """begin() que además activa read-your-writes para `tables` al confirmar."""
+    with begin() as conn:
+        yield conn
+    read_router.note_write(tables)
 
 
 def fetch_all(sql: str, **params):  # Querys que si devuelven Data
-    with get_engine().connect() as conn:
-        return [dict(r) for r in conn.execute(text(sql), params).mappings()]
+    return read_router.fetch_all(sql, params)
+
+
+def fetch_stream(sql: str, size: int = 5000, **params) -> Iterator[List[dict]]:
+    """Lotes de filas con cursor del lado del servidor (exportaciones)."""
+    return read_router.stream(sql, params, size)
 
 
 def execute(sql: str, **params):  # Querys que no devuelven Data
-    with get_engine().begin() as conn:
+    with begin() as conn:
         conn.execute(text(sql), params)
+    read_router.note_write(sql)
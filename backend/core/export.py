@@ -0,0 +1,269 @@
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from .config import settings
+from .db import fetch_stream
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+LAYERS = ("nodos", "poles", "mufas", "spans")
+
+# Nombre de la capa en las properties / carpetas KML
+_LAYER_NAME = {"nodos": "nodo", "poles": "pole", "mufas": "mufa", "spans": "cable_span"}
+
+# Columnas de coordenadas por tipo de geometría (no van a las properties)
+_POINT = ("gps_lon", "gps_lat")
+_LINE = ("from_lon", "from_lat", "to_lon", "to_lat")
+
+
+class ExportFilter:
+    """
+    Filtros de la exportación (se combinan con AND):
+    - route_id: spans de la ruta, sus postes y mufas, y los nodos extremos;
+    - cable_id: spans del cable, sus postes y mufas, y los nodos de las
+      rutas que lo usan;
+    - bbox (min_lon, min_lat, max_lon, max_lat): puntos dentro del
+      rectángulo y spans con al menos un extremo dentro.
+    """
+
+    def __init__(
+        self,
+        route_id: Optional[str] = None,
+        cable_id: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ):
+        self.route_id = route_id
+        self.cable_id = cable_id
+        self.bbox = bbox
+
+    def params(self) -> dict:
+        out: Dict[str, object] = {}
+        if self.route_id is not None:
+            out["route_id"] = self.route_id
+        if self.cable_id is not None:
+            out["cable_id"] = self.cable_id
+        if self.bbox is not None:
+            out.update(zip(("min_lon", "min_lat", "max_lon", "max_lat"), self.bbox))
+        return out
+
+    def as_dict(self) -> dict:
+        return {
+            "route_id": self.route_id,
+            "cable_id": self.cable_id,
+            "bbox": list(self.bbox) if self.bbox is not None else None,
+        }
+
+
+def parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    """"min_lon,min_lat,max_lon,max_lat" (orden GeoJSON); ValueError si no cierra."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("se esperan 4 valores")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("mínimos mayores que máximos")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+# ----------------------------------------------------------------------
+# SQL por capa
+# ----------------------------------------------------------------------
+def _in_bbox(lat: str, lon: str) -> str:
+    return f"({lat} BETWEEN :min_lat AND :max_lat AND {lon} BETWEEN :min_lon AND :max_lon)"
+
+
+def _span_scope(f: ExportFilter) -> List[str]:
+    """Condiciones sobre `cs` (dbo.cable_span) por ruta y/o cable."""
+    conds = []
+    if f.route_id is not None:
+        conds.append(
+            "cs.id IN (SELECT cable_span_id FROM dbo.odf_route_segment"
+            " WHERE odf_route_id = :route_id)"
+        )
+    if f.cable_id is not None:
+        conds.append("cs.cable_id = :cable_id")
+    return conds
+
+
+def _pole_scope(f: ExportFilter, column: str) -> List[str]:
+    scope = _span_scope(f)
+    if not scope:
+        return []
+    where = " AND ".join(scope)
+    return [
+        f"{column} IN (SELECT cs.from_pole_id FROM dbo.cable_span cs WHERE {where}"
+        f" UNION SELECT cs.to_pole_id FROM dbo.cable_span cs WHERE {where})"
+    ]
+
+
+def _nodo_scope(f: ExportFilter) -> List[str]:
+    conds = []
+    if f.route_id is not None:
+        conds.append(
+            """n.id IN (SELECT o.nodo_id FROM dbo.odf_route r
+                JOIN dbo.odf o ON o.id IN (r.from_odf_id, r.to_odf_id)
+                WHERE r.id = :route_id)"""
+        )
+    if f.cable_id is not None:
+        conds.append(
+            """n.id IN (SELECT o.nodo_id FROM dbo.cable_span cs
+                JOIN dbo.odf_route_segment ors ON ors.cable_span_id = cs.id
+                JOIN dbo.odf_route r ON r.id = ors.odf_route_id
+                JOIN dbo.odf o ON o.id IN (r.from_odf_id, r.to_odf_id)
+                WHERE cs.cable_id = :cable_id)"""
+        )
+    return conds
+
+
+def layer_sql(layer: str, f: ExportFilter) -> str:
+    if layer == "nodos":
+        conds = ["n.gps_lat IS NOT NULL", "n.gps_lon IS NOT NULL"] + _nodo_scope(f)
+        if f.bbox is not None:
+            conds.append(_in_bbox("n.gps_lat", "n.gps_lon"))
+        return f"""
+            SELECT n.id, n.code, n.name, n.type, n.gps_lat, n.gps_lon
+            FROM dbo.nodo n
+            WHERE {" AND ".join(conds)}
+        """
+    if layer == "poles":
+        conds = ["p.gps_lat IS NOT NULL", "p.gps_lon IS NOT NULL"] + _pole_scope(f, "p.id")
+        if f.bbox is not None:
+            conds.append(_in_bbox("p.gps_lat", "p.gps_lon"))
+        return f"""
+            SELECT p.id, p.code, p.pole_type, p.status, p.gps_lat, p.gps_lon
+            FROM dbo.pole p
+            WHERE {" AND ".join(conds)}
+        """
+    if layer == "mufas":
+        # mufa sin GPS propio: se ubica en su poste
+        lat, lon = "COALESCE(m.gps_lat, p.gps_lat)", "COALESCE(m.gps_lon, p.gps_lon)"
+        conds = [f"{lat} IS NOT NULL", f"{lon} IS NOT NULL"] + _pole_scope(f, "m.pole_id")
+        if f.bbox is not None:
+            conds.append(_in_bbox(lat, lon))
+        return f"""
+            SELECT m.id, m.code, m.mufa_type, m.pole_id, {lat} AS gps_lat, {lon} AS gps_lon
+            FROM dbo.mufa m
+            LEFT JOIN dbo.pole p ON p.id = m.pole_id
+            WHERE {" AND ".join(conds)}
+        """
+    if layer == "spans":
+        conds = [
+            "p1.gps_lat IS NOT NULL",
+            "p1.gps_lon IS NOT NULL",
+            "p2.gps_lat IS NOT NULL",
+            "p2.gps_lon IS NOT NULL",
+        ] + _span_scope(f)
+        if f.bbox is not None:
+            conds.append(
+                f"({_in_bbox('p1.gps_lat', 'p1.gps_lon')} OR {_in_bbox('p2.gps_lat', 'p2.gps_lon')})"
+            )
+        return f"""
+            SELECT cs.id, cs.cable_id, cs.seq, cs.from_pole_id, cs.to_pole_id,
+                   cs.length_m, cs.length_span,
+                   p1.gps_lon AS from_lon, p1.gps_lat AS from_lat,
+                   p2.gps_lon AS to_lon, p2.gps_lat AS to_lat
+            FROM dbo.cable_span cs
+            JOIN dbo.pole p1 ON p1.id = cs.from_pole_id
+            JOIN dbo.pole p2 ON p2.id = cs.to_pole_id
+            WHERE {" AND ".join(conds)}
+        """
+    raise ValueError(layer)
+
+
+def _geometry(layer: str, r: dict) -> Tuple[str, list]:
+    if layer == "spans":
+        return "LineString", [
+            [float(r.pop("from_lon")), float(r.pop("from_lat"))],
+            [float(r.pop("to_lon")), float(r.pop("to_lat"))],
+        ]
+    return "Point", [float(r.pop("gps_lon")), float(r.pop("gps_lat"))]
+
+
+def iter_features(f: ExportFilter, layers) -> Iterator[Tuple[str, str, list, dict]]:
+    """(capa, tipo de geometría, coordenadas, properties) leyendo capa por capa."""
+    params = f.params()
+    for layer in layers:
+        t0 = time.perf_counter()
+        n = 0
+        for rows in fetch_stream(layer_sql(layer, f), settings.EXPORT_FETCH_SIZE, **params):
+            for r in rows:
+                kind, coords = _geometry(layer, r)
+                n += 1
+                yield layer, kind, coords, r
+        logger.info("Export %s: %s features en %.1f s", layer, n, time.perf_counter() - t0)
+
+
+# ----------------------------------------------------------------------
+# Escritores (generadores de bytes en chunks de ~EXPORT_CHUNK_BYTES)
+# ----------------------------------------------------------------------
+def geojson_chunks(f: ExportFilter, layers, meta: dict) -> Iterator[bytes]:
+    """FeatureCollection; `meta` va como miembros extra antes de "features"."""
+    buf = bytearray(b'{"type":"FeatureCollection",')
+    if meta:
+        buf += dumps(meta)[1:-1] + b","
+    buf += b'"features":['
+    sep = b""
+    for layer, kind, coords, props in iter_features(f, layers):
+        props["layer"] = _LAYER_NAME[layer]
+        buf += sep
+        buf += dumps(
+            {
+                "type": "Feature",
+                "id": props["id"],
+                "geometry": {"type": kind, "coordinates": coords},
+                "properties": props,
+            }
+        )
+        sep = b","
+        if len(buf) >= settings.EXPORT_CHUNK_BYTES:
+            yield bytes(buf)
+            buf.clear()
+    buf += b"]}"
+    yield bytes(buf)
+
+
+def _kml_value(v) -> str:
+    return escape("" if v is None else str(v))
+
+
+def kml_chunks(f: ExportFilter, layers, title: str = "MIR") -> Iterator[bytes]:
+    """KML 2.2: una carpeta por capa, un Placemark por elemento (ExtendedData = properties)."""
+    parts: List[str] = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+        f"<name>{escape(title)}</name>"
+    ]
+    size = 0
+    current = None
+    for layer, kind, coords, props in iter_features(f, layers):
+        if layer != current:
+            if current is not None:
+                parts.append("</Folder>")
+            parts.append(f"<Folder><name>{_LAYER_NAME[layer]}</name>")
+            current = layer
+        data = "".join(
+            f'<Data name="{k}"><value>{_kml_value(v)}</value></Data>' for k, v in props.items()
+        )
+        if kind == "Point":
+            geom = f"<Point><coordinates>{coords[0]},{coords[1]}</coordinates></Point>"
+        else:
+            geom = "<LineString><coordinates>{}</coordinates></LineString>".format(
+                " ".join(f"{lon},{lat}" for lon, lat in coords)
+            )
+        placemark = (
+            f"<Placemark><name>{_kml_value(props.get('code') or props['id'])}</name>"
+            f"<ExtendedData>{data}</ExtendedData>{geom}</Placemark>"
+        )
+        parts.append(placemark)
+        size += len(placemark)
+        if size >= settings.EXPORT_CHUNK_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts.clear()
+            size = 0
+    if current is not None:
+        parts.append("</Folder>")
+    parts.append("</Document></kml>")
+    yield "".join(parts).encode("utf-8")
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from .arrays import float_array, str_array
+
+
+class FilamentPaths:
+    """
+    Tramo de su cable que recorre cada hilo.
+
+    Los spans se ordenan por (cable, seq) y se numeran como "slots"; los
+    postes quedan entre slots (el poste k es el inicio del slot k y el fin
+    del k-1). Un hilo recorre los slots slot_lo..slot_hi-1 de su cable.
+
+    Los cortes del hilo son los postes de las mufas de sus empalmes y el
+    extremo del cable que llega al nodo de su ODF (poste de acceso en
+    route_ends). Con dos o más cortes el hilo va del primero al último; con
+    uno solo, hacia el extremo más lejano del cable (no se sabe hacia dónde
+    sigue: se toma la cota mayor); sin cortes ubicables, el cable entero.
+
+    Lo usan el presupuesto óptico (largo recorrido), la ocupación por span y
+    el impacto de cortes (hilos que pasan por un span).
+    """
+
+    def __init__(
+        self,
+        fil_ids: np.ndarray,
+        fil_cable: np.ndarray,
+        spans: List[dict],
+        span_cable: np.ndarray,
+        n_cables: int,
+        splice_ends: Tuple[np.ndarray, np.ndarray],
+        port_ends: Tuple[np.ndarray, np.ndarray],
+        mufas: Iterable[dict] = (),
+        route_ends: Iterable[dict] = (),
+    ):
+        """
+        `fil_cable` / `span_cable` son índices de cable (< n_cables);
+        `splice_ends` es (hilo, mufa_id) por extremo de empalme y `port_ends`
+        (hilo, nodo_id) por puerto ODF.
+        """
+        self.fil_ids = fil_ids
+        order = np.lexsort((float_array(spans, "seq"), span_cable))
+        self.span_ids = str_array(spans, "id")[order]
+        self.span_cable = span_cable[order]
+        ns = len(order)
+        length = np.nan_to_num(float_array(spans, "length_m")[order], nan=0.0)
+        # metros desde el inicio de la tabla hasta cada poste (slot)
+        self.pos_m = np.concatenate([[0.0], np.cumsum(length)])
+        cables = np.arange(n_cables)
+        self.cable_start = np.searchsorted(self.span_cable, cables, side="left")
+        self.cable_end = np.searchsorted(self.span_cable, cables, side="right")
+
+        # (cable, poste) -> slot del poste (primera aparición en la cadena)
+        pole_slot: Dict[Tuple[int, str], int] = {}
+        for k, i in enumerate(order.tolist()):
+            c, s = int(self.span_cable[k]), spans[i]
+            pole_slot.setdefault((c, str(s["from_pole_id"])), k)
+            pole_slot.setdefault((c, str(s["to_pole_id"])), k + 1)
+
+        fils: List[int] = []
+        cuts: List[int] = []
+        fc = fil_cable.tolist()
+        mufa_pole = {
+            str(m["id"]): str(m["pole_id"]) for m in mufas if m.get("pole_id") is not None
+        }
+        for f, mufa in zip(splice_ends[0].tolist(), splice_ends[1].tolist()):
+            slot = pole_slot.get((fc[f], mufa_pole.get(mufa, "")))
+            if slot is not None:
+                fils.append(f)
+                cuts.append(slot)
+
+        access: Dict[str, set] = defaultdict(set)
+        for r in route_ends:
+            if r.get("rn_first") == 1 and r.get("from_nodo_id") is not None:
+                access[str(r["from_nodo_id"])].add(str(r["from_pole_id"]))
+            if r.get("rn_last") == 1 and r.get("to_nodo_id") is not None:
+                access[str(r["to_nodo_id"])].add(str(r["to_pole_id"]))
+        for f, nodo in zip(port_ends[0].tolist(), port_ends[1].tolist()):
+            c, poles = fc[f], access.get(nodo, ())
+            a, b = int(self.cable_start[c]), int(self.cable_end[c])
+            if a == b or not poles:
+                continue
+            if str(spans[order[a]]["from_pole_id"]) in poles:
+                fils.append(f)
+                cuts.append(a)
+            elif str(spans[order[b - 1]]["to_pole_id"]) in poles:
+                fils.append(f)
+                cuts.append(b)
+
+        start, end = self.cable_start[fil_cable], self.cable_end[fil_cable]
+        lo = np.full(len(fil_ids), ns + 1, dtype=np.int64)
+        hi = np.full(len(fil_ids), -1, dtype=np.int64)
+        idx = np.array(fils, dtype=np.int64)
+        np.minimum.at(lo, idx, np.array(cuts, dtype=np.int64))
+        np.maximum.at(hi, idx, np.array(cuts, dtype=np.int64))
+        has = hi >= 0
+        lo, hi = np.where(has, lo, start), np.where(has, hi, end)
+        single = has & (lo == hi)
+        after = self.pos_m[end] - self.pos_m[lo] >= self.pos_m[lo] - self.pos_m[start]
+        self.slot_lo = np.where(single & ~after, start, lo)
+        self.slot_hi = np.where(single & after, end, hi)
+
+    @property
+    def meters(self) -> np.ndarray:
+        """Metros recorridos por cada hilo."""
+        return self.pos_m[self.slot_hi] - self.pos_m[self.slot_lo]
+
+    def span_load(self, fils: np.ndarray) -> np.ndarray:
+        """Cuántos de los hilos `fils` recorren cada slot."""
+        n = len(self.span_ids) + 1
+        diff = np.bincount(self.slot_lo[fils], minlength=n) - np.bincount(
+            self.slot_hi[fils], minlength=n
+        )
+        return np.cumsum(diff)[:-1]
@@ -0,0 +1,176 @@
+from math import cos, sin
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .arrays import csr_adjacency
+from .config import settings
+from .graph_model import CompactGraph
+from .util import EARTH_RADIUS_M, _angle_from_id
+
+# Grupos que quedan en el centro cuando varios elementos comparten punto
+# (el poste con sus mufas alrededor, el nodo con sus ODF/routers)
+_ANCHOR_GROUPS = {"pole", "nodo"}
+
+
+def _gps(node: dict) -> Tuple[Optional[float], Optional[float]]:
+    lat, lon = node.get("gps_lat"), node.get("gps_lon")
+    if lat is None or lon is None:
+        meta = node.get("meta") or {}
+        lat, lon = meta.get("gps_lat"), meta.get("gps_lon")
+    return lat, lon
+
+
+def mercator_xy(
+    lat: np.ndarray, lon: np.ndarray, lat0: float, lon0: float, px_per_m: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Web-Mercator centrado en (lat0, lon0), escalado para que en el origen
+    1 m = px_per_m px (factor cos(lat0)). La y de pantalla crece hacia abajo.
+    """
+    k = EARTH_RADIUS_M * np.cos(np.radians(lat0)) * px_per_m
+    x = k * np.radians(lon - lon0)
+    phi, phi0 = np.radians(lat), np.radians(lat0)
+    y = k * (np.log(np.tan(np.pi / 4 + phi / 2)) - np.log(np.tan(np.pi / 4 + phi0 / 2)))
+    return x, -y
+
+
+def geo_layout(
+    nodes: Sequence[dict],
+    edges: Iterable[dict] = (),
+    anchors: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> List[dict]:
+    """
+    Devuelve copias de `nodes` con x/y proyectados desde gps_lat/gps_lon (en
+    el nodo o en su meta). `anchors` da coordenadas a nodos sin GPS propio
+    (ej. ODF -> GPS de su nodo). Ver geo_xy.
+    """
+    n = len(nodes)
+    if n == 0:
+        return []
+    anchors = anchors or {}
+    ids = [str(nd["id"]) for nd in nodes]
+
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    for i, nd in enumerate(nodes):
+        la, lo = _gps(nd)
+        if la is None or lo is None:
+            la, lo = anchors.get(ids[i], (None, None))
+        if la is not None and lo is not None:
+            lat[i], lon[i] = float(la), float(lo)
+
+    index = {nid: i for i, nid in enumerate(ids)}
+    a, b = [], []
+    for e in edges:
+        a.append(index.get(str(e.get("from")), -1))
+        b.append(index.get(str(e.get("to")), -1))
+    indptr, adj, _edge = csr_adjacency(n, np.array(a, dtype=np.int64), np.array(b, dtype=np.int64))
+
+    x, y = geo_xy(ids, [nd.get("group") for nd in nodes], lat, lon, indptr, adj)
+    xs, ys = x.tolist(), y.tolist()
+    return [{**nd, "x": xs[i], "y": ys[i]} for i, nd in enumerate(nodes)]
+
+
+def geo_layout_graph(graph: CompactGraph) -> CompactGraph:
+    """geo_layout sobre un CompactGraph: mismas reglas, sin armar dicts."""
+    if graph.node_count == 0:
+        return graph
+    nodes = graph.nodes
+    lat, lon = nodes.floats(("gps_lat",)), nodes.floats(("gps_lon",))
+    # como _gps: si falta el par del nivel superior se usa el de meta
+    top = np.isfinite(lat) & np.isfinite(lon)
+    lat = np.where(top, lat, nodes.floats(("meta", "gps_lat")))
+    lon = np.where(top, lon, nodes.floats(("meta", "gps_lon")))
+    indptr, adj, _edge = graph.csr()
+    x, y = geo_xy(graph.node_ids(), nodes.decoded(("group",)), lat, lon, indptr, adj)
+    return graph.with_xy(x, y)
+
+
+def geo_xy(
+    ids: List[str],
+    groups: Sequence[Optional[str]],
+    lat: np.ndarray,
+    lon: np.ndarray,
+    indptr: np.ndarray,
+    adj: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    x/y de pantalla para nodos con GPS `lat`/`lon` (nan = sin GPS) y
+    adyacencia CSR (core.arrays.csr_adjacency).
+
+    - Los elementos sin GPS se ubican junto a sus vecinos ya ubicados y, si
+      no tienen ninguno, en un anillo alrededor de la red.
+    - Los elementos que caen en el mismo punto se reparten en un anillo de
+      GEO_SPREAD_PX; el poste/nodo queda en el centro.
+    """
+    n = len(ids)
+    spread = settings.GEO_SPREAD_PX
+    has = np.isfinite(lat) & np.isfinite(lon) & ~((lat == 0) & (lon == 0)) & (np.abs(lat) < 85)
+
+    x = np.zeros(n)
+    y = np.zeros(n)
+    if has.any():
+        lat0 = settings.GEO_ORIGIN_LAT
+        lon0 = settings.GEO_ORIGIN_LON
+        if lat0 is None or lon0 is None:
+            # origen estable: centroide redondeado a 0.01°
+            lat0 = round(float(lat[has].mean()), 2)
+            lon0 = round(float(lon[has].mean()), 2)
+        x[has], y[has] = mercator_xy(lat[has], lon[has], lat0, lon0, settings.GEO_PX_PER_M)
+
+    # --- sin GPS: junto a vecinos ubicados
+    placed = has.copy()
+    missing = np.flatnonzero(~placed).tolist()
+    if missing:
+        for _ in range(4):
+            progressed = []
+            for i in missing:
+                nb = [j for j in adj[indptr[i] : indptr[i + 1]].tolist() if placed[j]]
+                if not nb:
+                    continue
+                a = _angle_from_id(ids[i])
+                x[i] = sum(x[j] for j in nb) / len(nb) + 2 * spread * cos(a)
+                y[i] = sum(y[j] for j in nb) / len(nb) + 2 * spread * sin(a)
+                progressed.append(i)
+            if not progressed:
+                break
+            placed[progressed] = True
+            missing = [i for i in missing if not placed[i]]
+        if missing:
+            if placed.any():
+                cx, cy = x[placed].mean(), y[placed].mean()
+                r = max(np.ptp(x[placed]), np.ptp(y[placed]), 4 * spread) * 0.6
+            else:
+                cx, cy, r = 0.0, 0.0, 350.0
+            for i in missing:
+                a = _angle_from_id(ids[i])
+                x[i], y[i] = cx + r * cos(a), cy + r * sin(a)
+
+    # --- elementos en el mismo punto (a 1 px): anillo alrededor del ancla
+    kx = np.round(x).astype(np.int64)
+    ky = np.round(y).astype(np.int64)
+    key = (kx - kx.min()) * (int(ky.max() - ky.min()) + 1) + (ky - ky.min())
+    _, inv, counts = np.unique(key, return_inverse=True, return_counts=True)
+    shared = counts[inv] > 1
+    if shared.any():
+        sel = np.flatnonzero(shared)
+        prio = np.array([0 if groups[i] in _ANCHOR_GROUPS else 1 for i in sel.tolist()])
+        id_rank = np.argsort(np.argsort(np.array([ids[i] for i in sel.tolist()])))
+        order = sel[np.lexsort((id_rank, prio, inv[sel]))]
+        g = inv[order]
+        first = np.r_[0, np.flatnonzero(g[1:] != g[:-1]) + 1]
+        rank = np.arange(len(order)) - np.repeat(first, np.diff(np.r_[first, len(order)]))
+        cnt = counts[g]
+        has_center = np.repeat(
+            prio[np.searchsorted(sel, order[first])] == 0, np.diff(np.r_[first, len(order)])
+        )
+        ring_n = np.where(has_center, cnt - 1, cnt)
+        ring_rank = np.where(has_center, rank - 1, rank)
+        on_ring = ring_rank >= 0
+        ang = 2 * np.pi * ring_rank / np.maximum(ring_n, 1)
+        rad = spread * np.maximum(1.0, ring_n / 6.0)
+        x[order[on_ring]] += (rad * np.cos(ang))[on_ring]
+        y[order[on_ring]] += (rad * np.sin(ang))[on_ring]
+
+    return x, y
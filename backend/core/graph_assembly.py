@@ -0,0 +1,502 @@
+from collections import defaultdict
+from math import cos, sin
+from typing import Dict, List, Tuple
+
+from .util import _angle_from_id
+
+# Armado de los grafos de vis-network a partir de filas ya leídas de la BD.
+# Son funciones puras (sin BD ni estado global) para poder ejecutarlas en un
+# proceso aparte (core.offload) con las filas como argumento.
+
+
+def assemble_overview(
+    nodes_rows: List[dict],
+    routes_rows: List[dict],
+    route_mufa_rows: List[dict],
+    pos_map: Dict[str, Tuple[float, float]],
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Overview: nodos físicos + rutas NODO-NODO. Las rutas que se separan en
+    una mufa (2+ destinos desde el mismo nodo) se dibujan vía un nodo
+    MUFA_SPLIT; las demás rutas se dibujan como enlaces directos:
+        from_nodo -> to_nodo
+    """
+    # --------------------------------------------------
+    # NODOS BASE: NODOS FÍSICOS (tabla nodo)
+    # --------------------------------------------------
+    vis_nodes: List[dict] = []
+    R = 350.0
+
+    for n in nodes_rows:
+        nid = n["id"]
+        if nid in pos_map:
+            x, y = pos_map[nid]
+            fixed_xy = True
+        else:
+            # Layout circular determinístico por id
+            a = _angle_from_id(nid)
+            x, y = R * cos(a), R * sin(a)
+            fixed_xy = True
+
+        ref = n.get("reference") or n.get("nodo_reference")
+        gps_lat = n.get("gps_lat")
+        gps_lon = n.get("gps_lon")
+
+        vis_nodes.append(
+            {
+                "id": nid,
+                "label": n.get("label") or nid,
+                "group": "nodo",
+                "kind": "NODO",
+                "reference": ref,
+                "tipo": n.get("type"),
+                "gps_lat": gps_lat,
+                "gps_lon": gps_lon,
+                "meta": {
+                    "reference": ref,
+                    "tipo": n.get("type"),
+                    "gps_lat": gps_lat,
+                    "gps_lon": gps_lon,
+                    "nodo_code": n.get("code"),
+                },
+                "x": float(x),
+                "y": float(y),
+                "fixed": {"x": fixed_xy, "y": fixed_xy},
+            }
+        )
+
+    existing_node_ids = {n["id"] for n in vis_nodes}
+
+    # route_id -> (from_nodo_id, to_nodo_id, path_text)
+    route_map: Dict[str, dict] = {}
+    for r in routes_rows:
+        route_map[str(r["route_id"])] = {
+            "from": r["from_nodo_id"],
+            "to": r["to_nodo_id"],
+            "path_text": r.get("path_text"),
+        }
+
+    # route_id -> lista de mufas (id, code)
+    route_mufas: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for rm in route_mufa_rows:
+        rid = str(rm["route_id"])
+        if rid not in route_map:
+            # Ruta física que no está en el summary de backbone (poco probable, pero robustez)
+            continue
+        mid = str(rm["mufa_id"])
+        mcode = rm.get("mufa_code") or mid
+        # evitamos duplicados por ruta+mufa
+        if not any(m[0] == mid for m in route_mufas[rid]):
+            route_mufas[rid].append((mid, mcode))
+
+    # (from_nodo_id, mufa_id) -> set(to_nodo_id)
+    from_mufa_to_dests: Dict[Tuple[str, str], set] = defaultdict(set)
+    # (from_nodo_id, mufa_id) -> lista de route_ids que pasan por esa mufa
+    from_mufa_to_routes: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    # mufa_id -> code (para labels)
+    mufa_code_map: Dict[str, str] = {}
+
+    for rid, info in route_map.items():
+        from_id = info["from"]
+        to_id = info["to"]
+        mufas_this_route = route_mufas.get(rid, [])
+        for mufa_id, mufa_code in mufas_this_route:
+            key = (from_id, mufa_id)
+            from_mufa_to_dests[key].add(to_id)
+            if rid not in from_mufa_to_routes[key]:
+                from_mufa_to_routes[key].append(rid)
+            if mufa_id not in mufa_code_map:
+                mufa_code_map[mufa_id] = mufa_code
+
+    # Determinamos qué (from_nodo, mufa) son realmente splitters:
+    #   - si tiene 2+ destinos distintos, es splitter
+    splitter_keys = {
+        key for key, dests in from_mufa_to_dests.items() if len(dests) >= 2
+    }
+
+    # Rutas que están en algún grupo con split
+    routes_in_split: set = set()
+    for key in splitter_keys:
+        for rid in from_mufa_to_routes[key]:
+            routes_in_split.add(rid)
+
+    # Conjunto de todas las rutas
+    all_route_ids = set(route_map.keys())
+    # Rutas normales = no participan en splits
+    normal_route_ids = all_route_ids - routes_in_split
+
+    # CONSTRUCCIÓN DE ARISTAS PARA vis-network
+    vis_edges: List[dict] = []
+
+    # 1) Rutas normales: NODO -> NODO directo
+    for rid in sorted(normal_route_ids):
+        info = route_map[rid]
+        vis_edges.append(
+            {
+                "id": rid,
+                "from": info["from"],
+                "to": info["to"],
+                "title": info.get("path_text"),
+                "edge_kind": "NODO_LINK",
+                "meta": {"route_id": rid},
+            }
+        )
+
+    # 2) Rutas con MUFA_SPLIT
+    # Organizamos las mufas alrededor del nodo origen
+    per_from_counter: Dict[str, int] = defaultdict(int)
+
+    # en orden: el índice por nodo origen fija la posición de la mufa, y el
+    # orden de un set de tuplas de str cambia con PYTHONHASHSEED (cada worker
+    # de core.offload tiene el suyo)
+    for from_id, mufa_id in sorted(splitter_keys):
+        # rutas que usan este splitter
+        rids = from_mufa_to_routes[(from_id, mufa_id)]
+
+        # Nodo MUFA virtual por (from_nodo, mufa)
+        mufa_node_id = f"MUFA_OV_{from_id}_{mufa_id}"
+        if mufa_node_id not in existing_node_ids:
+            idx_for_from = per_from_counter[from_id]
+            per_from_counter[from_id] += 1
+
+            # Buscamos la posición del nodo origen para colocar la mufa cerca
+            base_node = next((n for n in vis_nodes if n["id"] == from_id), None)
+            if base_node is not None:
+                bx, by = float(base_node["x"]), float(base_node["y"])
+                sx = bx + 140.0
+                sy = by - 90.0 * idx_for_from
+                fixed_xy = base_node.get("fixed", {"x": True, "y": True})
+            else:
+                # fallback circular si no encontramos el nodo
+                a = _angle_from_id(mufa_node_id)
+                sx, sy = R * cos(a), R * sin(a)
+                fixed_xy = {"x": True, "y": True}
+
+            label = mufa_code_map.get(mufa_id, mufa_id)
+
+            vis_nodes.append(
+                {
+                    "id": mufa_node_id,
+                    "label": label,
+                    "group": "mufa_split",
+                    "kind": "MUFA_SPLIT",
+                    "x": float(sx),
+                    "y": float(sy),
+                    "fixed": fixed_xy,
+                    "meta": {
+                        "tipo": "MUFA_SPLIT",
+                        "mufa_id": mufa_id,
+                        "mufa_code": label,
+                        "from_nodo_id": from_id,
+                        "source": "overview",
+                    },
+                }
+            )
+            existing_node_ids.add(mufa_node_id)
+
+        # Edge único desde el nodo origen hacia la mufa
+        vis_edges.append(
+            {
+                "id": f"{from_id}::{mufa_id}::FROM",
+                "from": from_id,
+                "to": mufa_node_id,
+                "title": f"Split via MUFA {mufa_id}",
+                "edge_kind": "NODO_TO_MUFA",
+                "meta": {
+                    "mufa_id": mufa_id,
+                    "from_nodo_id": from_id,
+                    "route_ids": rids,
+                },
+            }
+        )
+
+        # Edges desde la mufa hacia cada destino (uno por route_id, conservando route_id)
+        for rid in rids:
+            to_id = route_map[rid]["to"]
+            vis_edges.append(
+                {
+                    "id": f"{mufa_id}::{from_id}::{to_id}::{rid}",
+                    "from": mufa_node_id,
+                    "to": to_id,
+                    "title": route_map[rid].get("path_text"),
+                    "edge_kind": "MUFA_TO_NODO",
+                    "meta": {"route_id": rid},
+                }
+            )
+
+    return vis_nodes, vis_edges
+
+
+def route_graph_node_ids(
+    base_end: dict, route_end_map: Dict[str, dict], ordered_poles: List[str], mufas: List[dict]
+) -> List[str]:
+    """Ids de nodos del grafo de ruta cuyas posiciones guardadas hay que leer."""
+    to_odf_ids = {info["to_odf_id"] for info in route_end_map.values()}
+    candidate_ids: List[str] = [f"{base_end['from_odf_id']}"]
+    candidate_ids.extend(f"{oid}" for oid in to_odf_ids)
+    candidate_ids.extend(f"{p}" for p in ordered_poles)
+    candidate_ids.extend(f"{m['id']}" for m in mufas)
+    return candidate_ids
+
+
+def assemble_route_graph(
+    route_id: str,
+    base_end: dict,
+    route_end_map: Dict[str, dict],
+    segs: List[dict],
+    ordered_poles: List[str],
+    last_pole_by_route: Dict[str, str],
+    poles: List[dict],
+    mufas: List[dict],
+    pos_map: Dict[str, Tuple[float, float]],
+    odf_links: bool = True,
+) -> dict:
+    """
+    Grafo físico de la ruta (base + hermanas): ODF origen, postes en layout
+    lineal, mufas sobre su poste, spans y enlaces virtuales ODF-poste.
+    `pos_map` son las posiciones guardadas; el resto se calcula por defecto.
+    Sin `odf_links` se omiten los enlaces virtuales ODF-poste.
+    """
+    pole_map = {p["id"]: p for p in poles}
+    pos_map = dict(pos_map)
+
+    # 8) Construcción de nodos y aristas
+    nodes = []
+    edges = []
+
+    def nid(kind: str, raw_id: str) -> str:
+        # para este grafo usamos el id crudo (consistente con el resto de la app)
+        return f"{raw_id}"
+
+
+    base_from_odf_id = base_end["from_odf_id"]
+    from_odf_node_id = nid("ODF", base_from_odf_id)
+
+    # Todos los ODF destino (B, C, ...) de las rutas involucradas
+    to_odf_ids = set()
+    for r_id, info in route_end_map.items():
+        to_odf_ids.add(info["to_odf_id"])
+
+    # 10) Layout lineal de postes por defecto
+    SPACING_X = 220.0
+    for i, pid in enumerate(ordered_poles):
+        k = nid("POLE", pid)
+        if k not in pos_map:
+            pos_map[k] = (i * SPACING_X, 0.0)
+
+    # 11) Posición de ODF origen y ODF destino
+    if ordered_poles:
+        x0 = pos_map[nid("POLE", ordered_poles[0])][0]
+        xN = pos_map[nid("POLE", ordered_poles[-1])][0]
+    else:
+        x0, xN = -180.0, 180.0
+
+    if from_odf_node_id not in pos_map:
+        pos_map[from_odf_node_id] = (x0 - 180.0, 0.0)
+
+    # default X para cada ODF destino, basado en el último poste de su ruta
+    default_to_pos: Dict[str, tuple[float, float]] = {}
+    for r_id, info in route_end_map.items():
+        to_oid = info["to_odf_id"]
+        last_pole = last_pole_by_route.get(r_id)
+        if not last_pole:
+            continue
+        pole_k = nid("POLE", last_pole)
+        px, py = pos_map.get(pole_k, (xN, 0.0))
+        default_to_pos[to_oid] = (px + 180.0, py)
+
+    for to_oid in to_odf_ids:
+        k = nid("ODF", to_oid)
+        if k not in pos_map:
+            px, py = default_to_pos.get(to_oid, (xN + 180.0, 0.0))
+            pos_map[k] = (px, py)
+
+    # 12) Nodos ODF
+    # ODF origen (único)
+    nodes.append(
+        {
+            "id": from_odf_node_id,
+            "label": base_end["from_odf_code"]
+            or base_end["from_odf_name"]
+            or base_from_odf_id,
+            "group": "odf",
+            "x": float(pos_map[from_odf_node_id][0]),
+            "y": float(pos_map[from_odf_node_id][1]),
+            "fixed": {"x": True, "y": True},
+            "meta": {
+                "nodo_id": base_end["from_nodo_id"],
+                "odf_id": base_from_odf_id,
+            },
+        }
+    )
+
+    # ODF destino (pueden ser varios: B, C, ...)
+    # Tomamos la info de cualquier ruta que tenga ese to_odf_id
+    to_odf_info: Dict[str, dict] = {}
+    for r_id, info in route_end_map.items():
+        to_oid = info["to_odf_id"]
+        if to_oid not in to_odf_info:
+            to_odf_info[to_oid] = info
+
+    for to_oid, info in to_odf_info.items():
+        k = nid("ODF", to_oid)
+        nodes.append(
+            {
+                "id": k,
+                "label": info["to_odf_code"] or info["to_odf_name"] or to_oid,
+                "group": "odf",
+                "x": float(pos_map[k][0]),
+                "y": float(pos_map[k][1]),
+                "fixed": {"x": True, "y": True},
+                "meta": {
+                    "nodo_id": info["to_nodo_id"],
+                    "odf_id": to_oid,
+                },
+            }
+        )
+
+    # 13) Nodos de postes
+    for pid in ordered_poles:
+        p = pole_map.get(pid, {"code": pid})
+        k = nid("POLE", pid)
+        nodes.append(
+            {
+                "id": k,
+                "label": p.get("code") or pid,
+                "group": "pole",
+                "x": float(pos_map[k][0]),
+                "y": float(pos_map[k][1]),
+                "fixed": {"x": True, "y": True},
+                "meta": {
+                    "pole_id": pid,
+                    "pole_type": p.get("pole_type"),
+                    "status": p.get("status"),
+                    "gps_lat": p.get("gps_lat"),
+                    "gps_lon": p.get("gps_lon"),
+                },
+            }
+        )
+
+    # 14) Nodos de MUFAS (sobre postes)
+    MUFA_DY = -120.0
+
+    for m in mufas:
+        k = nid("MUFA", m["id"])
+        if k not in pos_map:
+            px, py = pos_map[nid("POLE", m["pole_id"])]
+            pos_map[k] = (px, py + MUFA_DY)
+        nodes.append(
+            {
+                "id": k,
+                "label": m["code"],
+                "group": "mufa",
+                "x": float(pos_map[k][0]),
+                "y": float(pos_map[k][1]),
+                "fixed": {"x": True, "y": True},
+                "meta": {
+                    "mufa_id": m["id"],
+                    "pole_id": m["pole_id"],
+                    "mufa_type": m.get("mufa_type"),
+                    "gps_lat": m.get("gps_lat"),
+                    "gps_lon": m.get("gps_lon"),
+                },
+            }
+        )
+
+        # Arista poste-mufa (decorativa)
+        edges.append(
+            {
+                "id": f"PM:{m['pole_id']}:{m['id']}",
+                "from": nid("POLE", m["pole_id"]),
+                "to": k,
+                "group": "pole_mufa",
+                "title": "Mufa",
+            }
+        )
+
+    # 15) Aristas de spans (poste a poste), para todas las rutas
+    for s in segs:
+        edges.append(
+            {
+                "id": f"{s['cable_span_id']}",
+                "from": nid("POLE", s["from_pole_id"]),
+                "to": nid("POLE", s["to_pole_id"]),
+                "group": "span",
+                "title": (
+                    f"{s['cable_id']} | {s['capacity_fibers']} hilos | "
+                    f"{s['length_m'] or 0}m / {s['length_span'] or 0}m"
+                ),
+                "meta": {
+                    "cable_id": s["cable_id"],
+                    "cable_seg_id": s["cable_span_id"],
+                    "length_m": s["length_m"],
+                    "seg_seq": s["seg_seq"],
+                    "capacity_span": s["length_span"],
+                    "capacity_fibers": s["capacity_fibers"],
+                    "odf_route_id": s["odf_route_id"],
+                },
+            }
+        )
+
+    if odf_links:
+        # 16) Arista "virtual" ODF origen -> primer poste
+        if ordered_poles:
+            edges.append(
+                {
+                    "id": f"ODF_IN:{route_id}",
+                    "from": from_odf_node_id,
+                    "to": nid("POLE", ordered_poles[0]),
+                    "group": "odf_link",
+                    "title": "Entrada a planta externa",
+                }
+            )
+
+        # 17) Aristas "virtuales" último poste de cada ruta -> su ODF destino
+        for r_id, info in route_end_map.items():
+            last_pole = last_pole_by_route.get(r_id)
+            if not last_pole:
+                continue
+            to_oid = info["to_odf_id"]
+            edges.append(
+                {
+                    "id": f"ODF_OUT:{r_id}",
+                    "from": nid("POLE", last_pole),
+                    "to": nid("ODF", to_oid),
+                    "group": "odf_link",
+                    "title": f"Salida a ODF destino (ruta {r_id})",
+                }
+            )
+
+    return {"nodes": nodes, "edges": edges}
+
+
+# Capas opcionales del grafo de ruta (LayerControls). Sin capas queda el
+# núcleo: ruta base con sus ODF, postes y spans.
+ROUTE_LAYERS = ("access", "mufas", "odf_links", "siblings")
+
+# grupos de nodos / aristas que aporta cada capa ("siblings" aporta postes,
+# spans y ODF de otras rutas: se obtiene por diferencia, ver subgraph_diff)
+LAYER_GROUPS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "access": (("router",), ("patch",)),
+    "mufas": (("mufa",), ("pole_mufa",)),
+    "odf_links": ((), ("odf_link",)),
+}
+
+
+def layer_subgraph(graph: dict, layer: str) -> dict:
+    """Nodos y aristas de `graph` que pertenecen a la capa `layer`."""
+    node_groups, edge_groups = LAYER_GROUPS[layer]
+    return {
+        "nodes": [n for n in graph["nodes"] if n.get("group") in node_groups],
+        "edges": [e for e in graph["edges"] if e.get("group") in edge_groups],
+    }
+
+
+def subgraph_diff(graph: dict, without: dict) -> dict:
+    """Nodos y aristas de `graph` que no están en `without` (por id)."""
+    node_ids = {n["id"] for n in without["nodes"]}
+    edge_ids = {e["id"] for e in without["edges"]}
+    return {
+        "nodes": [n for n in graph["nodes"] if n["id"] not in node_ids],
+        "edges": [e for e in graph["edges"] if e["id"] not in edge_ids],
+    }
@@ -0,0 +1,460 @@
+import threading
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .arrays import csr_adjacency
+
+# Representación compacta de los grafos que se guardan en memoria (historial
+# del overview, layout geográfico): ids y strings internados como enteros,
+# un arreglo por campo (x, y, group, meta.*...) y adyacencia CSR. Los dicts
+# de vis-network se arman recién al responder (node_dicts / edge_dicts).
+
+Path = Tuple[str, ...]  # ("x",) o ("meta", "gps_lat")
+Shape = Tuple[Tuple[str, Optional[Tuple[str, ...]]], ...]
+
+_NONE = -1  # código de None en columnas de strings / bool
+_INT_NONE = np.iinfo(np.int64).min
+
+
+class Interner:
+    """
+    Strings -> códigos enteros; cada string distinto se guarda una vez.
+    Sólo se agrega bajo lock (lo comparten snapshots que se leen mientras
+    se arma otro); leer códigos ya asignados no lo necesita.
+    """
+
+    __slots__ = ("strings", "_index", "_lock")
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def _code(self, s: str) -> int:
+        i = self._index.get(s)
+        if i is None:
+            self.strings.append(s)
+            i = self._index[s] = len(self.strings) - 1
+        return i
+
+    def code(self, s: str) -> int:
+        with self._lock:
+            return self._code(s)
+
+    def get(self, s: str) -> int:
+        """Código de `s` sin agregarlo (-2 si no está)."""
+        return self._index.get(s, -2)
+
+    def codes(self, values: Iterable[Optional[str]], n: int) -> np.ndarray:
+        code = self._code
+        with self._lock:
+            return np.fromiter(
+                (_NONE if v is None else code(v) for v in values), dtype=np.int32, count=n
+            )
+
+    def translate(self, other: "Interner") -> np.ndarray:
+        """
+        Tabla código de `other` -> código propio (-2 = no existe). La última
+        posición traduce _NONE a _NONE (se indexa con el código tal cual).
+        """
+        get = self._index.get
+        table = np.fromiter(
+            (get(s, -2) for s in other.strings), dtype=np.int32, count=len(other.strings)
+        )
+        return np.append(table, np.int32(_NONE))
+
+
+def _column_kind(values: List) -> str:
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return "n"
+    if kinds == {str}:
+        return "s"
+    if kinds == {bool}:
+        return "b"
+    if kinds == {int}:
+        return "i"
+    if kinds <= {float, Decimal}:
+        return "f"  # Decimal de SQL Server: sale como float en el JSON igual
+    return "o"
+
+
+class ColumnTable:
+    """
+    Lista de dicts de nodos o aristas guardada por columnas: un arreglo por
+    campo, incluidos los de un nivel de anidamiento (meta.*, fixed.*).
+    Cada fila recuerda su "forma" (claves en orden) para volver a armar el
+    mismo dict. Tipos por columna: s (códigos del Interner), f (float64,
+    nan = None), i (int64), b (int8) y o (lista Python, ej. route_ids).
+    """
+
+    __slots__ = ("n", "interner", "shapes", "shape", "columns")
+
+    def __init__(
+        self, n: int, interner: Interner, shapes: List[Shape], shape: np.ndarray, columns
+    ):
+        self.n = n
+        self.interner = interner
+        self.shapes = shapes
+        self.shape = shape
+        self.columns: Dict[Path, Tuple[str, object]] = columns
+
+    @classmethod
+    def from_dicts(cls, items: Sequence[dict], interner: Interner) -> "ColumnTable":
+        n = len(items)
+        shapes: List[Shape] = []
+        shape_index: Dict[Shape, int] = {}
+        shape = np.empty(n, dtype=np.uint16)
+        values: Dict[Path, List] = {}
+
+        def column(path: Path) -> List:
+            col = values.get(path)
+            if col is None:
+                col = values[path] = [None] * n
+            return col
+
+        for i, d in enumerate(items):
+            keys = []
+            for k, v in d.items():
+                if isinstance(v, dict):
+                    keys.append((k, tuple(v)))
+                    for sub, sv in v.items():
+                        column((k, sub))[i] = sv
+                else:
+                    keys.append((k, None))
+                    column((k,))[i] = v
+            sk = tuple(keys)
+            code = shape_index.get(sk)
+            if code is None:
+                code = shape_index[sk] = len(shapes)
+                shapes.append(sk)
+            shape[i] = code
+
+        columns = {path: cls._encode(vals, interner) for path, vals in values.items()}
+        return cls(n, interner, shapes, shape, columns)
+
+    @staticmethod
+    def _encode(vals: List, interner: Interner) -> Tuple[str, object]:
+        kind = _column_kind(vals)
+        n = len(vals)
+        if kind == "s":
+            return kind, interner.codes(vals, n)
+        if kind == "f":
+            return kind, np.fromiter(
+                (np.nan if v is None else float(v) for v in vals), dtype=np.float64, count=n
+            )
+        if kind == "i":
+            return kind, np.fromiter(
+                (_INT_NONE if v is None else v for v in vals), dtype=np.int64, count=n
+            )
+        if kind == "b":
+            return kind, np.fromiter(
+                (_NONE if v is None else int(v) for v in vals), dtype=np.int8, count=n
+            )
+        if kind == "n":
+            return kind, None
+        return kind, vals
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def decoded(self, path: Path, idx: Optional[np.ndarray] = None) -> List:
+        """Valores Python de la columna (None donde falta) para las filas `idx`."""
+        n = self.n if idx is None else len(idx)
+        col = self.columns.get(path)
+        if col is None or col[0] == "n":
+            return [None] * n
+        kind, data = col
+        if kind == "o":
+            return list(data) if idx is None else [data[i] for i in idx.tolist()]
+        arr = data if idx is None else data[idx]
+        if kind == "s":
+            strings = self.interner.strings
+            return [None if c < 0 else strings[c] for c in arr.tolist()]
+        if kind == "f":
+            return [None if v != v else v for v in arr.tolist()]
+        if kind == "i":
+            return [None if v == _INT_NONE else v for v in arr.tolist()]
+        return [None if v < 0 else bool(v) for v in arr.tolist()]
+
+    def floats(self, path: Path) -> np.ndarray:
+        """Columna como float64 (nan donde falta o no es numérica)."""
+        col = self.columns.get(path)
+        if col is not None and col[0] == "f":
+            return col[1]
+        out = np.full(self.n, np.nan)
+        if col is not None and col[0] in ("i", "o"):
+            for i, v in enumerate(self.decoded(path)):
+                if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool):
+                    out[i] = float(v)
+        return out
+
+    def dicts(self, idx: Optional[np.ndarray] = None) -> List[dict]:
+        rows = np.arange(self.n) if idx is None else np.asarray(idx, dtype=np.int64)
+        shape = self.shape[rows]
+        groups = np.unique(shape).tolist()
+        out: List[dict] = [] if len(groups) == 1 else [None] * len(rows)  # type: ignore[list-item]
+        # Por forma: columnas decodificadas en bloque y dicts armados con zip
+        for s in groups:
+            pos = None if len(groups) == 1 else np.flatnonzero(shape == s)
+            part = rows if pos is None else rows[pos]
+            keys, values = [], []
+            for key, subs in self.shapes[s]:
+                keys.append(key)
+                if subs is None:
+                    values.append(self.decoded((key,), part))
+                elif subs:
+                    cols = [self.decoded((key, sub), part) for sub in subs]
+                    values.append([dict(zip(subs, t)) for t in zip(*cols)])
+                else:
+                    values.append([{} for _ in range(len(part))])
+            if keys:
+                dicts = [dict(zip(keys, t)) for t in zip(*values)]
+            else:
+                dicts = [{} for _ in range(len(part))]
+            if pos is None:
+                out = dicts
+            else:
+                for p, d in zip(pos.tolist(), dicts):
+                    out[p] = d
+        return out
+
+    def with_column(self, path: Path, kind: str, data) -> "ColumnTable":
+        """Copia liviana con una columna reemplazada (el resto se comparte)."""
+        columns = dict(self.columns)
+        columns[path] = (kind, data)
+        return ColumnTable(self.n, self.interner, self.shapes, self.shape, columns)
+
+    def nbytes(self) -> int:
+        total = self.shape.nbytes
+        for kind, data in self.columns.values():
+            if isinstance(data, np.ndarray):
+                total += data.nbytes
+            elif kind == "o":
+                total += 8 * len(data)
+        return total
+
+    # ------------------------------------------------------------------
+    # Comparación
+    # ------------------------------------------------------------------
+    def equal_rows(
+        self, idx: np.ndarray, other: "ColumnTable", other_idx: np.ndarray
+    ) -> np.ndarray:
+        """self[idx[k]] == other[other_idx[k]] (como dicts), vectorizado por columna."""
+        other_shape = np.array(
+            [self.shapes.index(s) if s in self.shapes else -1 for s in other.shapes] or [-1],
+            dtype=np.int64,
+        )
+        eq = self.shape[idx].astype(np.int64) == other_shape[other.shape[other_idx]]
+        trans = None
+        for path in set(self.columns) | set(other.columns):
+            a = self.columns.get(path, ("n", None))
+            b = other.columns.get(path, ("n", None))
+            if a[0] == b[0] == "n":
+                continue
+            if a[0] == b[0] and a[0] in ("f", "i", "b"):
+                x, y = a[1][idx], b[1][other_idx]
+                same = (x == y) | (np.isnan(x) & np.isnan(y)) if a[0] == "f" else x == y
+            elif a[0] == b[0] == "s":
+                y = b[1][other_idx]
+                if other.interner is not self.interner:
+                    if trans is None:
+                        trans = self.interner.translate(other.interner)
+                    y = trans[y]
+                same = a[1][idx] == y
+            else:
+                x, y = self.decoded(path, idx), other.decoded(path, other_idx)
+                same = np.fromiter((p == q for p, q in zip(x, y)), dtype=bool, count=len(x))
+            eq &= same
+        return eq
+
+
+class CompactGraph:
+    """
+    Grafo de vis-network en forma compacta: tablas de nodos y aristas por
+    columnas, ids internados (`node_keys` / `edge_keys`, códigos del
+    Interner) y adyacencia CSR no dirigida (se arma al primer uso).
+    """
+
+    __slots__ = (
+        "interner",
+        "nodes",
+        "edges",
+        "node_keys",
+        "edge_keys",
+        "src",
+        "dst",
+        "_node_order",
+        "_csr",
+    )
+
+    def __init__(self, interner, nodes, edges, node_keys, edge_keys, src, dst):
+        self.interner = interner
+        self.nodes: ColumnTable = nodes
+        self.edges: ColumnTable = edges
+        self.node_keys: np.ndarray = node_keys
+        self.edge_keys: np.ndarray = edge_keys
+        self.src: np.ndarray = src  # índice de nodo de "from" (-1 = no está)
+        self.dst: np.ndarray = dst
+        self._node_order = np.argsort(node_keys, kind="stable")
+        self._csr: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def from_dicts(
+        cls, nodes: Sequence[dict], edges: Sequence[dict], interner: Optional[Interner] = None
+    ) -> "CompactGraph":
+        interner = interner if interner is not None else Interner()
+        node_table = ColumnTable.from_dicts(nodes, interner)
+        edge_table = ColumnTable.from_dicts(edges, interner)
+        node_keys = cls._keys(node_table, interner, nodes, "id")
+        edge_keys = cls._keys(edge_table, interner, edges, "id")
+        graph = cls(interner, node_table, edge_table, node_keys, edge_keys, None, None)
+        graph.src = graph._lookup(cls._keys(edge_table, interner, edges, "from"))
+        graph.dst = graph._lookup(cls._keys(edge_table, interner, edges, "to"))
+        return graph
+
+    @staticmethod
+    def _keys(
+        table: ColumnTable, interner: Interner, items: Sequence[dict], key: str
+    ) -> np.ndarray:
+        # ids no string (ej. INT de la BD) se indexan por str(id)
+        col = table.columns.get((key,))
+        if col is not None and col[0] == "s":
+            return col[1]
+        return interner.codes(
+            (None if d.get(key) is None else str(d[key]) for d in items), len(items)
+        )
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Códigos de id -> índice de nodo (-1 si no es un nodo del grafo)."""
+        order = self._node_order
+        if len(order) == 0:
+            return np.full(len(keys), -1, dtype=np.int32)
+        sorted_keys = self.node_keys[order]
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(order) - 1)
+        found = (sorted_keys[pos] == keys) & (keys >= 0)
+        return np.where(found, order[pos], -1).astype(np.int32)
+
+    # ------------------------------------------------------------------
+    # Acceso
+    # ------------------------------------------------------------------
+    @property
+    def node_count(self) -> int:
+        return self.nodes.n
+
+    @property
+    def edge_count(self) -> int:
+        return self.edges.n
+
+    def node_index(self, node_id: str) -> Optional[int]:
+        code = self.interner.get(str(node_id))
+        if code < 0:
+            return None
+        i = int(self._lookup(np.array([code], dtype=np.int32))[0])
+        return i if i >= 0 else None
+
+    def node_ids(self) -> List[str]:
+        strings = self.interner.strings
+        return [strings[c] for c in self.node_keys.tolist()]
+
+    def node_dicts(self, idx: Optional[np.ndarray] = None) -> List[dict]:
+        return self.nodes.dicts(idx)
+
+    def edge_dicts(self, idx: Optional[np.ndarray] = None) -> List[dict]:
+        return self.edges.dicts(idx)
+
+    def csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._csr is None:
+            self._csr = csr_adjacency(self.node_count, self.src, self.dst)
+        return self._csr
+
+    def neighbors(self, i: int) -> np.ndarray:
+        indptr, adj, _edge = self.csr()
+        return adj[indptr[i] : indptr[i + 1]]
+
+    def with_xy(self, x: np.ndarray, y: np.ndarray) -> "CompactGraph":
+        """Mismo grafo con otras coordenadas (comparte todo lo demás)."""
+        nodes = self.nodes.with_column(("x",), "f", np.asarray(x, dtype=np.float64))
+        nodes = nodes.with_column(("y",), "f", np.asarray(y, dtype=np.float64))
+        graph = CompactGraph(
+            self.interner, nodes, self.edges, self.node_keys, self.edge_keys, self.src, self.dst
+        )
+        graph._csr = self._csr
+        return graph
+
+    def strings_used(self) -> int:
+        """Strings distintos del Interner que usa este grafo."""
+        codes = [self.node_keys, self.edge_keys]
+        for table in (self.nodes, self.edges):
+            codes.extend(data for kind, data in table.columns.values() if kind == "s")
+        used = np.unique(np.concatenate(codes)) if codes else np.empty(0)
+        return int(np.count_nonzero(used >= 0))
+
+    def memory(self) -> Dict[str, int]:
+        """Bytes de los arreglos por parte (los strings internados van aparte)."""
+        csr = sum(a.nbytes for a in self._csr) if self._csr is not None else 0
+        return {
+            "nodes": self.nodes.nbytes() + self.node_keys.nbytes + self._node_order.nbytes,
+            "edges": (
+                self.edges.nbytes() + self.edge_keys.nbytes + self.src.nbytes + self.dst.nbytes
+            ),
+            "csr": csr,
+            "strings": len(self.interner),
+        }
+
+    # ------------------------------------------------------------------
+    # Comparación entre versiones
+    # ------------------------------------------------------------------
+    def _match(
+        self, keys: np.ndarray, other_keys: np.ndarray, other: "CompactGraph"
+    ) -> np.ndarray:
+        """Para cada id de `keys`, su posición en `other_keys` (-1 si no está)."""
+        if other.interner is not self.interner:
+            keys = other.interner.translate(self.interner)[keys]
+        order = np.argsort(other_keys, kind="stable")
+        if len(order) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        sorted_keys = other_keys[order]
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(order) - 1)
+        return np.where((sorted_keys[pos] == keys) & (keys >= 0), order[pos], -1)
+
+    def _diff_table(self, old: "CompactGraph", part: str, materialize) -> dict:
+        table, keys = getattr(self, part), getattr(self, f"{part[:-1]}_keys")
+        old_table, old_keys = getattr(old, part), getattr(old, f"{part[:-1]}_keys")
+        pos = self._match(keys, old_keys, old)
+        present = np.flatnonzero(pos >= 0)
+        same = table.equal_rows(present, old_table, pos[present])
+        seen = np.zeros(old_table.n, dtype=bool)
+        seen[pos[present]] = True
+        strings = old.interner.strings
+        return {
+            "added": materialize(np.flatnonzero(pos < 0)),
+            "modified": materialize(present[~same]),
+            "removed": [strings[c] for c in old_keys[~seen].tolist()],
+        }
+
+    def diff(self, old: "CompactGraph", nodes_from: Optional["CompactGraph"] = None) -> dict:
+        """
+        Agregados / modificados (dicts) y eliminados (ids) respecto de `old`.
+        `nodes_from` arma los nodos desde otra variante del grafo (mismos
+        nodos, otras x/y, ej. layout geográfico).
+        """
+        nodes_src = nodes_from if nodes_from is not None else self
+        return {
+            "nodes": self._diff_table(old, "nodes", nodes_src.node_dicts),
+            "edges": self._diff_table(old, "edges", self.edge_dicts),
+        }
+
+    def same_content(self, other: "CompactGraph") -> bool:
+        if self.node_count != other.node_count or self.edge_count != other.edge_count:
+            return False
+        for part in ("nodes", "edges"):
+            d = self._diff_table(other, part, lambda idx: idx.tolist())
+            if d["added"] or d["modified"] or d["removed"]:
+                return False
+        return True
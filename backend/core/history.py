@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+from .graph_model import CompactGraph, Interner
+
+
+class GraphSnapshot:
+    """
+    Nodos y aristas de un grafo en una versión dada, guardados como
+    CompactGraph (core.graph_model). Los dicts se arman al responder:
+    node_dicts() / edge_dicts(). Ids repetidos: queda el último, en la
+    posición del primero (como un dict por id).
+    """
+
+    __slots__ = ("version", "graph", "generated_at", "built_at", "from_snapshot")
+
+    def __init__(
+        self,
+        version: int,
+        nodes: List[dict],
+        edges: List[dict],
+        generated_at: str,
+        from_snapshot: bool = False,
+        interner: Optional[Interner] = None,
+    ):
+        self.version = version
+        self.graph = CompactGraph.from_dicts(
+            list({n["id"]: n for n in nodes}.values()),
+            list({e["id"]: e for e in edges}.values()),
+            interner,
+        )
+        self.generated_at = generated_at
+        self.built_at = time.monotonic()
+        self.from_snapshot = from_snapshot
+
+    def node_dicts(self) -> List[dict]:
+        return self.graph.node_dicts()
+
+    def edge_dicts(self) -> List[dict]:
+        return self.graph.edge_dicts()
+
+    def same_content(self, other: "GraphSnapshot") -> bool:
+        return self.graph.same_content(other.graph)
+
+
+class SnapshotHistory:
+    """
+    Historial acotado de snapshots de un grafo. Permite responder
+    "qué cambió desde la versión X" comparando contra el snapshot actual;
+    si X ya salió del historial, el llamador debe mandar el payload completo.
+    """
+
+    def __init__(self, maxlen: int = 16):
+        self._lock = threading.Lock()
+        self._snaps: Deque[GraphSnapshot] = deque(maxlen=maxlen)
+        self._interner = Interner()
+
+    def interner(self) -> Interner:
+        """
+        Interner compartido por los snapshots nuevos: los strings que se
+        repiten entre versiones se guardan una vez y el diff compara códigos.
+        Si acumula demasiados strings de versiones viejas se empieza otro
+        (el diff contra snapshots del anterior traduce los códigos).
+        """
+        with self._lock:
+            latest = self._snaps[-1] if self._snaps else None
+            if latest is not None and latest.graph.interner is self._interner:
+                if len(self._interner) > 2 * latest.graph.strings_used() + 1024:
+                    self._interner = Interner()
+            return self._interner
+
+    def latest(self) -> Optional[GraphSnapshot]:
+        with self._lock:
+            return self._snaps[-1] if self._snaps else None
+
+    def get(self, version: int) -> Optional[GraphSnapshot]:
+        with self._lock:
+            for s in self._snaps:
+                if s.version == version:
+                    return s
+        return None
+
+    def push(self, snap: GraphSnapshot):
+        with self._lock:
+            if self._snaps and self._snaps[-1].version == snap.version:
+                self._snaps[-1] = snap
+            elif not self._snaps or self._snaps[-1].version < snap.version:
+                self._snaps.append(snap)
+
+    def diff(
+        self, since: int, current: GraphSnapshot, nodes_from: Optional[CompactGraph] = None
+    ) -> Optional[dict]:
+        """
+        None si `since` ya no está en el historial. `since` es una versión de
+        este proceso: el endpoint descarta antes los cursores de otro epoch. `nodes_from` arma los
+        nodos agregados/modificados desde otra variante del grafo actual
+        (ej. con layout geográfico).
+        """
+        if since == current.version:
+            old = current
+        else:
+            old = self.get(since)
+            if old is None:
+                return None
+        return current.graph.diff(old.graph, nodes_from)
@@ -0,0 +1,262 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .arrays import encode, str_array, to_list
+from .routing import PoleGraph, bridges, pole_graph
+from .tables import Columns, load_columns, load_table
+from .topo_cache import TopologyCache
+from .utilization import Utilization, utilization
+
+
+class ImpactIndex:
+    """
+    Índices invertidos para análisis de cortes:
+
+        poste -> spans, span -> rutas, ruta -> par de nodos,
+        cable -> hilos usados, mufa -> poste / hilos empalmados
+
+    Un span cortado afecta a todas las rutas que lo usan y a los hilos
+    usados de su cable que lo recorren (core.fiber_paths). Un poste caído
+    corta todos sus spans. Una mufa dañada afecta a los hilos empalmados en
+    ella y a las rutas que pasan por su poste sobre esos cables.
+
+    Además precalcula, para todos los spans a la vez, el impacto de su corte
+    individual y si es un puente del grafo físico (sin camino alternativo).
+    """
+
+    def __init__(
+        self,
+        spans: List[dict],
+        routes: List[dict],
+        mufas: List[dict],
+        splices: Columns,
+        util: Utilization,
+        graph: PoleGraph,
+    ):
+        self.span_cable: Dict[str, str] = {}
+        self.span_poles: Dict[str, Tuple[str, str]] = {}
+        self.pole_spans: Dict[str, List[str]] = defaultdict(list)
+        for s in spans:
+            sid = str(s["id"])
+            fp, tp = str(s["from_pole_id"]), str(s["to_pole_id"])
+            self.span_cable[sid] = str(s["cable_id"])
+            self.span_poles[sid] = (fp, tp)
+            self.pole_spans[fp].append(sid)
+            if tp != fp:
+                self.pole_spans[tp].append(sid)
+
+        self.route_pair: Dict[str, Tuple[Optional[str], Optional[str]]] = {
+            str(r["route_id"]): (r.get("from_nodo_id"), r.get("to_nodo_id")) for r in routes
+        }
+
+        span_ids = util.span_ids.tolist()
+        route_ids = util.route_ids.tolist()
+        self.span_routes: Dict[str, List[str]] = defaultdict(list)
+        for r, sx in zip(util.seg_route.tolist(), util.seg_span.tolist()):
+            self.span_routes[span_ids[sx]].append(route_ids[r])
+
+        # hilos usados por cable con el rango de slots que recorren
+        # (FilamentPaths): un corte sólo afecta a los que pasan por el span
+        paths = util.paths
+        self.span_slot: Dict[str, int] = {sid: k for k, sid in enumerate(paths.span_ids.tolist())}
+        self.cable_used: Dict[str, List[str]] = defaultdict(list)
+        self.filament_cable: Dict[str, str] = {}
+        cable_ids = util.cable_ids.tolist()
+        used = np.flatnonzero(util.fil_used)
+        pf, pf_ok = encode(paths.fil_ids, util.fil_ids[used])
+        used_lo = np.where(pf_ok, paths.slot_lo[pf], 0).tolist()
+        used_hi = np.where(pf_ok, paths.slot_hi[pf], 0).tolist()
+        ranges: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        for fid, c, lo, hi in zip(
+            util.fil_ids[used].tolist(), util.fil_cable[used].tolist(), used_lo, used_hi
+        ):
+            self.cable_used[cable_ids[c]].append(fid)
+            self.filament_cable[fid] = cable_ids[c]
+            ranges[cable_ids[c]][0].append(lo)
+            ranges[cable_ids[c]][1].append(hi)
+        self.cable_used_range: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            c: (np.array(lo, dtype=np.int64), np.array(hi, dtype=np.int64))
+            for c, (lo, hi) in ranges.items()
+        }
+
+        self.mufa_pole: Dict[str, str] = {str(m["id"]): str(m["pole_id"]) for m in mufas}
+        self.mufa_filaments: Dict[str, Set[str]] = defaultdict(set)
+        sp_mufa = str_array(splices, "mufa_id").tolist()
+        for k in ("a_fiber_filament_id", "b_fiber_filament_id"):
+            for m, fid in zip(sp_mufa, str_array(splices, k).tolist()):
+                if fid:
+                    self.mufa_filaments[m].add(fid)
+
+        self._build_spof(util, graph)
+
+    # ------------------------------------------------------------------
+    # Corte individual de cada span, en una sola pasada
+    # ------------------------------------------------------------------
+    def _build_spof(self, util: Utilization, graph: PoleGraph):
+        ns = len(util.span_ids)
+        self.spof_span_ids = util.span_ids
+        self.spof_routes = np.bincount(util.seg_span, minlength=ns)
+        self.spof_used = util.span_used
+
+        pair_keys = np.array(
+            [
+                f"{self.route_pair.get(r, (None, None))[0]}|{self.route_pair.get(r, (None, None))[1]}"
+                for r in util.route_ids.tolist()
+            ],
+            dtype=str,
+        )
+        pairs, route_pair_ix = np.unique(pair_keys, return_inverse=True)
+        if len(util.seg_span):
+            combo = np.unique(util.seg_span * max(len(pairs), 1) + route_pair_ix[util.seg_route])
+            self.spof_pairs = np.bincount(combo // max(len(pairs), 1), minlength=ns)
+        else:
+            self.spof_pairs = np.zeros(ns, dtype=np.int64)
+
+        # El PoleGraph colapsa spans paralelos (varios cables entre los
+        # mismos postes) en una arista: un par puente con más de un span no
+        # es punto único de falla, cada span respalda al otro.
+        bridge_set = bridges(graph)
+        ix = graph.index
+        pair_spans: Dict[Tuple[int, int], int] = defaultdict(int)
+        span_pair: Dict[str, Tuple[int, int]] = {}
+        for sid, (fp, tp) in self.span_poles.items():
+            u, v = ix.get(fp), ix.get(tp)
+            if u is None or v is None or u == v:
+                continue
+            key = (u, v) if u < v else (v, u)
+            pair_spans[key] += 1
+            span_pair[sid] = key
+        flags = np.zeros(ns, dtype=bool)
+        for i, sid in enumerate(util.span_ids.tolist()):
+            key = span_pair.get(sid)
+            if key is not None:
+                flags[i] = key in bridge_set and pair_spans[key] == 1
+        self.spof_bridge = flags
+
+    def spof_report(self, limit: int = 100, only_bridges: bool = False) -> dict:
+        sel = np.flatnonzero(self.spof_bridge) if only_bridges else np.arange(len(self.spof_span_ids))
+        # mayor impacto primero: pares de nodos, hilos usados, rutas
+        order = np.lexsort(
+            (-self.spof_routes[sel], -self.spof_used[sel], -self.spof_pairs[sel], ~self.spof_bridge[sel])
+        )
+        top = sel[order[:limit]]
+        items = [
+            {
+                "cable_span_id": sid,
+                "cable_id": self.span_cable.get(sid),
+                "route_count": rc,
+                "nodo_pair_count": pc,
+                "used_filaments": uf,
+                "is_bridge": br,
+            }
+            for sid, rc, pc, uf, br in zip(
+                self.spof_span_ids[top].tolist(),
+                to_list(self.spof_routes[top]),
+                to_list(self.spof_pairs[top]),
+                to_list(self.spof_used[top]),
+                to_list(self.spof_bridge[top]),
+            )
+        ]
+        return {
+            "span_count": int(len(self.spof_span_ids)),
+            "bridge_span_count": int(self.spof_bridge.sum()),
+            "spans_with_routes": int((self.spof_routes > 0).sum()),
+            "items": items,
+        }
+
+    def _filaments_through(self, sid: str) -> List[str]:
+        """Hilos usados del cable del span cuyo tramo recorre el span."""
+        cable = self.span_cable[sid]
+        fids, slot = self.cable_used.get(cable), self.span_slot.get(sid)
+        if not fids or slot is None:
+            return []
+        lo, hi = self.cable_used_range[cable]
+        return [fids[i] for i in np.flatnonzero((lo <= slot) & (hi > slot)).tolist()]
+
+    # ------------------------------------------------------------------
+    # Impacto de un conjunto de elementos caídos
+    # ------------------------------------------------------------------
+    def impact(
+        self,
+        span_ids: Iterable[str] = (),
+        pole_ids: Iterable[str] = (),
+        mufa_ids: Iterable[str] = (),
+        max_filaments: int = 5000,
+    ) -> dict:
+        unknown: Dict[str, List[str]] = {"spans": [], "poles": [], "mufas": []}
+        cut: Dict[str, Set[str]] = defaultdict(set)  # span_id -> causas
+
+        for sid in span_ids:
+            if sid in self.span_cable:
+                cut[sid].add(f"span:{sid}")
+            else:
+                unknown["spans"].append(sid)
+        for pid in pole_ids:
+            if pid not in self.pole_spans:
+                unknown["poles"].append(pid)
+                continue
+            for sid in self.pole_spans[pid]:
+                cut[sid].add(f"pole:{pid}")
+
+        routes: Dict[str, Set[str]] = defaultdict(set)
+        filaments: Set[str] = set()
+        for sid, causes in cut.items():
+            for rid in self.span_routes.get(sid, ()):
+                routes[rid] |= causes
+            filaments.update(self._filaments_through(sid))
+
+        for mid in mufa_ids:
+            pole = self.mufa_pole.get(mid)
+            if pole is None:
+                unknown["mufas"].append(mid)
+                continue
+            spliced = self.mufa_filaments.get(mid, set())
+            filaments |= spliced
+            cables = {self.filament_cable[f] for f in spliced if f in self.filament_cable}
+            for sid in self.pole_spans.get(pole, ()):
+                if self.span_cable[sid] in cables:
+                    for rid in self.span_routes.get(sid, ()):
+                        routes[rid].add(f"mufa:{mid}")
+
+        route_items = []
+        pairs: Dict[Tuple, List[str]] = defaultdict(list)
+        for rid in sorted(routes):
+            a, b = self.route_pair.get(rid, (None, None))
+            pairs[(a, b)].append(rid)
+            route_items.append(
+                {
+                    "route_id": rid,
+                    "from_nodo_id": a,
+                    "to_nodo_id": b,
+                    "causes": sorted(routes[rid]),
+                }
+            )
+        fil_sorted = sorted(filaments)
+        return {
+            "cut_span_ids": sorted(cut),
+            "routes": route_items,
+            "nodo_pairs": [
+                {"from_nodo_id": a, "to_nodo_id": b, "route_ids": rids}
+                for (a, b), rids in pairs.items()
+            ],
+            "filament_count": len(fil_sorted),
+            "filaments": fil_sorted[:max_filaments],
+            "filaments_truncated": len(fil_sorted) > max_filaments,
+            "unknown": unknown,
+        }
+
+
+def _build_impact_index() -> ImpactIndex:
+    return ImpactIndex(
+        load_table("cable_span"),
+        load_table("route_nodos"),
+        load_table("mufa"),
+        load_columns("splice"),
+        utilization.get(),
+        pole_graph.get(),
+    )
+
+
+impact_index: TopologyCache[ImpactIndex] = TopologyCache("impact_index", _build_impact_index)
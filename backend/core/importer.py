@@ -0,0 +1,511 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from .changefeed import feed
+from .config import settings
+from .db import begin_write, connect
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "geojson")
+ON_ERROR = ("abort", "skip")
+
+# Un Feature que no cierra en este tamaño se considera JSON inválido
+# (evita leer el archivo entero al buffer buscando el cierre).
+_FEATURE_MAX_CHARS = 16 * 1024 * 1024
+_FEATURES_RE = re.compile(r'"features"\s*:\s*\[')
+_READ_CHARS = 64 * 1024
+
+
+class ImportFormatError(ValueError):
+    """El archivo no se puede leer como el formato indicado (falla el job entero)."""
+
+
+class _Rollback(Exception):
+    pass
+
+
+class EntitySpec:
+    """Tabla destino de un tipo de relevamiento y cómo validar sus filas."""
+
+    def __init__(
+        self,
+        table: str,
+        columns: Tuple[str, ...],
+        required: Tuple[str, ...] = (),
+        ints: Tuple[str, ...] = (),
+        floats: Tuple[str, ...] = (),
+        refs: Optional[Dict[str, str]] = None,
+        distinct: Optional[Tuple[str, str]] = None,
+        point: bool = False,
+    ):
+        self.table = table
+        self.columns = columns
+        self.required = ("id",) + required
+        self.ints = ints
+        self.floats = floats
+        self.refs = refs or {}  # columna -> tabla donde debe existir el id
+        self.distinct = distinct  # par de columnas que no pueden ser iguales
+        self.point = point  # geometría Point de GeoJSON -> gps_lon/gps_lat
+
+    def insert_sql(self) -> str:
+        cols = ", ".join(self.columns)
+        values = ", ".join(f":{c}" for c in self.columns)
+        return f"INSERT INTO dbo.{self.table} ({cols}) VALUES ({values})"
+
+
+# Orden de carga de un relevamiento: pole -> cable_span / mufa -> splice
+ENTITIES: Dict[str, EntitySpec] = {
+    "pole": EntitySpec(
+        "pole",
+        ("id", "code", "gps_lat", "gps_lon", "pole_type", "status"),
+        floats=("gps_lat", "gps_lon"),
+        point=True,
+    ),
+    "cable_span": EntitySpec(
+        "cable_span",
+        ("id", "cable_id", "seq", "from_pole_id", "to_pole_id", "length_m", "length_span"),
+        required=("cable_id", "from_pole_id", "to_pole_id"),
+        ints=("seq",),
+        floats=("length_m", "length_span"),
+        refs={"cable_id": "cable", "from_pole_id": "pole", "to_pole_id": "pole"},
+        distinct=("from_pole_id", "to_pole_id"),
+    ),
+    "mufa": EntitySpec(
+        "mufa",
+        ("id", "code", "pole_id", "mufa_type", "gps_lat", "gps_lon"),
+        floats=("gps_lat", "gps_lon"),
+        refs={"pole_id": "pole"},
+        point=True,
+    ),
+    "splice": EntitySpec(
+        "splice",
+        ("id", "mufa_id", "a_fiber_filament_id", "b_fiber_filament_id"),
+        required=("mufa_id", "a_fiber_filament_id", "b_fiber_filament_id"),
+        refs={
+            "mufa_id": "mufa",
+            "a_fiber_filament_id": "fiber_filament",
+            "b_fiber_filament_id": "fiber_filament",
+        },
+        distinct=("a_fiber_filament_id", "b_fiber_filament_id"),
+    ),
+}
+
+
+# ----------------------------------------------------------------------
+# Lectura en streaming
+# ----------------------------------------------------------------------
+def read_csv(stream) -> Tuple[List[str], Iterator[dict]]:
+    """
+    Encabezado y filas de un CSV (separador "," o ";", el de Excel en
+    español). Las columnas se comparan en minúsculas y sin espacios.
+    """
+    header = stream.readline()
+    if not header.strip():
+        raise ImportFormatError("EMPTY_FILE")
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    fields = [h.strip().lower() for h in next(csv.reader([header], delimiter=delimiter))]
+    return fields, csv.DictReader(stream, fieldnames=fields, delimiter=delimiter)
+
+
+def iter_geojson(stream, chunk_chars: int = _READ_CHARS) -> Iterator[dict]:
+    """
+    Features de un FeatureCollection, uno a la vez: busca el arreglo
+    "features" y decodifica cada objeto con raw_decode sobre un buffer que
+    se recorta a medida que avanza (memoria acotada al Feature más grande).
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_chars)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        m = _FEATURES_RE.search(buf)
+        if m is not None:
+            pos = m.end()
+            break
+        if eof or len(buf) > _FEATURE_MAX_CHARS:
+            raise ImportFormatError("GEOJSON_WITHOUT_FEATURES")
+        more()
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ImportFormatError("GEOJSON_TRUNCATED")
+            more()
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof or len(buf) - pos > _FEATURE_MAX_CHARS:
+                raise ImportFormatError(f"GEOJSON_INVALID: {e.msg}") from e
+            more()
+            continue
+        pos = end
+        if not isinstance(obj, dict):
+            raise ImportFormatError("GEOJSON_INVALID: feature no es un objeto")
+        yield obj
+
+
+def feature_row(feature: dict, spec: EntitySpec) -> dict:
+    """Properties del Feature como fila; `id` y coordenadas Point si faltan."""
+    props = feature.get("properties") or {}
+    row = {str(k).strip().lower(): v for k, v in props.items()}
+    if row.get("id") in (None, "") and feature.get("id") is not None:
+        row["id"] = feature["id"]
+    geom = feature.get("geometry") or {}
+    if spec.point and geom.get("type") == "Point":
+        coords = geom.get("coordinates") or ()
+        if len(coords) >= 2:
+            if row.get("gps_lon") in (None, ""):
+                row["gps_lon"] = coords[0]
+            if row.get("gps_lat") in (None, ""):
+                row["gps_lat"] = coords[1]
+    return row
+
+
+# ----------------------------------------------------------------------
+# Validación
+# ----------------------------------------------------------------------
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _number(value, kind):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, str):
+        value = value.replace(",", ".")  # coma decimal
+    number = float(value)
+    if number != number or number in (float("inf"), float("-inf")):
+        raise ValueError(value)
+    if kind is int:
+        if not number.is_integer():
+            raise ValueError(value)
+        return int(number)
+    return number
+
+
+class IdSets:
+    """
+    Ids existentes por tabla, leídos una vez por job con un cursor del lado
+    del servidor (sólo la columna id). Los ids que el job va aceptando se
+    agregan al set de su tabla para detectar duplicados dentro del archivo.
+    """
+
+    def __init__(self):
+        self._sets: Dict[str, Set[str]] = {}
+
+    def get(self, table: str) -> Set[str]:
+        ids = self._sets.get(table)
+        if ids is None:
+            ids = set()
+            with connect() as conn:
+                result = conn.execution_options(stream_results=True).execute(
+                    text(f"SELECT id FROM dbo.{table}")
+                )
+                for part in result.partitions(settings.IMPORT_ID_FETCH_SIZE):
+                    ids.update(str(r[0]) for r in part)
+            self._sets[table] = ids
+        return ids
+
+    def sizes(self) -> Dict[str, int]:
+        return {t: len(s) for t, s in self._sets.items()}
+
+
+def validate_row(spec: EntitySpec, raw: dict, ids: IdSets) -> Tuple[dict, List[tuple]]:
+    """Fila lista para insertar y errores (columna, código, valor)."""
+    row: Dict[str, object] = {}
+    errors: List[tuple] = []
+    for col in spec.columns:
+        value = _clean(raw.get(col))
+        if value is None:
+            if col in spec.required:
+                errors.append((col, "MISSING_FIELD", None))
+            row[col] = None
+            continue
+        if col in spec.ints or col in spec.floats:
+            try:
+                row[col] = _number(value, int if col in spec.ints else float)
+            except (TypeError, ValueError):
+                errors.append((col, "INVALID_NUMBER", value))
+                row[col] = None
+        else:
+            row[col] = str(value)
+    lat, lon = row.get("gps_lat"), row.get("gps_lon")
+    if lat is not None and not -90.0 <= lat <= 90.0:
+        errors.append(("gps_lat", "OUT_OF_RANGE", lat))
+    if lon is not None and not -180.0 <= lon <= 180.0:
+        errors.append(("gps_lon", "OUT_OF_RANGE", lon))
+    for col, table in spec.refs.items():
+        value = row.get(col)
+        if value is not None and value not in ids.get(table):
+            errors.append((col, "UNKNOWN_REFERENCE", value))
+    if spec.distinct is not None:
+        a, b = spec.distinct
+        if row[a] is not None and row[a] == row[b]:
+            errors.append((b, "SELF_REFERENCE", row[b]))
+    if row["id"] is not None and row["id"] in ids.get(spec.table):
+        errors.append(("id", "DUPLICATE_ID", row["id"]))
+    return row, errors
+
+
+# ----------------------------------------------------------------------
+# Jobs
+# ----------------------------------------------------------------------
+# Un import a la vez: dos archivos con el mismo id nuevo pasarían la
+# validación de ambos jobs y chocarían en la PK.
+_run_lock = threading.Lock()
+
+
+class ImportJob:
+    """
+    Importación de un archivo (una entidad) desde `path`, en un hilo:
+    lee en streaming, valida contra IdSets e inserta en lotes de
+    IMPORT_BATCH_SIZE dentro de una sola transacción.
+
+    - on_error="abort": ante la primera fila inválida deja de insertar,
+      sigue validando hasta IMPORT_MAX_ERRORS y hace rollback.
+    - on_error="skip": las filas inválidas se reportan y se omiten.
+    - dry_run: sólo valida (no abre transacción ni sube la versión).
+
+    La memoria queda acotada a un lote, los errores reportados y los sets
+    de ids de las tablas referenciadas.
+    """
+
+    def __init__(self, entity: str, fmt: str, path: str, dry_run: bool, on_error: str, source: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.entity = entity
+        self.spec = ENTITIES[entity]
+        self.format = fmt
+        self.path = path
+        self.source = source
+        self.dry_run = dry_run
+        self.on_error = on_error
+        self.state = "queued"
+        self.message: Optional[str] = None
+        self.bytes_total = os.path.getsize(path)
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.rows_valid = 0
+        self.rows_rejected = 0
+        self.rows_inserted = 0
+        self.errors: List[dict] = []
+        self.errors_truncated = False
+        self.id_sets: Dict[str, int] = {}
+        self.topology_version: Optional[int] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._t0 = 0.0
+        self._elapsed = 0.0
+        self._cancel = threading.Event()
+        self.done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _rows(self, stream) -> Iterator[dict]:
+        if self.format == "csv":
+            fields, reader = read_csv(stream)
+            missing = [c for c in self.spec.required if c not in fields]
+            if missing:
+                raise ImportFormatError(f"MISSING_COLUMNS: {','.join(missing)}")
+            return iter(reader)
+        return (feature_row(f, self.spec) for f in iter_geojson(stream))
+
+    def _reject(self, raw: dict, errors: List[tuple]):
+        self.rows_rejected += 1
+        for col, code, value in errors:
+            if len(self.errors) >= settings.IMPORT_MAX_ERRORS:
+                self.errors_truncated = True
+                return
+            self.errors.append(
+                {
+                    "row": self.rows_read,
+                    "id": _clean(raw.get("id")),
+                    "field": col,
+                    "code": code,
+                    "value": None if value is None else str(value)[:200],
+                }
+            )
+
+    def _batches(self, raw_file, ids: IdSets) -> Iterator[List[dict]]:
+        """Lotes de filas válidas; las filas se numeran desde 1 (sin encabezado)."""
+        stream = io.TextIOWrapper(raw_file, encoding="utf-8-sig", newline="")
+        own = ids.get(self.spec.table)
+        for ref in self.spec.refs.values():
+            ids.get(ref)
+        self.id_sets = ids.sizes()
+        batch: List[dict] = []
+        for raw in self._rows(stream):
+            if self._cancel.is_set():
+                raise _Rollback("cancelled")
+            self.rows_read += 1
+            row, errors = validate_row(self.spec, raw, ids)
+            if errors:
+                self._reject(raw, errors)
+                if self.on_error == "abort" and self.errors_truncated:
+                    break
+                continue
+            own.add(row["id"])
+            self.rows_valid += 1
+            batch.append(row)
+            if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                self.bytes_read = raw_file.tell()
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        self.bytes_read = self.bytes_total
+
+    def _aborting(self) -> bool:
+        return self.on_error == "abort" and self.rows_rejected > 0
+
+    def _load(self):
+        ids = IdSets()
+        with open(self.path, "rb") as raw_file:
+            if self.dry_run:
+                for _batch in self._batches(raw_file, ids):
+                    pass
+                return
+            with begin_write(self.spec.table) as conn:
+                sql = text(self.spec.insert_sql())
+                for batch in self._batches(raw_file, ids):
+                    if self._aborting():
+                        continue  # se sigue validando para reportar los errores
+                    conn.execute(sql, batch)
+                    self.rows_inserted += len(batch)
+                if self._aborting():
+                    raise _Rollback("rejected")
+        if self.rows_inserted:
+            # Son altas: ninguna ruta existente las referencia todavía, por eso
+            # routes=[] (las vistas materializadas no se recargan).
+            self.topology_version = feed.bump_topology(
+                f"import:{self.entity}", [self.spec.table], []
+            )
+
+    def run(self):
+        try:
+            with _run_lock:
+                self.state = "running"
+                self.started_at = datetime.utcnow()
+                self._t0 = time.perf_counter()
+                try:
+                    self._load()
+                    self.state = "validated" if self.dry_run else "done"
+                except _Rollback as e:
+                    self.rows_inserted = 0
+                    self.state = str(e)
+                except ImportFormatError as e:
+                    self.rows_inserted = 0
+                    self.state, self.message = "failed", str(e)
+                except Exception as e:
+                    logger.exception("Falló la importación %s (%s)", self.id, self.entity)
+                    self.rows_inserted = 0
+                    self.state, self.message = "failed", f"DB_ERROR_IMPORT: {e}"
+                self._elapsed = time.perf_counter() - self._t0
+        finally:
+            self.finished_at = datetime.utcnow()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.done.set()
+        logger.info(
+            "Importación %s (%s%s): %s, %s filas leídas, %s insertadas, %s rechazadas en %.1f s",
+            self.id,
+            self.entity,
+            ", dry-run" if self.dry_run else "",
+            self.state,
+            self.rows_read,
+            self.rows_inserted,
+            self.rows_rejected,
+            self._elapsed,
+        )
+
+    def status(self) -> dict:
+        elapsed = self._elapsed
+        if self.state == "running":
+            elapsed = time.perf_counter() - self._t0
+        return {
+            "job_id": self.id,
+            "entity": self.entity,
+            "table": self.spec.table,
+            "format": self.format,
+            "source": self.source or None,
+            "dry_run": self.dry_run,
+            "on_error": self.on_error,
+            "state": self.state,
+            "message": self.message,
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "progress": round(self.bytes_read / self.bytes_total, 4) if self.bytes_total else 1.0,
+            "rows_read": self.rows_read,
+            "rows_valid": self.rows_valid,
+            "rows_rejected": self.rows_rejected,
+            "rows_inserted": self.rows_inserted,
+            "rows_per_s": round(self.rows_read / elapsed, 1) if elapsed > 0 else None,
+            "elapsed_s": round(elapsed, 3),
+            "id_sets": self.id_sets,
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+            "topology_version": self.topology_version,
+            "created_at": self.created_at.isoformat() + "Z",
+            "started_at": self.started_at.isoformat() + "Z" if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() + "Z" if self.finished_at else None,
+        }
+
+
+class ImportRegistry:
+    """Jobs en curso y los últimos IMPORT_KEEP_JOBS terminados (por proceso)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+
+    def submit(self, job: ImportJob) -> ImportJob:
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j.id for j in self._jobs.values() if j.finished]
+            for jid in finished[: max(0, len(finished) - settings.IMPORT_KEEP_JOBS)]:
+                del self._jobs[jid]
+        threading.Thread(target=job.run, name=f"import-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ImportJob]:
+        return list(reversed(self._jobs.values()))
+
+
+imports = ImportRegistry()
@@ -0,0 +1,388 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .arrays import encode, float_array, has_column, str_array, to_list
+from .config import settings
+from .fiber_paths import FilamentPaths
+from .tables import Columns, load_columns, load_table
+from .topo_cache import TopologyCache
+
+
+class Coefficients:
+    """Coeficientes de pérdida (dB/km por material_type, empalme, conector)."""
+
+    def __init__(
+        self,
+        db_per_km: Dict[str, float],
+        default_db_per_km: float,
+        splice_db: float,
+        connector_db: float,
+        budget_db: float,
+    ):
+        self.db_per_km = {k.upper(): v for k, v in db_per_km.items()}
+        self.default_db_per_km = default_db_per_km
+        self.splice_db = splice_db
+        self.connector_db = connector_db
+        self.budget_db = budget_db
+
+    def per_km(self, materials: List[str]) -> np.ndarray:
+        return np.array(
+            [self.db_per_km.get(m.upper(), self.default_db_per_km) for m in materials],
+            dtype=np.float64,
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "db_per_km": self.db_per_km,
+            "default_db_per_km": self.default_db_per_km,
+            "splice_db": self.splice_db,
+            "connector_db": self.connector_db,
+            "budget_db": self.budget_db,
+        }
+
+
+def parse_db_per_km(value: str) -> Dict[str, float]:
+    """"SM=0.35,MM=3.0" -> {"SM": 0.35, "MM": 3.0} (ValueError si está mal)."""
+    out: Dict[str, float] = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        material, sep, coef = part.partition("=")
+        if not sep or not material.strip():
+            raise ValueError(f"se esperaba material=dB/km: {part.strip()}")
+        out[material.strip().upper()] = float(coef)
+    return out
+
+
+def coefficients(
+    db_per_km: Optional[str] = None,
+    splice_db: Optional[float] = None,
+    connector_db: Optional[float] = None,
+    budget_db: Optional[float] = None,
+) -> Coefficients:
+    """Coeficientes de settings, con los que se indiquen pisando (por material)."""
+    per_km = parse_db_per_km(settings.LOSS_DB_PER_KM)
+    if db_per_km:
+        per_km.update(parse_db_per_km(db_per_km))
+    return Coefficients(
+        per_km,
+        settings.LOSS_DB_PER_KM_DEFAULT,
+        settings.LOSS_SPLICE_DB if splice_db is None else splice_db,
+        settings.LOSS_CONNECTOR_DB if connector_db is None else connector_db,
+        settings.LOSS_BUDGET_DB if budget_db is None else budget_db,
+    )
+
+
+def components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Componentes conexas de un grafo de `n` nodos con aristas (a, b): cada
+    nodo recibe el menor índice de su componente (enganche de raíces +
+    compresión de caminos, todo con arreglos).
+    """
+    label = np.arange(n, dtype=np.int64)
+    if len(a) == 0:
+        return label
+    while True:
+        la, lb = label[a], label[b]
+        if np.array_equal(la, lb):
+            return label
+        m = np.minimum(la, lb)
+        np.minimum.at(label, la, m)
+        np.minimum.at(label, lb, m)
+        while True:
+            jumped = label[label]
+            if np.array_equal(jumped, label):
+                break
+            label = jumped
+
+
+class LossModel:
+    """
+    Presupuesto óptico de todos los hilos a la vez.
+
+    Un trazado es una componente del grafo hilo-empalme (fiber_filament +
+    dbo.splice). Cada hilo aporta el largo de los spans que recorre * dB/km
+    de su material_type; cada empalme suma LOSS_SPLICE_DB y cada puerto ODF
+    conectorizado (odf_port_fiber) LOSS_CONNECTOR_DB. Los largos y
+    materiales quedan precalculados; `budgets()` sólo multiplica y agrega
+    por componente, así que los coeficientes pueden cambiar por request.
+
+    El tramo que recorre cada hilo (entre los postes de sus mufas y el
+    extremo de su ODF) sale de core.fiber_paths.FilamentPaths.
+    """
+
+    def __init__(
+        self,
+        filaments: Columns,
+        splices: Columns,
+        spans: List[dict],
+        ports: Columns,
+        mufas: Iterable[dict] = (),
+        route_ends: Iterable[dict] = (),
+    ):
+        # --- hilos (ordenados para codificar ids)
+        fil_ids = str_array(filaments, "id")
+        order = np.argsort(fil_ids)
+        self.fil_ids = fil_ids[order]
+        fil_cable_raw = str_array(filaments, "cable_id")[order]
+        nf = len(self.fil_ids)
+
+        # --- cables: largo total y material desde sus spans
+        span_cable_raw = str_array(spans, "cable_id")
+        self.cable_ids = np.unique(np.concatenate([span_cable_raw, fil_cable_raw]))
+        nc = len(self.cable_ids)
+        span_cable, _ = encode(self.cable_ids, span_cable_raw)
+        length = float_array(spans, "length_m")
+        self.cable_length_m = np.bincount(
+            span_cable, weights=np.nan_to_num(length, nan=0.0), minlength=nc
+        )
+        self.cable_spans = np.bincount(span_cable, minlength=nc)
+        self.cable_missing = np.bincount(span_cable, weights=np.isnan(length), minlength=nc) > 0
+        material_of: Dict[int, str] = {}
+        for c, s in zip(span_cable.tolist(), spans):
+            if c not in material_of and s.get("material_type") is not None:
+                material_of[c] = str(s["material_type"])
+        self.materials, cable_mat = np.unique(
+            np.array([material_of.get(c, "") for c in range(nc)], dtype=str), return_inverse=True
+        )
+        self.cable_material = cable_mat
+
+        self.fil_cable, _ = encode(self.cable_ids, fil_cable_raw)
+        self.fil_material = self.cable_material[self.fil_cable] if nc else np.zeros(nf, np.int64)
+        # hilo sin spans en su cable o con algún span sin largo
+        self.fil_missing = (self.cable_spans[self.fil_cable] == 0) | self.cable_missing[
+            self.fil_cable
+        ]
+
+        # --- empalmes entre hilos conocidos
+        a, a_ok = encode(self.fil_ids, str_array(splices, "a_fiber_filament_id"))
+        b, b_ok = encode(self.fil_ids, str_array(splices, "b_fiber_filament_id"))
+        ok = a_ok & b_ok
+        self.sp_a, self.sp_b = a[ok], b[ok]
+        self.sp_ids = str_array(splices, "id")[ok]
+        self.sp_mufa = str_array(splices, "mufa_id")[ok]
+
+        # --- puertos ODF
+        pf, p_ok = encode(self.fil_ids, str_array(ports, "fiber_filament_id"))
+        self.port_fil = pf[p_ok]
+        self.port_ids = str_array(ports, "odf_port_id")[p_ok]
+        self.port_odf = str_array(ports, "odf_id")[p_ok]
+        # nodo del ODF (snapshots viejos pueden no traer la columna)
+        if has_column(ports, "nodo_id"):
+            self.port_nodo = str_array(ports, "nodo_id")[p_ok]
+        else:
+            self.port_nodo = np.full(len(self.port_ids), "", dtype=str)
+
+        self.paths = FilamentPaths(
+            self.fil_ids,
+            self.fil_cable,
+            spans,
+            span_cable,
+            nc,
+            (np.concatenate([self.sp_a, self.sp_b]), np.concatenate([self.sp_mufa, self.sp_mufa])),
+            (self.port_fil, self.port_nodo),
+            mufas,
+            route_ends,
+        )
+        self.fil_length_km = self.paths.meters / 1000.0
+
+        # --- trazados
+        label = components(nf, self.sp_a, self.sp_b)
+        self.comp_root, self.comp = np.unique(label, return_inverse=True)
+        ncomp = len(self.comp_root)
+        self.comp_filaments = np.bincount(self.comp, minlength=ncomp)
+        self.comp_length_km = np.bincount(self.comp, weights=self.fil_length_km, minlength=ncomp)
+        self.comp_splices = np.bincount(self.comp[self.sp_a], minlength=ncomp)
+        self.comp_connectors = np.bincount(self.comp[self.port_fil], minlength=ncomp)
+        self.comp_missing = np.bincount(self.comp, weights=self.fil_missing, minlength=ncomp) > 0
+
+    def __len__(self) -> int:
+        return len(self.fil_ids)
+
+    def index(self, fiber_ids: Iterable[str]) -> np.ndarray:
+        """Posiciones de los hilos conocidos (los demás se descartan)."""
+        values = np.array([str(f) for f in fiber_ids], dtype=str)
+        idx, ok = encode(self.fil_ids, values)
+        return idx[ok]
+
+    def cable_filaments(self, cable_id: str) -> np.ndarray:
+        hit = np.flatnonzero(self.cable_ids == cable_id)
+        if not len(hit):
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.fil_cable == hit[0])
+
+    def odf_ports(self, odf_id: str) -> np.ndarray:
+        """Posiciones (en los arreglos port_*) de los puertos del ODF."""
+        return np.flatnonzero(self.port_odf == odf_id)
+
+    # ------------------------------------------------------------------
+    # Cálculo
+    # ------------------------------------------------------------------
+    def attenuation(self, coef: Coefficients) -> np.ndarray:
+        """dB por hilo (largo recorrido, fil_length_km, * dB/km de su material)."""
+        per_km = coef.per_km(self.materials.tolist())
+        if not len(per_km):
+            return np.zeros(len(self.fil_ids))
+        return self.fil_length_km * per_km[self.fil_material]
+
+    def budgets(self, coef: Coefficients) -> Dict[str, np.ndarray]:
+        """Totales por trazado (componente) como arreglos."""
+        att = np.bincount(self.comp, weights=self.attenuation(coef), minlength=len(self.comp_root))
+        splice_db = self.comp_splices * coef.splice_db
+        connector_db = self.comp_connectors * coef.connector_db
+        total = att + splice_db + connector_db
+        return {
+            "attenuation_db": att,
+            "splice_db": splice_db,
+            "connector_db": connector_db,
+            "total_db": total,
+            "margin_db": coef.budget_db - total,
+        }
+
+    def items(self, sel: np.ndarray, coef: Coefficients) -> List[dict]:
+        """Presupuesto del trazado de cada hilo en `sel` (una fila por hilo)."""
+        b = self.budgets(coef)
+        comp = self.comp[sel]
+
+        def col(name: str) -> list:
+            return to_list(np.round(b[name][comp], 3))
+
+        roots = self.fil_ids[self.comp_root[comp]].tolist()
+        margin = col("margin_db")
+        connectors = self.comp_connectors[comp].tolist()
+        return [
+            {
+                "fiber_filament_id": fid,
+                "trace_id": root,
+                "filament_count": nfil,
+                "length_km": round(km, 4),
+                "splice_count": nsp,
+                "connector_count": ncon,
+                "attenuation_db": att,
+                "splice_db": sdb,
+                "connector_db": cdb,
+                "total_db": tot,
+                "margin_db": m,
+                "closes": m >= 0,
+                "terminated": ncon >= 2,
+                "missing_length": miss,
+            }
+            for fid, root, nfil, km, nsp, ncon, att, sdb, cdb, tot, m, miss in zip(
+                self.fil_ids[sel].tolist(),
+                roots,
+                self.comp_filaments[comp].tolist(),
+                self.comp_length_km[comp].tolist(),
+                self.comp_splices[comp].tolist(),
+                connectors,
+                col("attenuation_db"),
+                col("splice_db"),
+                col("connector_db"),
+                col("total_db"),
+                margin,
+                self.comp_missing[comp].tolist(),
+            )
+        ]
+
+    def summary(self, items: List[dict]) -> dict:
+        worst = min(items, key=lambda it: it["margin_db"], default=None)
+        return {
+            "filaments": len(items),
+            "closes": sum(1 for it in items if it["closes"] and it["terminated"]),
+            "fails": sum(1 for it in items if not it["closes"]),
+            "unterminated": sum(1 for it in items if not it["terminated"]),
+            "missing_length": sum(1 for it in items if it["missing_length"]),
+            "worst_margin_db": worst["margin_db"] if worst else None,
+            "worst_fiber_filament_id": worst["fiber_filament_id"] if worst else None,
+        }
+
+    def trace(self, fil: int, coef: Coefficients) -> dict:
+        """Detalle de un trazado: hilos en orden, empalmes y conectores."""
+        c = self.comp[fil]
+        members = np.flatnonzero(self.comp == c)
+        sp = np.flatnonzero(self.comp[self.sp_a] == c)
+        ports = np.flatnonzero(self.comp[self.port_fil] == c)
+
+        adj: Dict[int, List[int]] = defaultdict(list)
+        for k, (x, y) in zip(sp.tolist(), zip(self.sp_a[sp].tolist(), self.sp_b[sp].tolist())):
+            adj[x].append(k)
+            adj[y].append(k)
+        # se arranca por un extremo (un solo empalme), preferentemente conectorizado
+        with_port = set(self.port_fil[ports].tolist())
+        ends = [i for i in members.tolist() if len(adj.get(i, ())) <= 1]
+        start = next((i for i in ends if i in with_port), ends[0] if ends else int(members[0]))
+
+        order: List[int] = []
+        splice_order: List[int] = []
+        seen = {start}
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            order.append(i)
+            for k in adj.get(i, ()):
+                j = int(self.sp_b[k]) if self.sp_a[k] == i else int(self.sp_a[k])
+                if j not in seen:
+                    seen.add(j)
+                    splice_order.append(k)
+                    stack.append(j)
+
+        # empalmes que cierran ciclos o repiten un par también suman pérdida
+        in_tree = set(splice_order)
+        splice_order += [k for k in sp.tolist() if k not in in_tree]
+
+        att = self.attenuation(coef)
+        cable_ids = self.cable_ids.tolist()
+        materials = self.materials.tolist()
+        # hilos conocidos => su cable está en cable_ids (y tiene material, quizás "")
+        ports_by_fil: Dict[int, List[int]] = defaultdict(list)
+        for p in ports.tolist():
+            ports_by_fil[int(self.port_fil[p])].append(p)
+        filaments = [
+            {
+                "fiber_filament_id": self.fil_ids[i].item(),
+                "cable_id": cable_ids[self.fil_cable[i]],
+                "material_type": materials[self.fil_material[i]] or None,
+                "length_m": round(float(self.fil_length_km[i]) * 1000.0, 3),
+                "attenuation_db": round(float(att[i]), 3),
+                "odf_port_ids": [self.port_ids[p].item() for p in ports_by_fil.get(i, ())],
+                "missing_length": bool(self.fil_missing[i]),
+            }
+            for i in order
+        ]
+        item = self.items(np.array([fil]), coef)[0]
+        return {
+            **item,
+            "filaments": filaments,
+            "splices": [
+                {
+                    "splice_id": self.sp_ids[k].item(),
+                    "mufa_id": self.sp_mufa[k].item(),
+                    "loss_db": coef.splice_db,
+                }
+                for k in splice_order
+            ],
+            "connectors": [
+                {
+                    "odf_port_id": self.port_ids[p].item(),
+                    "odf_id": self.port_odf[p].item(),
+                    "loss_db": coef.connector_db,
+                }
+                for p in ports.tolist()
+            ],
+            "coefficients": coef.as_dict(),
+        }
+
+
+def _build_loss_model() -> LossModel:
+    return LossModel(
+        load_columns("fiber_filament"),
+        load_columns("splice"),
+        load_table("cable_span"),
+        load_columns("odf_port_fiber"),
+        load_table("mufa"),
+        load_table("route_ends"),
+    )
+
+
+loss_model: TopologyCache[LossModel] = TopologyCache("loss_budget", _build_loss_model)
@@ -0,0 +1,335 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import text
+
+from .analytics import fetch_analytic
+from .changefeed import feed
+from .config import settings
+from .db import connect, fetch_all
+from .snapshot import store
+from .tables import TABLES, load_table
+
+logger = logging.getLogger(__name__)
+
+# SQL Server admite ~2100 parámetros por consulta
+_IN_CHUNK = 1000
+
+ROUTE_SEGMENTS_SQL = """
+    SELECT odf_route_id, seg_seq, cable_span_id, cable_id, cable_seq,
+           from_pole_id, from_pole_code, to_pole_id, to_pole_code,
+           length_m, length_span, capacity_fibers
+    FROM dbo.vw_route_segments_expanded
+"""
+
+ROUTE_SUMMARY_SQL = """
+    SELECT odf_route_id, span_list
+    FROM dbo.vw_route_physical_summary
+"""
+
+
+def _fetch_primary(sql: str, params: dict) -> List[dict]:
+    # Las recargas parciales siguen a un cambio recién confirmado: se leen
+    # del primario para no materializar el estado atrasado de una réplica.
+    with connect() as conn:
+        return [dict(r) for r in conn.execute(text(sql), params).mappings()]
+
+
+class MaterializedView:
+    """
+    Copia en memoria de una vista de BD, agrupada por ruta (`key`).
+
+    Se sincroniza al leerla contra el log de cambios de topología
+    (feed.topology_changes_since):
+    - cambios en tablas que no están en `inputs` no la afectan;
+    - cambios acotados a rutas (bump_topology(..., routes=...)) recargan
+      sólo esas rutas con `WHERE key IN (...)`;
+    - cualquier otro cambio (sin tablas o sin rutas), más de
+      MATERIALIZED_MAX_PARTIAL_ROUTES rutas o MATERIALIZED_FULL_REFRESH_S
+      vencido recargan la vista completa.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        sql: str,
+        key: str,
+        inputs: Iterable[str],
+        order_by: Optional[str] = None,
+        loader: Optional[Callable[[], List[dict]]] = None,
+    ):
+        self.name = name
+        self.sql = sql
+        self.key = key
+        self.inputs: Set[str] = set(inputs)
+        self.order_by = order_by
+        self._loader = loader or (lambda: fetch_all(sql))
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[dict]] = {}
+        self._loaded = False
+        self._from_snapshot = False
+        self._synced = -1  # topology_version ya reflejada
+        self._generation = 0  # sube con cada recarga (invalida índices)
+        self._indexes: Dict[Tuple[str, ...], Tuple[int, Dict[str, List[str]]]] = {}
+        self._flat: Optional[Tuple[int, List[dict]]] = None
+        self._full_at = 0.0
+        self._refreshed_at: Optional[datetime] = None
+        self._last: dict = {}
+        self.full_refreshes = 0
+        self.partial_refreshes = 0
+        self.routes_refreshed = 0
+
+    # ------------------------------------------------------------------
+    # Sincronización
+    # ------------------------------------------------------------------
+    def _pending(self) -> Optional[Set[str]]:
+        """Rutas a recargar; None = recarga completa."""
+        if not self._loaded or (self._from_snapshot and not store.active()):
+            return None
+        if (
+            settings.MATERIALIZED_FULL_REFRESH_S > 0
+            and time.monotonic() - self._full_at >= settings.MATERIALIZED_FULL_REFRESH_S
+        ):
+            return None
+        changes = feed.topology_changes_since(self._synced)
+        if changes is None:
+            return None
+        routes: Set[str] = set()
+        for _tv, tables, scoped in changes:
+            if tables is not None and not self.inputs.intersection(tables):
+                continue
+            if scoped is None:
+                return None
+            routes.update(scoped)
+        if len(routes) > settings.MATERIALIZED_MAX_PARTIAL_ROUTES:
+            return None
+        return routes
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded
+            and self._synced == feed.topology_version
+            and (not self._from_snapshot or store.active())
+            and (
+                settings.MATERIALIZED_FULL_REFRESH_S <= 0
+                or time.monotonic() - self._full_at < settings.MATERIALIZED_FULL_REFRESH_S
+            )
+        )
+
+    def sync(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            version = feed.topology_version
+            pending = self._pending()
+            if pending is None:
+                self._refresh_full()
+            elif pending:
+                self._refresh_routes(pending)
+            self._synced = version
+
+    def _group(self, rows: List[dict]) -> Dict[str, List[dict]]:
+        grouped: Dict[str, List[dict]] = defaultdict(list)
+        for r in rows:
+            grouped[str(r[self.key])].append(r)
+        if self.order_by:
+            for items in grouped.values():
+                items.sort(key=lambda r: r[self.order_by])
+        return dict(grouped)
+
+    def _refresh_full(self):
+        t0 = time.perf_counter()
+        rows = self._loader()
+        self._rows = self._group(rows)
+        self._loaded = True
+        self._from_snapshot = store.active()
+        self._full_at = time.monotonic()
+        self._generation += 1
+        self.full_refreshes += 1
+        self._done("full", len(self._rows), len(rows), t0)
+
+    def _refresh_routes(self, routes: Set[str]):
+        t0 = time.perf_counter()
+        ids = sorted(routes)
+        rows: List[dict] = []
+        for start in range(0, len(ids), _IN_CHUNK):
+            part = ids[start : start + _IN_CHUNK]
+            placeholders = ",".join(f":k{i}" for i in range(len(part)))
+            rows.extend(
+                _fetch_primary(
+                    f"SELECT * FROM ({self.sql}) v WHERE v.{self.key} IN ({placeholders})",
+                    {f"k{i}": rid for i, rid in enumerate(part)},
+                )
+            )
+        grouped = self._group(rows)
+        merged = dict(self._rows)
+        for rid in ids:
+            # una ruta sin filas fue borrada (o quedó sin segmentos)
+            if rid in grouped:
+                merged[rid] = grouped[rid]
+            else:
+                merged.pop(rid, None)
+        self._rows = merged
+        self._generation += 1
+        self.partial_refreshes += 1
+        self.routes_refreshed += len(ids)
+        self._done("partial", len(ids), len(rows), t0)
+
+    def _done(self, kind: str, routes: int, rows: int, t0: float):
+        ms = (time.perf_counter() - t0) * 1000.0
+        self._refreshed_at = datetime.utcnow()
+        self._last = {"kind": kind, "routes": routes, "rows": rows, "ms": round(ms, 3)}
+        logger.info("Materializada %s: recarga %s de %s rutas en %.1f ms", self.name, kind, routes, ms)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def rows_for(self, keys: Sequence[str]) -> List[dict]:
+        """Filas de las rutas `keys`, ordenadas por ruta (y por `order_by`)."""
+        self.sync()
+        rows = self._rows
+        out: List[dict] = []
+        for k in sorted({str(k) for k in keys}):
+            out.extend(rows.get(k, ()))
+        return out
+
+    def all_rows(self) -> List[dict]:
+        self.sync()
+        flat = self._flat
+        if flat is None or flat[0] != self._generation:
+            rows = self._rows
+            flat = (self._generation, [r for k in sorted(rows) for r in rows[k]])
+            self._flat = flat
+        return flat[1]
+
+    def keys_by(self, *columns: str) -> Dict[str, List[str]]:
+        """Índice valor -> rutas para las columnas dadas (se rearma tras cada recarga)."""
+        self.sync()
+        cached = self._indexes.get(columns)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        index: Dict[str, Set[str]] = defaultdict(set)
+        for k, items in self._rows.items():
+            for r in items:
+                for c in columns:
+                    if r.get(c) is not None:
+                        index[str(r[c])].add(k)
+        built = {v: sorted(ks) for v, ks in index.items()}
+        self._indexes[columns] = (self._generation, built)
+        return built
+
+    def status(self) -> dict:
+        pending = self._pending() if self._loaded else None
+        age = (
+            (datetime.utcnow() - self._refreshed_at).total_seconds()
+            if self._refreshed_at is not None
+            else None
+        )
+        return {
+            "name": self.name,
+            "loaded": self._loaded,
+            "routes": len(self._rows),
+            "rows": sum(len(v) for v in self._rows.values()),
+            "topology_version": self._synced,
+            "current_topology_version": feed.topology_version,
+            "stale": pending is None or bool(pending),
+            "pending_routes": "all" if pending is None else len(pending),
+            "last_refresh_at": self._refreshed_at.isoformat() + "Z" if self._refreshed_at else None,
+            "age_s": round(age, 3) if age is not None else None,
+            "last_refresh": self._last or None,
+            "full_refreshes": self.full_refreshes,
+            "partial_refreshes": self.partial_refreshes,
+            "routes_refreshed": self.routes_refreshed,
+            "from_snapshot": self._from_snapshot,
+        }
+
+
+# Tablas base de las vistas de segmentos (odf_route_segment + spans + postes)
+_SEGMENT_INPUTS = ("odf_route_segment", "cable_span", "cable", "pole")
+
+route_segments = MaterializedView(
+    "route_segments",
+    ROUTE_SEGMENTS_SQL,
+    key="odf_route_id",
+    inputs=_SEGMENT_INPUTS,
+    order_by="seg_seq",
+    loader=lambda: fetch_analytic("topology", ROUTE_SEGMENTS_SQL),
+)
+backbone_edges = MaterializedView(
+    "backbone_edges",
+    TABLES["backbone_edges"],
+    key="route_id",
+    inputs=("odf_route", "odf"),
+    loader=lambda: load_table("backbone_edges"),
+)
+route_summary = MaterializedView(
+    "route_physical_summary",
+    ROUTE_SUMMARY_SQL,
+    key="odf_route_id",
+    inputs=_SEGMENT_INPUTS,
+)
+
+VIEWS: Dict[str, MaterializedView] = {
+    v.name: v for v in (route_segments, backbone_edges, route_summary)
+}
+
+
+def routes_for_spans(span_ids: Iterable[str]) -> List[str]:
+    """
+    Rutas que pasan por los spans dados: las ya materializadas (cubre
+    segmentos borrados) más las que hoy los tienen en la BD (altas).
+    """
+    span_ids = sorted({str(s) for s in span_ids})
+    if not span_ids:
+        return []
+    routes: Set[str] = set()
+    by_span = route_segments.keys_by("cable_span_id") if route_segments._loaded else {}
+    for sid in span_ids:
+        routes.update(by_span.get(sid, ()))
+    for start in range(0, len(span_ids), _IN_CHUNK):
+        part = span_ids[start : start + _IN_CHUNK]
+        placeholders = ",".join(f":s{i}" for i in range(len(part)))
+        rows = _fetch_primary(
+            f"""
+            SELECT DISTINCT odf_route_id
+            FROM dbo.odf_route_segment
+            WHERE cable_span_id IN ({placeholders})
+            """,
+            {f"s{i}": sid for i, sid in enumerate(part)},
+        )
+        routes.update(str(r["odf_route_id"]) for r in rows)
+    return sorted(routes)
+
+
+def refresh_all(full: bool = False) -> List[dict]:
+    for v in VIEWS.values():
+        if full:
+            with v._lock:
+                version = feed.topology_version
+                v._refresh_full()
+                v._synced = version
+        else:
+            v.sync()
+    return materialized_status()
+
+
+def start_warm():
+    """Primera carga en segundo plano, para que no la pague el primer request."""
+
+    def warm():
+        try:
+            refresh_all()
+        except Exception:
+            logger.exception("No se pudieron cargar las vistas materializadas")
+
+    threading.Thread(target=warm, name="materialized-warm", daemon=True).start()
+
+
+def materialized_status() -> List[dict]:
+    return [v.status() for v in VIEWS.values()]
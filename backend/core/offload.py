@@ -0,0 +1,211 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OffloadError(Exception):
+    status_code = 503
+    detail = "ASSEMBLY_UNAVAILABLE"
+
+
+class OffloadQueueFull(OffloadError):
+    status_code = 503
+    detail = "ASSEMBLY_QUEUE_FULL"
+
+
+class OffloadTimeout(OffloadError):
+    status_code = 504
+    detail = "ASSEMBLY_TIMEOUT"
+
+
+def _timed_call(fn: Callable, args: tuple):
+    # corre en el proceso worker: devuelve también el tiempo de cómputo puro
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def _noop() -> int:
+    return 0
+
+
+class OffloadMetrics:
+    """Contadores por tipo de tarea (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_kind: Dict[str, Dict[str, float]] = {}
+
+    def _kind(self, kind: str) -> Dict[str, float]:
+        k = self.by_kind.get(kind)
+        if k is None:
+            k = self.by_kind[kind] = {
+                "inline": 0,
+                "submitted": 0,
+                "completed": 0,
+                "failed": 0,
+                "timeouts": 0,
+                "rejected": 0,
+                "wall_ms_total": 0.0,
+                "wall_ms_max": 0.0,
+                "compute_ms_total": 0.0,
+            }
+        return k
+
+    def incr(self, kind: str, field: str):
+        with self._lock:
+            self._kind(kind)[field] += 1
+
+    def done(self, kind: str, wall_ms: float, compute_ms: float):
+        with self._lock:
+            k = self._kind(kind)
+            k["completed"] += 1
+            k["wall_ms_total"] += wall_ms
+            k["wall_ms_max"] = max(k["wall_ms_max"], wall_ms)
+            k["compute_ms_total"] += compute_ms
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for kind, k in self.by_kind.items():
+                n = k["completed"]
+                out[kind] = {
+                    **{f: int(k[f]) for f in ("inline", "submitted", "completed", "failed", "timeouts", "rejected")},
+                    "wall_ms_avg": round(k["wall_ms_total"] / n, 3) if n else 0.0,
+                    "wall_ms_max": round(k["wall_ms_max"], 3),
+                    # serialización + IPC + espera en cola
+                    "overhead_ms_avg": round((k["wall_ms_total"] - k["compute_ms_total"]) / n, 3)
+                    if n
+                    else 0.0,
+                }
+            return out
+
+
+class Offloader:
+    """
+    Ejecuta armados de grafos (funciones puras de core.graph_assembly) en un
+    ProcessPoolExecutor, para que un overview grande no retenga el GIL del
+    proceso que atiende requests.
+
+    - OFFLOAD_MODE="inline" (default) los ejecuta en el hilo llamador.
+    - Tareas con menos de OFFLOAD_MIN_ROWS filas se arman inline: el costo de
+      serializar filas y resultado no compensa.
+    - La cola es acotada: OFFLOAD_WORKERS en curso + OFFLOAD_QUEUE_SIZE en
+      espera; si está llena se rechaza (OffloadQueueFull -> 503).
+    - Cada tarea espera a lo sumo OFFLOAD_TIMEOUT_S (OffloadTimeout -> 504).
+      El worker no se puede interrumpir: su cupo se libera cuando termina.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._in_flight = 0
+        self.metrics = OffloadMetrics()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.OFFLOAD_MODE == "process" and settings.OFFLOAD_WORKERS > 0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: los workers no heredan hilos ni conexiones del padre
+                self._pool = ProcessPoolExecutor(
+                    max_workers=settings.OFFLOAD_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._slots = threading.BoundedSemaphore(
+                    settings.OFFLOAD_WORKERS + max(0, settings.OFFLOAD_QUEUE_SIZE)
+                )
+            return self._pool, self._slots
+
+    def start(self):
+        """Levanta los workers por adelantado (spawn tarda ~1 s por proceso)."""
+        if not self.enabled:
+            return
+        pool, _ = self._executor()
+        for f in [pool.submit(_noop) for _ in range(settings.OFFLOAD_WORKERS)]:
+            f.result()
+
+    def _release(self, slots: threading.BoundedSemaphore):
+        with self._lock:
+            self._in_flight -= 1
+        slots.release()
+
+    def run(self, kind: str, fn: Callable, *args: Any, size: int = 0):
+        if not self.enabled or size < settings.OFFLOAD_MIN_ROWS:
+            self.metrics.incr(kind, "inline")
+            return fn(*args)
+
+        pool, slots = self._executor()
+        if not slots.acquire(blocking=False):
+            self.metrics.incr(kind, "rejected")
+            raise OffloadQueueFull()
+        with self._lock:
+            self._in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            fut = pool.submit(_timed_call, fn, args)
+        except BrokenProcessPool:
+            self._release(slots)
+            return self._broken(kind, pool, fn, args)
+        except Exception:
+            self._release(slots)
+            raise
+        fut.add_done_callback(lambda _f: self._release(slots))
+        self.metrics.incr(kind, "submitted")
+        try:
+            out, compute_ms = fut.result(timeout=settings.OFFLOAD_TIMEOUT_S)
+        except FutureTimeout:
+            fut.cancel()
+            self.metrics.incr(kind, "timeouts")
+            raise OffloadTimeout()
+        except BrokenProcessPool:
+            return self._broken(kind, pool, fn, args)
+        except Exception:
+            self.metrics.incr(kind, "failed")
+            raise
+        self.metrics.done(kind, (time.perf_counter() - t0) * 1000.0, compute_ms)
+        return out
+
+    def _broken(self, kind: str, broken: ProcessPoolExecutor, fn: Callable, args: tuple):
+        # un worker murió (OOM, kill): se recrea el pool y esta tarea se arma inline
+        logger.exception("Pool de armado roto; se recrea")
+        self.metrics.incr(kind, "failed")
+        with self._lock:
+            if self._pool is broken:
+                self._pool, self._slots = None, None
+        broken.shutdown(wait=False, cancel_futures=True)
+        return fn(*args)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool, self._slots = self._pool, None, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def status(self) -> dict:
+        return {
+            "mode": settings.OFFLOAD_MODE,
+            "enabled": self.enabled,
+            "workers": settings.OFFLOAD_WORKERS,
+            "queue_size": settings.OFFLOAD_QUEUE_SIZE,
+            "timeout_s": settings.OFFLOAD_TIMEOUT_S,
+            "min_rows": settings.OFFLOAD_MIN_ROWS,
+            "started": self._pool is not None,
+            "in_flight": self._in_flight,
+            "tasks": self.metrics.snapshot(),
+        }
+
+
+offload = Offloader()
@@ -0,0 +1,95 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from .tables import load_table
+from .topo_cache import TopologyCache
+
+
+class PoleIndex:
+    """
+    Adyacencia en memoria poste -> spans / cables / vecinos / mufas,
+    construida con tres lecturas masivas (sin predicados OR por poste) y con
+    el conteo de empalmes por mufa precalculado con un GROUP BY.
+    """
+
+    def __init__(self, poles: List[dict], mufas: List[dict], spans: List[dict]):
+        self.poles: Dict[str, dict] = {str(p["id"]): p for p in poles}
+
+        self.mufas_by_pole: Dict[str, List[dict]] = defaultdict(list)
+        for m in mufas:
+            self.mufas_by_pole[str(m["pole_id"])].append(m)
+
+        # spans ya vienen ordenados por cable_id, seq
+        self.spans_by_pole: Dict[str, List[dict]] = defaultdict(list)
+        for s in spans:
+            fp, tp = str(s["from_pole_id"]), str(s["to_pole_id"])
+            self.spans_by_pole[fp].append(s)
+            if tp != fp:
+                self.spans_by_pole[tp].append(s)
+
+    def __contains__(self, pole_id: str) -> bool:
+        return pole_id in self.poles
+
+    def details(self, pole_id: str) -> Optional[dict]:
+        """Mismo payload que GET /topology/poles/{pole_id}/details."""
+        pole = self.poles.get(pole_id)
+        if pole is None:
+            return None
+
+        mufas = self.mufas_by_pole.get(pole_id, [])
+        spans = self.spans_by_pole.get(pole_id, [])
+
+        cables_map: Dict[str, dict] = {}
+        neighbors: List[dict] = []
+        for s in spans:
+            cid = s["cable_id"]
+            if cid not in cables_map:
+                cables_map[cid] = {
+                    "id": cid,
+                    "code": s.get("cable_code"),
+                    "fiber_count": s.get("fiber_count"),
+                    "material_type": s.get("material_type"),
+                    "jacket_type": s.get("jacket_type"),
+                }
+            other = (
+                s["to_pole_id"] if str(s["from_pole_id"]) == pole_id else s["from_pole_id"]
+            )
+            other_pole = self.poles.get(str(other))
+            if other_pole is None:
+                continue
+            neighbors.append(
+                {
+                    "neighbor_pole_id": other,
+                    "neighbor_pole_code": other_pole.get("code"),
+                    "via_span_id": s["id"],
+                    "length_m": s.get("length_m"),
+                }
+            )
+
+        cables = sorted(cables_map.values(), key=lambda c: (c["code"] is None, c["code"] or ""))
+        neighbors.sort(
+            key=lambda n: (n["neighbor_pole_code"] is None, n["neighbor_pole_code"] or "")
+        )
+        total_length_m = sum(float(s.get("length_m") or 0) for s in spans)
+
+        return {
+            "pole": [pole],
+            "summary": {
+                "mufa_count": len(mufas),
+                "span_count": len(spans),
+                "total_length_m": total_length_m,
+                "cable_count": len(cables),
+                "neighbor_count": len(neighbors),
+            },
+            "mufas": mufas,
+            "spans": spans,
+            "cables": cables,
+            "neighbors": neighbors,
+        }
+
+
+def _build_pole_index() -> PoleIndex:
+    return PoleIndex(load_table("pole"), load_table("mufa"), load_table("cable_span"))
+
+
+pole_index: TopologyCache[PoleIndex] = TopologyCache("pole_index", _build_pole_index)
@@ -0,0 +1,91 @@
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback sin orjson instalado
+    orjson = None
+    import json
+    from fastapi.encoders import jsonable_encoder
+
+
+def _default(obj: Any):
+    # orjson ya maneja datetime/date/UUID/dataclass de forma nativa
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+    return json.dumps(
+        jsonable_encoder(content, custom_encoder={Decimal: float}),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serializado con orjson (Decimal de SQL Server -> float).
+    Para saltarse `jsonable_encoder` el endpoint debe devolver la instancia
+    directamente: `return FastJSONResponse(payload)`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _same(a, b) -> bool:
+    # mismo tipo: 1 y True (o 1 y 1.0) no son el mismo dato para el cliente
+    return type(a) is type(b) and a == b
+
+
+def _slim_item(item: dict) -> dict:
+    meta = item.get("meta")
+    if not isinstance(meta, dict):
+        return item
+    item_id = item.get("id")
+    slim = {
+        k: v
+        for k, v in meta.items()
+        if not (k in item and _same(item[k], v))
+        and not (k.endswith("_id") and _same(v, item_id))
+    }
+    out = {k: v for k, v in item.items() if k != "meta"}
+    if slim:
+        out["meta"] = slim
+    return out
+
+
+def slim_graph(payload: dict) -> dict:
+    """
+    Quita de `meta` de cada nodo/arista los campos que ya están, con el
+    mismo valor, en el nivel superior del mismo elemento (ej. gps_lat, tipo)
+    o que repiten su id (pole_id, odf_id, mufa_id...). Si el valor difiere
+    (ej. meta.label con el nombre y label con el código) se conserva. No modifica `payload`: el overview viene
+    de un snapshot compartido.
+    """
+
+    def slim_list(items):
+        return [_slim_item(i) for i in items]
+
+    out = dict(payload)
+    for key in ("nodes", "edges"):
+        val = payload.get(key)
+        if isinstance(val, list):
+            out[key] = slim_list(val)
+        elif isinstance(val, dict):  # delta: {added, modified, removed}
+            out[key] = {
+                k: (slim_list(v) if k != "removed" else v) for k, v in val.items()
+            }
+    return out
@@ -0,0 +1,413 @@
+import time
+from array import array
+from collections import defaultdict
+from heapq import heappop, heappush
+from math import inf, isnan, nan
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from .tables import load_table
+from .topo_cache import TopologyCache
+from .util import haversine_m
+
+# Largo asumido para spans sin length_m ni GPS en ambos postes
+DEFAULT_SPAN_M = 100.0
+
+
+class PoleGraph:
+    """
+    Grafo físico en arreglos compactos (CSR). Vértices:
+
+        0 .. n_poles-1          postes
+        n_poles .. n-1          nodos (conectados con costo 0 a los postes
+                                extremos de las rutas ODF de sus ODFs)
+
+        ids[i]                  -> pole_id / nodo_id del vértice i
+        offsets[i]:offsets[i+1] -> rango de vecinos de i en nbrs/weights/span_ix
+        lat[i], lon[i]          -> GPS del poste (nan si no tiene / nodo)
+        span_ix[j]              -> índice en span_ids (-1 = enlace nodo-poste)
+
+    Spans paralelos entre el mismo par de postes (varios cables) se colapsan
+    al de menor largo.
+    """
+
+    def __init__(
+        self,
+        poles: List[dict],
+        spans: List[dict],
+        route_ends: List[dict],
+    ):
+        self.ids: List[str] = [str(p["id"]) for p in poles]
+        self.codes: List[Optional[str]] = [p.get("code") for p in poles]
+        self.n_poles = len(self.ids)
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+        self.lat = array("d", (float(p["gps_lat"]) if p.get("gps_lat") is not None else nan for p in poles))
+        self.lon = array("d", (float(p["gps_lon"]) if p.get("gps_lon") is not None else nan for p in poles))
+
+        # (u, v) con u < v -> (largo, span_id)
+        best: Dict[Tuple[int, int], Tuple[float, str]] = {}
+        for s in spans:
+            u = self.index.get(str(s["from_pole_id"]))
+            v = self.index.get(str(s["to_pole_id"]))
+            if u is None or v is None or u == v:
+                continue
+            w = s.get("length_m")
+            w = float(w) if w is not None else self._gps_distance(u, v)
+            key = (u, v) if u < v else (v, u)
+            cur = best.get(key)
+            if cur is None or w < cur[0]:
+                best[key] = (w, str(s["id"]))
+        self.span_ids: List[str] = [sid for _, sid in best.values()]
+
+        links: List[Tuple[int, int, float, int]] = [
+            (u, v, w, sx) for sx, ((u, v), (w, _)) in enumerate(best.items())
+        ]
+
+        # nodo -> postes de acceso (primer poste de rutas que salen de sus
+        # ODFs, último poste de rutas que llegan)
+        access: Dict[str, set] = defaultdict(set)
+        for r in route_ends:
+            if r.get("rn_first") == 1 and r.get("from_nodo_id") is not None:
+                i = self.index.get(str(r["from_pole_id"]))
+                if i is not None:
+                    access[str(r["from_nodo_id"])].add(i)
+            if r.get("rn_last") == 1 and r.get("to_nodo_id") is not None:
+                i = self.index.get(str(r["to_pole_id"]))
+                if i is not None:
+                    access[str(r["to_nodo_id"])].add(i)
+        self.nodo_access: Dict[str, List[int]] = {}
+        for nodo_id in sorted(access):
+            nx = len(self.ids)
+            self.ids.append(nodo_id)
+            self.codes.append(None)
+            self.lat.append(nan)
+            self.lon.append(nan)
+            self.nodo_access[nodo_id] = sorted(access[nodo_id])
+            for p in self.nodo_access[nodo_id]:
+                links.append((nx, p, 0.0, -1))
+        self.nodo_vertex: Dict[str, int] = {
+            self.ids[i]: i for i in range(self.n_poles, len(self.ids))
+        }
+
+        n = len(self.ids)
+        degree = [0] * n
+        for u, v, _, _ in links:
+            degree[u] += 1
+            degree[v] += 1
+        self.offsets = array("l", [0] * (n + 1))
+        acc = 0
+        for i in range(n):
+            self.offsets[i] = acc
+            acc += degree[i]
+        self.offsets[n] = acc
+        self.nbrs = array("l", bytes(acc * array("l").itemsize))
+        self.weights = array("d", bytes(acc * array("d").itemsize))
+        self.span_ix = array("l", bytes(acc * array("l").itemsize))
+        fill = array("l", self.offsets[:n])
+        for u, v, w, sx in links:
+            for a, b in ((u, v), (v, u)):
+                j = fill[a]
+                self.nbrs[j], self.weights[j], self.span_ix[j] = b, w, sx
+                fill[a] = j + 1
+
+        self._heuristic_scales(best)
+
+    def _heuristic_scales(self, best: Dict[Tuple[int, int], Tuple[float, str]]) -> None:
+        """
+        Escala de la heurística GPS por componente conexa. Para que A* sea
+        exacto la cota s * distancia_gps tiene que quedar por debajo del costo
+        de todo tramo del grafo:
+        - spans con length_m menor que la distancia entre postes bajan s;
+        - un poste sin GPS en la componente deja tramos sin cota -> s = 0;
+        - con tránsito, un nodo une a costo 0 postes de acceso que pueden
+          estar separados -> s_transit = 0 si los postes no coinciden.
+        s = 0 es Dijkstra.
+        """
+        n, offsets, nbrs = self.n, self.offsets, self.nbrs
+        self.comp = array("l", [-1]) * n
+        ncomp = 0
+        for root in range(n):
+            if self.comp[root] != -1:
+                continue
+            self.comp[root] = ncomp
+            stack = [root]
+            while stack:
+                u = stack.pop()
+                for j in range(offsets[u], offsets[u + 1]):
+                    v = nbrs[j]
+                    if self.comp[v] == -1:
+                        self.comp[v] = ncomp
+                        stack.append(v)
+            ncomp += 1
+
+        scale = [1.0] * ncomp
+        for i in range(self.n_poles):
+            if isnan(self.lat[i]) or isnan(self.lon[i]):
+                scale[self.comp[i]] = 0.0
+        for (u, v), (w, _) in best.items():
+            c = self.comp[u]
+            if scale[c] == 0.0 or isnan(self.lat[u]) or isnan(self.lat[v]):
+                continue
+            d = haversine_m(self.lat[u], self.lon[u], self.lat[v], self.lon[v])
+            if d > 0 and w / d < scale[c]:
+                scale[c] = max(0.0, w / d)
+        transit = list(scale)
+        for poles in self.nodo_access.values():
+            c = self.comp[poles[0]]
+            if transit[c] > 0 and any(
+                self._gps_distance(p, q) > 0 for p in poles for q in poles if p < q
+            ):
+                transit[c] = 0.0
+        self.comp_scale: List[float] = scale
+        self.comp_scale_transit: List[float] = transit
+
+    @property
+    def n(self) -> int:
+        return len(self.ids)
+
+    def is_nodo(self, v: int) -> bool:
+        return v >= self.n_poles
+
+    def _gps_distance(self, u: int, v: int) -> float:
+        la1, lo1, la2, lo2 = self.lat[u], self.lon[u], self.lat[v], self.lon[v]
+        if isnan(la1) or isnan(lo1) or isnan(la2) or isnan(lo2):
+            return DEFAULT_SPAN_M
+        return haversine_m(la1, lo1, la2, lo2)
+
+    def edge(self, u: int, v: int) -> Tuple[float, int]:
+        for j in range(self.offsets[u], self.offsets[u + 1]):
+            if self.nbrs[j] == v:
+                return self.weights[j], self.span_ix[j]
+        raise KeyError((u, v))
+
+
+class PathBudgetExceeded(Exception):
+    """La búsqueda superó ROUTING_MAX_EXPANSIONS o ROUTING_TIMEOUT_S."""
+
+
+class _Query:
+    """
+    Búsqueda hacia un nodo destino. La heurística A* es la distancia de gran
+    círculo al poste de acceso más cercano del destino: todo camino tiene que
+    pasar por uno de ellos. Se multiplica por la escala de la componente
+    (`PoleGraph.comp_scale`) para que siga siendo cota inferior; donde no
+    hay cota válida la escala es 0 y la búsqueda es Dijkstra. Postes sin GPS
+    y nodos tienen h = 0, así que la heurística no es consistente: un
+    vértice ya expandido se vuelve a abrir si aparece un camino más corto.
+
+    Para las búsquedas de desvío de Yen se usa `exact_heuristic()`: las
+    distancias reales al destino (un Dijkstra desde el destino) son cota
+    consistente de cualquier subgrafo con vértices o aristas vetados.
+    """
+
+    def __init__(
+        self,
+        g: PoleGraph,
+        target: int,
+        astar: bool,
+        banned: FrozenSet[int],
+        transit: bool = True,
+        max_expanded: int = 0,
+        deadline: float = 0.0,
+    ):
+        self.g = g
+        self.target = target
+        self.banned = banned
+        self.expanded = 0
+        self.max_expanded = max_expanded
+        self.deadline = deadline
+        self._h: Dict[int, float] = {}
+        self._exact: Optional[array] = None
+        self._tcoords: Optional[List[Tuple[float, float]]] = None
+        scales = g.comp_scale_transit if transit else g.comp_scale
+        self._scale = scales[g.comp[target]]
+        if astar and self._scale > 0:
+            self._tcoords = [(g.lat[p], g.lon[p]) for p in g.nodo_access[g.ids[target]]]
+
+    def _expand(self) -> None:
+        self.expanded += 1
+        if self.max_expanded and self.expanded > self.max_expanded:
+            raise PathBudgetExceeded(f"más de {self.max_expanded} vértices expandidos")
+        if self.deadline and self.expanded % 1024 == 0 and time.monotonic() > self.deadline:
+            raise PathBudgetExceeded("tiempo máximo agotado")
+
+    def h(self, v: int) -> float:
+        if self._exact is not None:
+            return self._exact[v]
+        if self._tcoords is None:
+            return 0.0
+        hv = self._h.get(v)
+        if hv is None:
+            la, lo = self.g.lat[v], self.g.lon[v]
+            if isnan(la) or isnan(lo):
+                hv = 0.0
+            else:
+                hv = self._scale * min(
+                    haversine_m(la, lo, tla, tlo) for tla, tlo in self._tcoords
+                )
+            self._h[v] = hv
+        return hv
+
+    def exact_heuristic(self) -> None:
+        """Dijkstra completo desde el destino (sin los vértices vetados)."""
+        offsets, nbrs, weights, banned = self.g.offsets, self.g.nbrs, self.g.weights, self.banned
+        dist = array("d", [inf]) * self.g.n
+        dist[self.target] = 0.0
+        heap = [(0.0, self.target)]
+        while heap:
+            d, u = heappop(heap)
+            if d > dist[u]:
+                continue
+            self._expand()
+            for j in range(offsets[u], offsets[u + 1]):
+                v = nbrs[j]
+                nd = d + weights[j]
+                if nd < dist[v] and v not in banned:
+                    dist[v] = nd
+                    heappush(heap, (nd, v))
+        self._exact = dist
+
+    def search(
+        self,
+        start: int,
+        banned_nodes: FrozenSet[int] = frozenset(),
+        banned_edges: FrozenSet[Tuple[int, int]] = frozenset(),
+    ) -> Optional[Tuple[float, List[int]]]:
+        offsets, nbrs, weights = self.g.offsets, self.g.nbrs, self.g.weights
+        target, h, banned = self.target, self.h, self.banned
+        dist: Dict[int, float] = {start: 0.0}
+        prev: Dict[int, int] = {}
+        hs = h(start)
+        if hs == inf:
+            return None
+        heap = [(hs, 0.0, start)]
+        while heap:
+            _, d, u = heappop(heap)
+            if d > dist[u]:
+                continue  # entrada vieja: u ya salió con una distancia menor
+            if u == target:
+                path = [u]
+                while path[-1] != start:
+                    path.append(prev[path[-1]])
+                path.reverse()
+                return d, path
+            self._expand()
+            for j in range(offsets[u], offsets[u + 1]):
+                v = nbrs[j]
+                if v in banned_nodes or (v in banned and v != target):
+                    continue
+                if banned_edges and (u, v) in banned_edges:
+                    continue
+                nd = d + weights[j]
+                if nd < dist.get(v, inf):
+                    hv = h(v)
+                    if hv == inf:
+                        continue  # no llega al destino
+                    dist[v] = nd
+                    prev[v] = u
+                    heappush(heap, (nd + hv, nd, v))
+        return None
+
+
+def k_shortest_paths(
+    g: PoleGraph,
+    source: int,
+    target: int,
+    k: int = 1,
+    astar: bool = True,
+    transit: bool = True,
+    max_expanded: int = 0,
+    timeout_s: float = 0.0,
+) -> Tuple[List[Tuple[float, List[int]]], int]:
+    """
+    Yen: hasta `k` caminos simples más cortos entre dos vértices nodo.
+    Con `transit=False` el camino no puede pasar por otros nodos.
+    `max_expanded` / `timeout_s` (0 = sin límite) cortan la búsqueda con
+    PathBudgetExceeded. Devuelve (caminos, vértices expandidos).
+    """
+    banned = frozenset() if transit else frozenset(
+        v for v in g.nodo_vertex.values() if v not in (source, target)
+    )
+    deadline = time.monotonic() + timeout_s if timeout_s > 0 else 0.0
+    q = _Query(g, target, astar, banned, transit, max_expanded, deadline)
+    first = q.search(source)
+    if first is None:
+        return [], q.expanded
+    found: List[Tuple[float, List[int]]] = [first]
+    seen = {tuple(first[1])}
+    candidates: List[Tuple[float, Tuple[int, ...]]] = []
+    if k > 1:
+        q.exact_heuristic()
+
+    while len(found) < k:
+        _, last = found[-1]
+        root_cost = 0.0
+        for i in range(len(last) - 1):
+            spur = last[i]
+            root = last[: i + 1]
+            if i > 0:
+                root_cost += g.edge(last[i - 1], spur)[0]
+            banned_edges = set()
+            for _, p in found:
+                if len(p) > i + 1 and p[: i + 1] == root:
+                    banned_edges.add((p[i], p[i + 1]))
+            res = q.search(spur, frozenset(root[:-1]), frozenset(banned_edges))
+            if res is None:
+                continue
+            spur_cost, spur_path = res
+            full = tuple(root[:-1] + spur_path)
+            if full in seen:
+                continue
+            seen.add(full)
+            heappush(candidates, (root_cost + spur_cost, full))
+        if not candidates:
+            break
+        cost, path = heappop(candidates)
+        found.append((cost, list(path)))
+
+    return found, q.expanded
+
+
+def bridges(g: PoleGraph) -> Set[Tuple[int, int]]:
+    """
+    Aristas puente (Tarjan iterativo): su corte desconecta el grafo, no hay
+    camino alternativo. Devuelve pares (u, v) con u < v.
+    """
+    n, offsets, nbrs = g.n, g.offsets, g.nbrs
+    disc = [-1] * n
+    low = [0] * n
+    t = 0
+    out: Set[Tuple[int, int]] = set()
+    for root in range(n):
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = t
+        t += 1
+        stack = [(root, -1, offsets[root])]
+        while stack:
+            u, p, j = stack[-1]
+            if j < offsets[u + 1]:
+                stack[-1] = (u, p, j + 1)
+                v = nbrs[j]
+                if v == p:
+                    continue
+                if disc[v] == -1:
+                    disc[v] = low[v] = t
+                    t += 1
+                    stack.append((v, u, offsets[v]))
+                elif disc[v] < low[u]:
+                    low[u] = disc[v]
+            else:
+                stack.pop()
+                if p != -1:
+                    if low[u] < low[p]:
+                        low[p] = low[u]
+                    if low[u] > disc[p]:
+                        out.add((p, u) if p < u else (u, p))
+    return out
+
+
+def _build_pole_graph() -> PoleGraph:
+    return PoleGraph(load_table("pole"), load_table("cable_span"), load_table("route_ends"))
+
+
+pole_graph: TopologyCache[PoleGraph] = TopologyCache("pole_graph", _build_pole_graph)
@@ -0,0 +1,257 @@
+import logging
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .changefeed import feed
+from .config import settings
+from .db import fetch_all
+
+logger = logging.getLogger(__name__)
+
+# kind -> (tabla de origen, SQL, campos buscables, campo para el label)
+SOURCES: Dict[str, Tuple[str, str, Sequence[str], str]] = {
+    "nodo": ("nodo", "SELECT id, code, name FROM dbo.nodo", ("id", "code", "name"), "name"),
+    "pole": ("pole", "SELECT id, code FROM dbo.pole", ("id", "code"), "code"),
+    "mufa": ("mufa", "SELECT id, code FROM dbo.mufa", ("id", "code"), "code"),
+    "cable": ("cable", "SELECT id, code FROM dbo.cable", ("id", "code"), "code"),
+    "odf": ("odf", "SELECT id, code, name FROM dbo.odf", ("id", "code", "name"), "code"),
+    "odf_port": ("odf_port", "SELECT id FROM dbo.odf_port", ("id",), "id"),
+    "filament": ("fiber_filament", "SELECT id FROM dbo.fiber_filament", ("id",), "id"),
+}
+
+# Trigramas más comunes que esto (ej. prefijos "f-0") no se usan para
+# generar candidatos: no discriminan y harían lenta la búsqueda.
+MAX_POSTING = 50_000
+# Tope de posteos recorridos por consulta fuzzy (se usan los más raros)
+POSTING_BUDGET = 10_000
+
+
+_SEPARATORS = str.maketrans({c: " " for c in "-_./|:"})
+
+
+def normalize(text: str) -> str:
+    """minúsculas, sin tildes y con separadores (-_./|:) como espacio."""
+    t = unicodedata.normalize("NFKD", str(text))
+    t = "".join(ch for ch in t if not unicodedata.combining(ch))
+    return " ".join(t.lower().translate(_SEPARATORS).split())
+
+
+def trigrams(key: str) -> set:
+    k = f"  {key} "
+    return {k[i : i + 3] for i in range(len(k) - 2)}
+
+
+class _Segment:
+    """
+    Índice de un tipo de elemento: claves normalizadas ordenadas (prefijo con
+    bisect) + listas de posteo por trigrama (fuzzy).
+    """
+
+    def __init__(self, kind: str, rows: List[dict], fields: Sequence[str], label_field: str):
+        self.kind = kind
+        self.ids: List[str] = []
+        self.labels: List[Optional[str]] = []
+        pairs: List[Tuple[str, int, int]] = []  # (clave, entrada, campo)
+        for r in rows:
+            e = len(self.ids)
+            self.ids.append(str(r["id"]))
+            self.labels.append(r.get(label_field) or str(r["id"]))
+            seen = set()
+            for fi, f in enumerate(fields):
+                v = r.get(f)
+                if v is None:
+                    continue
+                k = normalize(v)
+                if k and k not in seen:
+                    seen.add(k)
+                    pairs.append((k, e, fi))
+        pairs.sort()
+        self.fields = list(fields)
+        self.keys = [p[0] for p in pairs]
+        self.entry = array("l", (p[1] for p in pairs))
+        self.field = array("b", (p[2] for p in pairs))
+
+        posting: Dict[str, array] = {}
+        for ki, k in enumerate(self.keys):
+            for g in trigrams(k):
+                lst = posting.get(g)
+                if lst is None:
+                    lst = posting[g] = array("l")
+                lst.append(ki)
+        self.posting = posting
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _item(self, ki: int, match: str, score: float) -> dict:
+        e = self.entry[ki]
+        return {
+            "kind": self.kind,
+            "id": self.ids[e],
+            "label": self.labels[e],
+            "field": self.fields[self.field[ki]],
+            "match": match,
+            "score": round(score, 4),
+        }
+
+    def prefix(self, q: str, limit: int) -> List[dict]:
+        out = []
+        i = bisect_left(self.keys, q)
+        while i < len(self.keys) and len(out) < limit and self.keys[i].startswith(q):
+            k = self.keys[i]
+            out.append(self._item(i, "exact" if k == q else "prefix", 1.0 if k == q else 0.9))
+            i += 1
+        return out
+
+    def fuzzy(self, q: str, limit: int, min_score: float) -> List[dict]:
+        grams = trigrams(q)
+        lists = [self.posting[g] for g in grams if g in self.posting]
+        usable = sorted((lst for lst in lists if len(lst) <= MAX_POSTING), key=len)
+        if not usable:
+            return []
+        counts: Counter = Counter()
+        budget = POSTING_BUDGET
+        for lst in usable:
+            if budget <= 0:
+                break
+            counts.update(lst)
+            budget -= len(lst)
+        # los conteos son parciales (presupuesto): se re-puntúan los
+        # candidatos con la similitud de trigramas completa
+        scored = []
+        for ki, _ in counts.most_common(limit * 20):
+            kg = trigrams(self.keys[ki])
+            score = len(grams & kg) / len(grams | kg)
+            if score >= min_score:
+                scored.append((score, ki))
+        scored.sort(key=lambda t: (-t[0], self.keys[t[1]]))
+        return [self._item(ki, "fuzzy", sc * 0.8) for sc, ki in scored[:limit]]
+
+
+class SearchIndex:
+    """
+    Índice de búsqueda por códigos/nombres/ids. Cada tipo es un segmento que
+    se reconstruye sólo cuando su tabla de origen cambió
+    (`feed.table_version`) o vence TOPOLOGY_CACHE_TTL_S.
+
+    Sólo el primer armado de un segmento bloquea (no hay nada que servir, y
+    con lock por tipo: no frena a los demás). Un segmento vencido se sigue
+    sirviendo mientras un hilo arma el nuevo, que reemplaza al anterior de
+    una vez al terminar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kind_locks: Dict[str, threading.Lock] = {k: threading.Lock() for k in SOURCES}
+        self._segments: Dict[str, _Segment] = {}
+        self._seg_version: Dict[str, int] = {}
+        self._rebuilding: Set[str] = set()
+        self._errors: Dict[str, str] = {}
+
+    def _stale(self, kind: str) -> bool:
+        seg = self._segments.get(kind)
+        if seg is None:
+            return True
+        table = SOURCES[kind][0]
+        if self._seg_version.get(kind, -1) < feed.table_version(table):
+            return True
+        ttl = settings.TOPOLOGY_CACHE_TTL_S
+        return ttl > 0 and time.monotonic() - seg.built_at >= ttl
+
+    def _build(self, kind: str) -> _Segment:
+        # con self._kind_locks[kind] tomado
+        table, sql, fields, label = SOURCES[kind]
+        version = feed.table_version(table)
+        seg = _Segment(kind, fetch_all(sql), fields, label)
+        with self._lock:
+            self._segments[kind] = seg
+            self._seg_version[kind] = version
+            self._errors.pop(kind, None)
+        return seg
+
+    def _rebuild_in_background(self, kind: str):
+        with self._lock:
+            if kind in self._rebuilding:
+                return
+            self._rebuilding.add(kind)
+
+        def run():
+            try:
+                with self._kind_locks[kind]:
+                    self._build(kind)
+            except Exception as e:
+                # se sigue sirviendo el segmento anterior; el próximo request reintenta
+                logger.exception("Search: falló la reconstrucción de %s", kind)
+                self._errors[kind] = str(e)
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(kind)
+
+        threading.Thread(target=run, name=f"search-{kind}", daemon=True).start()
+
+    def segments(self, kinds: Sequence[str]) -> List[_Segment]:
+        out = []
+        for kind in kinds:
+            seg = self._segments.get(kind)
+            if seg is None:
+                with self._kind_locks[kind]:
+                    seg = self._segments.get(kind)
+                    if seg is None:
+                        seg = self._build(kind)
+            elif self._stale(kind):
+                self._rebuild_in_background(kind)
+            out.append(seg)
+        return out
+
+    def search(
+        self,
+        q: str,
+        kinds: Optional[Sequence[str]] = None,
+        limit: int = 20,
+        fuzzy: bool = True,
+        min_score: float = 0.3,
+    ) -> List[dict]:
+        nq = normalize(q)
+        if not nq:
+            return []
+        segs = self.segments(list(kinds or SOURCES))
+        results: List[dict] = []
+        seen = set()
+
+        def add(items: List[dict]):
+            for it in items:
+                key = (it["kind"], it["id"])
+                if key not in seen:
+                    seen.add(key)
+                    results.append(it)
+
+        for seg in segs:
+            add(seg.prefix(nq, limit))
+        if fuzzy and len(results) < limit:
+            for seg in segs:
+                add(seg.fuzzy(nq, limit, min_score))
+        results.sort(key=lambda it: (-it["score"], it["label"] or ""))
+        return results[:limit]
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                "kind": k,
+                "entries": len(seg),
+                "keys": len(seg.keys),
+                "table_version": self._seg_version.get(k),
+                "age_s": round(time.monotonic() - seg.built_at, 3),
+                "rebuilding": k in self._rebuilding,
+                "last_error": self._errors.get(k),
+            }
+            for k, seg in list(self._segments.items())
+        ]
+
+
+search_index = SearchIndex()
@@ -0,0 +1,151 @@
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from . import timing
+from .config import settings
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas concurrentes: la primera llamada con
+    una clave ejecuta la función y las que llegan mientras está en curso
+    esperan y reciben el mismo resultado (o la misma excepción). Al terminar,
+    la clave se libera: no es una caché.
+
+    El resultado se comparte entre requests, así que debe tratarse como de
+    sólo lectura (los endpoints lo copian si lo transforman, ej. slim_graph).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_waiters = 0
+        _registry[name] = self
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # las claves async viven en el event loop: no hace falta lock entre hilos
+        task = self._async_calls.get(key)
+        with self._lock:
+            if task is None:
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if task is None:
+            task = self._async_calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._async_done(key, t))
+        # shield: si un cliente se desconecta no se cancela el cómputo de los demás
+        return await asyncio.shield(task)
+
+    def _async_done(self, key: Hashable, task: asyncio.Future):
+        self._async_calls.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            with self._lock:
+                self.errors += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "max_waiters": self.max_waiters,
+            }
+
+
+_registry: Dict[str, SingleFlight] = {}
+
+
+def singleflight_status() -> list:
+    return [f.status() for f in _registry.values()]
+
+
+def coalesce(name: str):
+    """
+    Decorador: coalesce llamadas concurrentes a la función con los mismos
+    argumentos (clave = nombre + argumentos normalizados con sus defaults).
+    Sirve para funciones sync (requests en el threadpool) y async.
+    Se desactiva con SINGLEFLIGHT_ENABLED=false. Los requests con
+    ?debug_timing / ?profile ejecutan siempre (miden su propio trabajo).
+    """
+
+    def wrap(fn: Callable):
+        flight = SingleFlight(name)
+        sig = inspect.signature(fn)
+
+        def key_of(args, kwargs) -> str:
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return repr(tuple(bound.arguments.items()))
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not settings.SINGLEFLIGHT_ENABLED or timing.active():
+                    return await fn(*args, **kwargs)
+                return await flight.do_async(key_of(args, kwargs), lambda: fn(*args, **kwargs))
+
+            async_wrapper.flight = flight
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not settings.SINGLEFLIGHT_ENABLED or timing.active():
+                return fn(*args, **kwargs)
+            return flight.do(key_of(args, kwargs), lambda: fn(*args, **kwargs))
+
+        wrapper.flight = flight
+        return wrapper
+
+    return wrap
@@ -0,0 +1,426 @@
+"""
+Snapshot binario de la topología para arranque en frío.
+
+Formato (little-endian, bloques alineados a 8 bytes):
+
+    header   magic "MIRSNAP1", formato u32, n_tablas u32, created_at f64,
+             offset del directorio u64, largo del directorio u64
+    bloques  columnas de ancho fijo (int64 / float64 / bool u8), máscaras de
+             nulos (u8) y tablas de strings (offsets int64 + blob UTF-8)
+    dir      JSON: {tabla: {rows, columns: [{name, kind, data, nulls, ...}]}}
+
+El archivo se abre con mmap de sólo lectura: todos los workers que lo mapean
+comparten las mismas páginas del page cache y las columnas numéricas se leen
+sin copia (`np.frombuffer`). Los builders de las tablas grandes (hilos,
+empalmes, puertos, segmentos de ruta) leen columnas con
+core.tables.load_columns; el resto materializa filas en cada proceso.
+
+    python -m core.snapshot export [ruta]
+    python -m core.snapshot info [ruta]
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import settings
+from .db import fetch_all, warm_pool
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MIRSNAP1"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIIdQQ")
+_ALIGN = 8
+_INT64_MIN, _INT64_MAX = -(2**63), 2**63 - 1
+
+
+# ----------------------------------------------------------------------
+# Escritura
+# ----------------------------------------------------------------------
+def _column_kind(values: Sequence) -> str:
+    kind = None
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            k = "b1"
+        elif isinstance(v, int):
+            k = "i8" if _INT64_MIN <= v <= _INT64_MAX else "str"
+        elif isinstance(v, (float, Decimal)):
+            k = "f8"
+        else:
+            k = "str"
+        if k == "str":
+            return "str"
+        if kind is None or kind == k:
+            kind = k
+        elif {kind, k} == {"i8", "f8"}:
+            kind = "f8"
+        else:
+            return "str"
+    return kind or "str"
+
+
+def _to_text(v) -> str:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, (bytes, bytearray)):
+        return v.hex()
+    return str(v)
+
+
+class _Writer:
+    def __init__(self, f):
+        self.f = f
+        self.f.write(b"\0" * _HEADER.size)
+
+    def block(self, data: bytes) -> int:
+        pad = -self.f.tell() % _ALIGN
+        if pad:
+            self.f.write(b"\0" * pad)
+        off = self.f.tell()
+        self.f.write(data)
+        return off
+
+    def column(self, name: str, values: List) -> dict:
+        kind = _column_kind(values)
+        col = {"name": name, "kind": kind, "nulls": None}
+        if any(v is None for v in values):
+            col["nulls"] = self.block(np.array([v is None for v in values], dtype=np.uint8).tobytes())
+        if kind == "i8":
+            arr = np.array([0 if v is None else int(v) for v in values], dtype=np.int64)
+        elif kind == "f8":
+            arr = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        elif kind == "b1":
+            arr = np.array([bool(v) for v in values], dtype=np.uint8)
+        else:
+            encoded = [b"" if v is None else _to_text(v).encode("utf-8") for v in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            col["offsets"] = self.block(offsets.tobytes())
+            col["blob"] = self.block(b"".join(encoded))
+            col["blob_len"] = int(offsets[-1])
+            return col
+        col["data"] = self.block(arr.tobytes())
+        return col
+
+    def table(self, rows: List[dict]) -> dict:
+        names = list(rows[0].keys()) if rows else []
+        return {
+            "rows": len(rows),
+            "columns": [self.column(n, [r.get(n) for r in rows]) for n in names],
+        }
+
+
+def write_snapshot(path: str, tables: Dict[str, List[dict]]) -> dict:
+    """
+    Escribe `tables` ({nombre: filas}) en `path`. Se escribe a un temporal y
+    se reemplaza con os.replace: los procesos que tienen mapeado el archivo
+    anterior siguen leyendo su versión hasta reabrir.
+    """
+    tmp = f"{path}.tmp"
+    created_at = time.time()
+    with open(tmp, "wb") as f:
+        w = _Writer(f)
+        directory = {name: w.table(rows) for name, rows in tables.items()}
+        raw = json.dumps(directory, separators=(",", ":")).encode("utf-8")
+        dir_off = w.block(raw)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(directory), created_at, dir_off, len(raw)))
+    os.replace(tmp, path)
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "created_at": created_at,
+        "tables": {name: len(rows) for name, rows in tables.items()},
+    }
+
+
+def export(path: Optional[str] = None) -> dict:
+    """Lee las tablas de topología desde la BD y las escribe en `path`."""
+    from .tables import TABLES
+
+    path = path or settings.SNAPSHOT_PATH
+    if not path:
+        raise ValueError("SNAPSHOT_PATH no configurado")
+    t0 = time.perf_counter()
+    tables = {name: fetch_all(sql) for name, sql in TABLES.items()}
+    out = write_snapshot(path, tables)
+    out["export_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    return out
+
+
+# ----------------------------------------------------------------------
+# Lectura (mmap)
+# ----------------------------------------------------------------------
+class SnapshotTable:
+    """Vista columnar de una tabla del snapshot, respaldada por el mmap."""
+
+    def __init__(self, buf: mmap.mmap, name: str, meta: dict):
+        self._buf = buf
+        self.name = name
+        self.n_rows: int = meta["rows"]
+        self._cols: Dict[str, dict] = {c["name"]: c for c in meta["columns"]}
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._cols)
+
+    def nulls(self, name: str) -> Optional[np.ndarray]:
+        off = self._cols[name]["nulls"]
+        if off is None:
+            return None
+        return np.frombuffer(self._buf, dtype=np.uint8, count=self.n_rows, offset=off).astype(bool)
+
+    def array(self, name: str) -> np.ndarray:
+        """Columna numérica sin copia (int64 / float64 / bool)."""
+        col = self._cols[name]
+        dtype = {"i8": np.int64, "f8": np.float64, "b1": np.uint8}.get(col["kind"])
+        if dtype is None:
+            raise TypeError(f"columna {name} es de texto")
+        arr = np.frombuffer(self._buf, dtype=dtype, count=self.n_rows, offset=col["data"])
+        return arr.view(bool) if col["kind"] == "b1" else arr
+
+    def values(self, name: str) -> List:
+        """Columna como lista de objetos Python (None para nulos)."""
+        col = self._cols[name]
+        if col["kind"] == "str":
+            offs = np.frombuffer(
+                self._buf, dtype=np.int64, count=self.n_rows + 1, offset=col["offsets"]
+            ).tolist()
+            blob = self._buf[col["blob"] : col["blob"] + col["blob_len"]]
+            out = [blob[a:b].decode("utf-8") for a, b in zip(offs, offs[1:])]
+        else:
+            out = self.array(name).tolist()
+        nulls = self.nulls(name)
+        if nulls is not None:
+            for i in np.flatnonzero(nulls).tolist():
+                out[i] = None
+        return out
+
+    def str_array(self, name: str) -> np.ndarray:
+        """Como core.arrays.str_array (None -> ""), sin armar filas."""
+        col = self._cols[name]
+        if col["kind"] == "str":
+            offs = np.frombuffer(
+                self._buf, dtype=np.int64, count=self.n_rows + 1, offset=col["offsets"]
+            ).tolist()
+            blob = self._buf[col["blob"] : col["blob"] + col["blob_len"]]
+            # los nulos de texto se guardan vacíos
+            return np.array([blob[a:b].decode("utf-8") for a, b in zip(offs, offs[1:])], dtype=str)
+        out = np.array([str(v) for v in self.array(name).tolist()], dtype=str)
+        nulls = self.nulls(name)
+        if nulls is not None:
+            out[nulls] = ""
+        return out
+
+    def float_array(self, name: str) -> np.ndarray:
+        """Como core.arrays.float_array (None -> nan), sin armar filas."""
+        if self._cols[name]["kind"] == "str":
+            return np.array(
+                [np.nan if v is None else float(v) for v in self.values(name)], dtype=np.float64
+            )
+        out = self.array(name).astype(np.float64)
+        nulls = self.nulls(name)
+        if nulls is not None:
+            out[nulls] = np.nan
+        return out
+
+    def rows(self) -> List[dict]:
+        names = self.columns
+        cols = [self.values(n) for n in names]
+        return [dict(zip(names, vals)) for vals in zip(*cols)] if names else []
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, n_tables, created_at, dir_off, dir_len = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            self._buf.close()
+            raise ValueError(f"{path}: no es un snapshot MIR v{FORMAT_VERSION}")
+        self.created_at: float = created_at
+        self._dir: Dict[str, dict] = json.loads(self._buf[dir_off : dir_off + dir_len])
+        self.size = len(self._buf)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._dir
+
+    def table(self, name: str) -> SnapshotTable:
+        return SnapshotTable(self._buf, name, self._dir[name])
+
+    def rows(self, name: str) -> List[dict]:
+        return self.table(name).rows()
+
+    def close(self):
+        try:
+            self._buf.close()
+        except BufferError:
+            # quedan arreglos apuntando al mmap: se libera con ellos
+            pass
+
+    def info(self) -> dict:
+        return {
+            "path": self.path,
+            "bytes": self.size,
+            "created_at": datetime.utcfromtimestamp(self.created_at).isoformat() + "Z",
+            "age_s": round(time.time() - self.created_at, 1),
+            "tables": {name: meta["rows"] for name, meta in self._dir.items()},
+        }
+
+
+# ----------------------------------------------------------------------
+# Estado del proceso: servir desde snapshot hasta que la BD responda
+# ----------------------------------------------------------------------
+class SnapshotStore:
+    """
+    Mientras `active()` es verdadero, core.tables.load_table lee del
+    snapshot. Un hilo en segundo plano prueba la BD y ejecuta los `warmers`
+    (builders de overview e índices) con lecturas forzadas a BD; recién
+    cuando terminan se deja de servir el snapshot, así los requests no
+    esperan a SQL Server en el arranque en frío. Si la BD cae después, se
+    vuelve al snapshot y se reintenta cada SNAPSHOT_RETRY_S.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.snapshot: Optional[Snapshot] = None
+        self._serving = False
+        self._warmers: List[Callable[[], object]] = []
+        self._thread: Optional[threading.Thread] = None
+        self.served_since: Optional[float] = None
+        self.refreshed_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def open(self, path: str) -> bool:
+        if not path or not os.path.exists(path):
+            return False
+        snap = Snapshot(path)
+        with self._lock:
+            old, self.snapshot = self.snapshot, snap
+            self._serving = True
+            self.served_since = time.time()
+        if old is not None:
+            old.close()
+        logger.info("Snapshot de topología mapeado: %s (%s bytes)", path, snap.size)
+        return True
+
+    def live_reads_forced(self) -> bool:
+        return getattr(self._local, "live", False)
+
+    @contextmanager
+    def live_reads(self):
+        """Dentro del bloque, este hilo lee siempre de la BD."""
+        self._local.live = True
+        try:
+            yield
+        finally:
+            self._local.live = False
+
+    def active(self) -> bool:
+        return self._serving and self.snapshot is not None and not self.live_reads_forced()
+
+    def rows(self, name: str) -> Optional[List[dict]]:
+        snap = self.snapshot
+        if snap is None or name not in snap:
+            return None
+        return snap.rows(name)
+
+    def table(self, name: str) -> Optional[SnapshotTable]:
+        """Vista columnar de la tabla (sin materializar filas)."""
+        snap = self.snapshot
+        if snap is None or name not in snap:
+            return None
+        return snap.table(name)
+
+    def serve_snapshot(self, reason: str = ""):
+        with self._lock:
+            if self.snapshot is None:
+                return
+            if not self._serving:
+                self._serving = True
+                self.served_since = time.time()
+            self.last_error = reason or self.last_error
+        self.start_refresh()
+
+    def start_refresh(self, warmers: Optional[List[Callable[[], object]]] = None):
+        with self._lock:
+            if warmers is not None:
+                self._warmers = list(warmers)
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._refresh_loop, name="snapshot-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while self._serving:
+            try:
+                with self.live_reads():
+                    # abre (y deja en el pool) las conexiones del warmup
+                    warm_pool(max(1, settings.DB_POOL_WARMUP))
+                    for warm in self._warmers:
+                        warm()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Refresco desde BD falló, se sigue con el snapshot: %s", e)
+                time.sleep(settings.SNAPSHOT_RETRY_S)
+                continue
+            with self._lock:
+                self._serving = False
+                self.refreshed_at = time.time()
+                self.last_error = None
+            logger.info("Topología refrescada desde BD; se deja de servir el snapshot")
+
+    def status(self) -> dict:
+        return {
+            "serving": self._serving and self.snapshot is not None,
+            "served_since": self.served_since,
+            "refreshed_at": self.refreshed_at,
+            "last_error": self.last_error,
+            "snapshot": self.snapshot.info() if self.snapshot is not None else None,
+        }
+
+
+store = SnapshotStore()
+
+
+def _main(argv: List[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m core.snapshot")
+    parser.add_argument("command", choices=["export", "info"])
+    parser.add_argument("path", nargs="?", default=None)
+    args = parser.parse_args(argv)
+    path = args.path or settings.SNAPSHOT_PATH
+    if args.command == "export":
+        out = export(path)
+    else:
+        snap = Snapshot(path)
+        out = snap.info()
+        snap.close()
+    print(json.dumps(out, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,208 @@
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .arrays import encode, float_array, str_array, to_list
+from .config import settings
+from .tables import load_table
+from .topo_cache import TopologyCache
+from .util import EARTH_RADIUS_M
+
+# Bits de `SpanQuality.flags`
+NO_COORDS = 1  # algún poste del span no existe o no tiene GPS
+NO_LENGTH = 2  # ni length_m ni length_span registrados
+LENGTH_M_DEVIATION = 4
+LENGTH_SPAN_DEVIATION = 8
+
+ISSUES: Dict[str, int] = {
+    "NO_COORDS": NO_COORDS,
+    "NO_LENGTH": NO_LENGTH,
+    "LENGTH_M_DEVIATION": LENGTH_M_DEVIATION,
+    "LENGTH_SPAN_DEVIATION": LENGTH_SPAN_DEVIATION,
+}
+
+CSV_COLUMNS = [
+    "cable_span_id",
+    "cable_id",
+    "cable_code",
+    "seq",
+    "from_pole_id",
+    "to_pole_id",
+    "distance_m",
+    "length_m",
+    "length_span",
+    "deviation_m",
+    "deviation_span",
+    "issues",
+]
+
+
+def haversine_m_vec(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """core.util.haversine_m sobre arreglos (nan si falta alguna coordenada)."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dl = np.radians(lon2 - lon1)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpanQuality:
+    """
+    Validación de longitudes de todos los cable_span contra la distancia de
+    gran círculo entre sus postes, en una sola pasada con arreglos.
+
+    Un largo registrado (length_m / length_span) se marca como desviado si
+    |largo - distancia| > max(SPAN_LENGTH_TOL_M, SPAN_LENGTH_TOL_PCT * distancia).
+    """
+
+    def __init__(
+        self,
+        spans: List[dict],
+        poles: List[dict],
+        tol_pct: Optional[float] = None,
+        tol_m: Optional[float] = None,
+    ):
+        self.tol_pct = settings.SPAN_LENGTH_TOL_PCT if tol_pct is None else tol_pct
+        self.tol_m = settings.SPAN_LENGTH_TOL_M if tol_m is None else tol_m
+
+        # --- postes (ordenados para codificar ids)
+        pole_ids = str_array(poles, "id")
+        order = np.argsort(pole_ids)
+        pole_ids = pole_ids[order]
+        lat = float_array(poles, "gps_lat")[order]
+        lon = float_array(poles, "gps_lon")[order]
+        # 0,0 es el valor de relleno habitual cuando no hay GPS
+        no_gps = ~np.isfinite(lat) | ~np.isfinite(lon) | ((lat == 0) & (lon == 0))
+        lat[no_gps] = np.nan
+        lon[no_gps] = np.nan
+
+        # --- spans (en el orden de la tabla: cable_id, seq)
+        self.span_ids = str_array(spans, "id")
+        self.cable_ids = str_array(spans, "cable_id")
+        self.cable_codes = [s.get("cable_code") for s in spans]
+        self.seq = [s.get("seq") for s in spans]
+        self.from_pole = str_array(spans, "from_pole_id")
+        self.to_pole = str_array(spans, "to_pole_id")
+        self.length_m = float_array(spans, "length_m")
+        self.length_span = float_array(spans, "length_span")
+
+        # posición extra con nan para postes inexistentes
+        lat, lon = np.append(lat, np.nan), np.append(lon, np.nan)
+        fi, f_ok = encode(pole_ids, self.from_pole)
+        ti, t_ok = encode(pole_ids, self.to_pole)
+        fi = np.where(f_ok, fi, len(pole_ids))
+        ti = np.where(t_ok, ti, len(pole_ids))
+        with np.errstate(invalid="ignore"):
+            self.distance_m = haversine_m_vec(lat[fi], lon[fi], lat[ti], lon[ti])
+        has_coords = np.isfinite(self.distance_m)
+
+        # --- desvíos (nan si falta el largo o las coordenadas)
+        self.deviation_m = self.length_m - self.distance_m
+        self.deviation_span = self.length_span - self.distance_m
+        allowed = np.maximum(self.tol_m, self.tol_pct * self.distance_m)
+        with np.errstate(invalid="ignore"):
+            bad_m = np.abs(self.deviation_m) > allowed
+            bad_span = np.abs(self.deviation_span) > allowed
+
+        flags = np.zeros(len(self.span_ids), dtype=np.int8)
+        flags[~has_coords] |= NO_COORDS
+        flags[np.isnan(self.length_m) & np.isnan(self.length_span)] |= NO_LENGTH
+        flags[bad_m] |= LENGTH_M_DEVIATION
+        flags[bad_span] |= LENGTH_SPAN_DEVIATION
+        self.flags = flags
+
+        # peor desvío absoluto primero; sin coordenadas al final
+        worst = np.fmax(np.abs(self.deviation_m), np.abs(self.deviation_span))
+        self._rank = np.where(has_coords, np.nan_to_num(worst, nan=0.0), -1.0)
+
+    def __len__(self) -> int:
+        return len(self.span_ids)
+
+    def mask(self, only_flagged: bool = True, issue: Optional[str] = None) -> np.ndarray:
+        if issue is not None:
+            return (self.flags & ISSUES[issue]) != 0
+        if only_flagged:
+            return self.flags != 0
+        return np.ones(len(self.flags), dtype=bool)
+
+    def select(self, mask: np.ndarray) -> np.ndarray:
+        """Posiciones de `mask` ordenadas por severidad."""
+        sel = np.flatnonzero(mask)
+        return sel[np.argsort(-self._rank[sel], kind="stable")]
+
+    def summary(self) -> dict:
+        with np.errstate(invalid="ignore"):
+            total_dist = float(np.nansum(self.distance_m))
+        return {
+            "spans": len(self),
+            "flagged": int(np.count_nonzero(self.flags)),
+            "issues": {
+                name: int(np.count_nonzero(self.flags & bit)) for name, bit in ISSUES.items()
+            },
+            "distance_km_total": round(total_dist / 1000.0, 3),
+            "length_m_km_total": round(float(np.nansum(self.length_m)) / 1000.0, 3),
+            "tolerance": {"pct": self.tol_pct, "m": self.tol_m},
+        }
+
+    def _issue_names(self, flag: int) -> List[str]:
+        return [name for name, bit in ISSUES.items() if flag & bit]
+
+    def items(self, sel: np.ndarray) -> List[dict]:
+        dist = to_list(np.round(self.distance_m[sel], 2))
+        dev_m = to_list(np.round(self.deviation_m[sel], 2))
+        dev_span = to_list(np.round(self.deviation_span[sel], 2))
+        length_m = to_list(self.length_m[sel])
+        length_span = to_list(self.length_span[sel])
+        out = []
+        for k, i in enumerate(sel.tolist()):
+            out.append(
+                {
+                    "cable_span_id": self.span_ids[i].item(),
+                    "cable_id": self.cable_ids[i].item(),
+                    "cable_code": self.cable_codes[i],
+                    "seq": self.seq[i],
+                    "from_pole_id": self.from_pole[i].item(),
+                    "to_pole_id": self.to_pole[i].item(),
+                    "distance_m": dist[k],
+                    "length_m": length_m[k],
+                    "length_span": length_span[k],
+                    "deviation_m": dev_m[k],
+                    "deviation_span": dev_span[k],
+                    "issues": self._issue_names(int(self.flags[i])),
+                }
+            )
+        return out
+
+    def csv_rows(self, sel: np.ndarray, chunk: int = 50000) -> Iterator[tuple]:
+        """Filas para exportar (CSV_COLUMNS), armadas por bloques de columnas."""
+        names = {flag: "|".join(self._issue_names(flag)) for flag in range(16)}
+
+        def col(a: np.ndarray, part: np.ndarray, digits: Optional[int] = None) -> list:
+            v = a[part] if digits is None else np.round(a[part], digits)
+            return ["" if x != x else x for x in v.tolist()]
+
+        for start in range(0, len(sel), chunk):
+            part = sel[start : start + chunk]
+            idx = part.tolist()
+            yield from zip(
+                self.span_ids[part].tolist(),
+                self.cable_ids[part].tolist(),
+                ["" if self.cable_codes[i] is None else self.cable_codes[i] for i in idx],
+                ["" if self.seq[i] is None else self.seq[i] for i in idx],
+                self.from_pole[part].tolist(),
+                self.to_pole[part].tolist(),
+                col(self.distance_m, part, 2),
+                col(self.length_m, part),
+                col(self.length_span, part),
+                col(self.deviation_m, part, 2),
+                col(self.deviation_span, part, 2),
+                [names[f] for f in self.flags[part].tolist()],
+            )
+
+
+def _build_span_quality() -> SpanQuality:
+    return SpanQuality(load_table("cable_span"), load_table("pole"))
+
+
+span_quality: TopologyCache[SpanQuality] = TopologyCache("span_quality", _build_span_quality)
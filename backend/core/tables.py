@@ -0,0 +1,187 @@
+import logging
+from typing import Dict, List, Union
+
+from .analytics import fetch_analytic
+from .db import fetch_all
+from .snapshot import SnapshotTable, store
+
+logger = logging.getLogger(__name__)
+
+# Consultas masivas de topología compartidas por los builders en memoria
+# (overview, índices, grafos). Son también las tablas que se exportan al
+# snapshot binario (core.snapshot).
+TABLES: Dict[str, str] = {
+    "nodo": """
+        SELECT
+            CAST(id AS NVARCHAR(200)) AS id,
+            name AS label,
+            code,
+            type,
+            reference,
+            gps_lat,
+            gps_lon
+        FROM dbo.nodo
+    """,
+    "backbone_edges": """
+        SELECT
+            route_id,
+            CAST(from_nodo_id AS NVARCHAR(200)) AS from_nodo_id,
+            CAST(to_nodo_id   AS NVARCHAR(200)) AS to_nodo_id,
+            path_text
+        FROM dbo.vw_backbone_edges
+    """,
+    # UNION en vez de "pole_id IN (from, to)": dos joins por igualdad (hash
+    # join) en lugar de un join por OR (nested loop en DuckDB)
+    "route_mufas": """
+        SELECT ors.odf_route_id AS route_id, m.id AS mufa_id, m.code AS mufa_code
+        FROM dbo.odf_route_segment ors
+        JOIN dbo.cable_span cs ON cs.id = ors.cable_span_id
+        JOIN dbo.mufa m ON m.pole_id = cs.from_pole_id
+        UNION
+        SELECT ors.odf_route_id, m.id, m.code
+        FROM dbo.odf_route_segment ors
+        JOIN dbo.cable_span cs ON cs.id = ors.cable_span_id
+        JOIN dbo.mufa m ON m.pole_id = cs.to_pole_id
+    """,
+    "route_nodos": """
+        SELECT r.id AS route_id, o1.nodo_id AS from_nodo_id, o2.nodo_id AS to_nodo_id
+        FROM dbo.odf_route r
+        JOIN dbo.odf o1 ON o1.id = r.from_odf_id
+        JOIN dbo.odf o2 ON o2.id = r.to_odf_id
+    """,
+    "route_ends": """
+        SELECT e.odf_route_id AS route_id,
+               o1.nodo_id AS from_nodo_id, o2.nodo_id AS to_nodo_id,
+               e.from_pole_id, e.to_pole_id, e.rn_first, e.rn_last
+        FROM (
+            SELECT odf_route_id, from_pole_id, to_pole_id,
+                   ROW_NUMBER() OVER (PARTITION BY odf_route_id ORDER BY seg_seq) AS rn_first,
+                   ROW_NUMBER() OVER (PARTITION BY odf_route_id ORDER BY seg_seq DESC) AS rn_last
+            FROM dbo.vw_route_segments_expanded
+        ) e
+        JOIN dbo.odf_route r ON r.id = e.odf_route_id
+        JOIN dbo.odf o1 ON o1.id = r.from_odf_id
+        JOIN dbo.odf o2 ON o2.id = r.to_odf_id
+        WHERE e.rn_first = 1 OR e.rn_last = 1
+    """,
+    "odf_route_segment": "SELECT odf_route_id, cable_span_id FROM dbo.odf_route_segment",
+    "pole": "SELECT p.* FROM dbo.pole p",
+    "mufa": """
+        SELECT m.*, COALESCE(sc.splice_count, 0) AS splice_count
+        FROM dbo.mufa m
+        LEFT JOIN (
+            SELECT mufa_id, COUNT(*) AS splice_count
+            FROM dbo.splice
+            GROUP BY mufa_id
+        ) sc ON sc.mufa_id = m.id
+    """,
+    "cable": "SELECT id, code, fiber_count FROM dbo.cable",
+    "cable_span": """
+        SELECT s.*,
+            c.code as cable_code,
+            c.fiber_count,
+            c.material_type,
+            c.jacket_type
+        FROM dbo.cable_span s
+        JOIN dbo.cable c on c.id = s.cable_id
+        ORDER BY s.cable_id, s.seq
+    """,
+    "fiber_filament": "SELECT id, cable_id FROM dbo.fiber_filament",
+    "used_filament": """
+        SELECT fiber_filament_id AS fid FROM dbo.odf_port_fiber
+        UNION
+        SELECT a_fiber_filament_id FROM dbo.splice
+        UNION
+        SELECT b_fiber_filament_id FROM dbo.splice
+    """,
+    "splice": "SELECT id, mufa_id, a_fiber_filament_id, b_fiber_filament_id FROM dbo.splice",
+    "odf_port_fiber": """
+        SELECT opf.odf_port_id, opf.fiber_filament_id, op.odf_id, o.nodo_id
+        FROM dbo.odf_port_fiber opf
+        JOIN dbo.odf_port op ON op.id = opf.odf_port_id
+        JOIN dbo.odf o ON o.id = op.odf_id
+    """,
+    "graph_node_position": "SELECT node_id, x, y FROM dbo.graph_node_position",
+}
+
+# Tablas que pueden leerse de la copia analítica (core.analytics, familia
+# "topology"). Las posiciones cambian sin subir topology_version: siempre BD.
+ANALYTIC_TABLES = tuple(name for name in TABLES if name != "graph_node_position")
+
+# Inventario de todas las rutas (familia "inventory"): mismos totales que
+# GET /topology/routes/{route_id}/inventory, en una sola agregación.
+ROUTE_INVENTORY_SQL = """
+    WITH segs AS (
+        SELECT e.odf_route_id AS route_id, e.cable_id, cs.length_m,
+               cs.from_pole_id, cs.to_pole_id
+        FROM dbo.vw_route_segments_expanded e
+        JOIN dbo.cable_span cs ON cs.id = e.cable_span_id
+    ),
+    route_poles AS (
+        SELECT route_id, from_pole_id AS pole_id FROM segs
+        UNION
+        SELECT route_id, to_pole_id FROM segs
+    ),
+    pole_counts AS (
+        SELECT rp.route_id,
+               COUNT(*) AS pole_count,
+               SUM(COALESCE(mc.c, 0)) AS mufa_count
+        FROM route_poles rp
+        LEFT JOIN (
+            SELECT pole_id, COUNT(*) AS c FROM dbo.mufa GROUP BY pole_id
+        ) mc ON mc.pole_id = rp.pole_id
+        GROUP BY rp.route_id
+    )
+    SELECT s.route_id,
+           COUNT(*) AS span_count,
+           COUNT(DISTINCT s.cable_id) AS cable_count,
+           SUM(COALESCE(s.length_m, 0)) AS total_length_m,
+           pc.pole_count,
+           pc.mufa_count
+    FROM segs s
+    JOIN pole_counts pc ON pc.route_id = s.route_id
+    GROUP BY s.route_id, pc.pole_count, pc.mufa_count
+    ORDER BY s.route_id
+"""
+
+
+# Filas de fetch_all o la vista columnar del snapshot (ver load_columns)
+Columns = Union[List[dict], SnapshotTable]
+
+
+def load_columns(name: str) -> Columns:
+    """
+    Como load_table, pero mientras se sirve desde el snapshot devuelve la
+    vista columnar del mmap en vez de filas: para consumidores que sólo usan
+    len() / core.arrays.str_array / float_array, así cada worker no arma
+    dicts por fila de las tablas grandes.
+    """
+    if store.active():
+        table = store.table(name)
+        if table is not None:
+            return table
+    return load_table(name)
+
+
+def load_table(name: str) -> List[dict]:
+    """
+    Filas de una tabla de topología. Mientras la app sirve desde el snapshot
+    (arranque en frío o BD caída) se leen del archivo mapeado; si no, de la
+    BD. Si la BD falla y el snapshot tiene la tabla, se cae al snapshot y se
+    programa el refresco en segundo plano.
+    """
+    if store.active():
+        rows = store.rows(name)
+        if rows is not None:
+            return rows
+    try:
+        if name in ANALYTIC_TABLES:
+            return fetch_analytic("topology", TABLES[name])
+        return fetch_all(TABLES[name])
+    except Exception as e:
+        rows = None if store.live_reads_forced() else store.rows(name)
+        if rows is None:
+            raise
+        logger.warning("BD no disponible leyendo %s, se sirve desde el snapshot: %s", name, e)
+        store.serve_snapshot(str(e))
+        return rows
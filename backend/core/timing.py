@@ -0,0 +1,308 @@
+import hmac
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from .config import settings
+from .responses import dumps
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback sin orjson instalado
+    orjson = None
+
+
+class RequestTimer:
+    """
+    Tiempos por etapa de un request con `?debug_timing=1` (o `?profile=`).
+    `lap(nombre)` suma el tiempo desde la marca anterior; las etapas que se
+    repiten (ej. dos grafos de ruta en una capa) se acumulan.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages: Dict[str, float] = {}
+
+    def mark(self):
+        self._last = time.perf_counter()
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self._last)
+        self._last = now
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def timings(self) -> Dict[str, float]:
+        out = {k: round(v * 1000.0, 3) for k, v in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self.started) * 1000.0, 3)
+        return out
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{re.sub(r'[^A-Za-z0-9_.-]', '_', k)};dur={v}" for k, v in self.timings().items()
+        )
+
+
+_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+# Sin timer activo cada llamada es un ContextVar.get() y un `is None`
+def active() -> bool:
+    return _timer.get() is not None
+
+
+def mark():
+    t = _timer.get()
+    if t is not None:
+        t.mark()
+
+
+def lap(name: str):
+    t = _timer.get()
+    if t is not None:
+        t.lap(name)
+
+
+def record(name: str, seconds: float):
+    t = _timer.get()
+    if t is not None:
+        t.add(name, seconds)
+
+
+# ----------------------------------------------------------------------
+# Profiler por muestreo (?profile=1, sólo admin)
+# ----------------------------------------------------------------------
+_STDLIB_RE = re.compile(r"^.*/lib/python\d+\.\d+/")
+
+
+def _frame_name(code) -> str:
+    filename = code.co_filename.replace("\\", "/")
+    for marker in ("/site-packages/", "/backend/"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = _STDLIB_RE.sub("", filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Muestrea cada `interval_s` las pilas de los hilos que están ejecutando el
+    endpoint del request (su código aparece en la pila). Las pilas se recortan
+    desde el endpoint hacia abajo y se cuentan en formato "collapsed"
+    (`a;b;c N`), el que leen flamegraph.pl, speedscope e inferno.
+    """
+
+    def __init__(self, scope: dict, interval_s: float):
+        self.scope = scope
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _endpoint_code(self):
+        endpoint = self.scope.get("endpoint")
+        while endpoint is not None and hasattr(endpoint, "__wrapped__"):
+            endpoint = endpoint.__wrapped__
+        return getattr(endpoint, "__code__", None)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            target = self._endpoint_code()
+            if target is None:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack: List[str] = []
+                f = frame
+                while f is not None:
+                    stack.append(_frame_name(f.f_code))
+                    if f.f_code is target:
+                        break
+                    f = f.f_back
+                if f is None:
+                    continue
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 25) -> List[dict]:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [
+            {"frame": name, "self": c, "total": total[name]} for name, c in own.most_common(n)
+        ]
+
+
+def _is_admin(scope: dict) -> bool:
+    if not settings.ADMIN_TOKEN:
+        return False
+    for k, v in scope.get("headers", ()):
+        if k == b"x-admin-token":
+            return hmac.compare_digest(v.decode("latin-1"), settings.ADMIN_TOKEN)
+    return False
+
+
+def _flag(params: Dict[str, List[str]], name: str) -> Optional[str]:
+    values = params.get(name)
+    if not values or values[-1].lower() in ("", "0", "false", "no"):
+        return None
+    return values[-1].lower()
+
+
+class TimingMiddleware:
+    """
+    Middleware ASGI de diagnóstico por request:
+
+    - `?debug_timing=1`: activa el RequestTimer del request; la respuesta
+      lleva `Server-Timing` y, si es un objeto JSON, `meta.timings`.
+    - `?profile=1` (o `profile=collapsed`): sólo con `X-Admin-Token` igual a
+      ADMIN_TOKEN. Ejecuta el request con el profiler por muestreo y responde
+      el reporte en vez del payload (JSON, o texto collapsed).
+
+    Sin esos parámetros no se toca el request (una búsqueda en el query string).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        qs = scope.get("query_string", b"") if scope["type"] == "http" else b""
+        if b"debug_timing=" not in qs and b"profile=" not in qs:
+            await self.app(scope, receive, send)
+            return
+        params = parse_qs(qs.decode("latin-1"), keep_blank_values=True)
+        profile = _flag(params, "profile")
+        if profile is not None:
+            await self._profile(scope, receive, send, profile)
+        elif _flag(params, "debug_timing") is not None:
+            await self._timed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _timed(self, scope, receive, send):
+        timer = RequestTimer()
+        token = _timer.set(timer)
+        start: Optional[dict] = None
+        chunks: List[bytes] = []
+
+        async def send_timed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers") or [])
+                json_body = (
+                    headers.get(b"content-type", b"").startswith(b"application/json")
+                    and b"content-encoding" not in headers
+                )
+                if json_body:
+                    start = message  # se completa al tener el body
+                    return
+                message = _with_header(message, b"server-timing", timer.server_timing())
+                await send(message)
+                return
+            if message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                body = _inject_timings(b"".join(chunks), timer.timings())
+                headers = [
+                    (k, v) for k, v in start.get("headers") or [] if k != b"content-length"
+                ]
+                headers.append((b"content-length", str(len(body)).encode()))
+                headers.append((b"server-timing", timer.server_timing().encode()))
+                await send({**start, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _timer.reset(token)
+
+    async def _profile(self, scope, receive, send, mode: str):
+        if not _is_admin(scope):
+            await _send_body(send, 403, b"application/json", dumps({"detail": "PROFILE_FORBIDDEN"}))
+            return
+        timer = RequestTimer()
+        token = _timer.set(timer)
+        profiler = SamplingProfiler(scope, settings.PROFILE_INTERVAL_MS / 1000.0)
+        status = 500
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profiler.stop()
+            _timer.reset(token)
+
+        if mode == "collapsed":
+            await _send_body(send, 200, b"text/plain; charset=utf-8", profiler.collapsed().encode())
+            return
+        report = {
+            "path": scope.get("path"),
+            "status": status,
+            "interval_ms": settings.PROFILE_INTERVAL_MS,
+            "samples": profiler.samples,
+            "timings": timer.timings(),
+            "top": profiler.top(),
+            "collapsed": profiler.collapsed().splitlines(),
+        }
+        await _send_body(send, 200, b"application/json", dumps(report))
+
+
+def _with_header(message: dict, name: bytes, value: str) -> dict:
+    return {**message, "headers": list(message.get("headers") or []) + [(name, value.encode())]}
+
+
+def _inject_timings(body: bytes, timings: Dict[str, float]) -> bytes:
+    try:
+        payload = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(payload, dict):
+        return body
+    meta = payload.get("meta")
+    payload["meta"] = {**(meta if isinstance(meta, dict) else {}), "timings": timings}
+    return dumps(payload)
+
+
+async def _send_body(send, status: int, content_type: bytes, body: bytes):
+    headers: List[Tuple[bytes, bytes]] = [
+        (b"content-type", content_type),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+from .changefeed import feed
+from .config import settings
+from .snapshot import store
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TopologyCache(Generic[T]):
+    """
+    Estructura derivada de la topología (índices, grafos, agregados) que se
+    reconstruye cuando sube `feed.topology_version` o vence el TTL.
+    La construcción se serializa con un lock: requests concurrentes esperan
+    al mismo build en vez de repetirlo. Un valor construido desde el snapshot
+    de arranque (core.snapshot) deja de ser fresco cuando se vuelve a la BD.
+    """
+
+    def __init__(self, name: str, builder: Callable[[], T], ttl_s: Optional[float] = None):
+        self.name = name
+        self._builder = builder
+        self._ttl_s = settings.TOPOLOGY_CACHE_TTL_S if ttl_s is None else ttl_s
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._version = -1
+        self._built_at = 0.0
+        self._build_ms = 0.0
+        self._from_snapshot = False
+        _registry[name] = self
+
+    def _fresh(self) -> bool:
+        return (
+            self._value is not None
+            and self._version == feed.topology_version
+            and (self._ttl_s <= 0 or time.monotonic() - self._built_at < self._ttl_s)
+            and (not self._from_snapshot or store.active())
+        )
+
+    def get(self) -> T:
+        if self._fresh():
+            return self._value  # type: ignore[return-value]
+        with self._lock:
+            if self._fresh():
+                return self._value  # type: ignore[return-value]
+            version = feed.topology_version
+            t0 = time.perf_counter()
+            value = self._builder()
+            self._build_ms = (time.perf_counter() - t0) * 1000.0
+            self._value, self._version = value, version
+            self._built_at = time.monotonic()
+            self._from_snapshot = store.active()
+            logger.info(
+                "TopologyCache %s reconstruido en %.1f ms%s",
+                self.name,
+                self._build_ms,
+                " (snapshot)" if self._from_snapshot else "",
+            )
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._version = -1
+
+    def status(self) -> dict:
+        age = time.monotonic() - self._built_at if self._value is not None else None
+        return {
+            "name": self.name,
+            "built": self._value is not None,
+            "topology_version": self._version,
+            "current_topology_version": feed.topology_version,
+            "age_s": round(age, 3) if age is not None else None,
+            "build_ms": round(self._build_ms, 3),
+            "from_snapshot": self._from_snapshot,
+        }
+
+
+_registry: Dict[str, TopologyCache] = {}
+
+
+def cache_status() -> list:
+    return [c.status() for c in _registry.values()]
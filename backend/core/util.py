@@ -1,4 +1,4 @@
-from math import cos, sin, tau
+from math import asin, cos, radians, sin, sqrt, tau
 import hashlib
 
 
@@ -6,3 +6,15 @@ def _angle_from_id(node_id: str) -> float:
     h = hashlib.sha1(node_id.encode("utf-8")).digest()
     v = int.from_bytes(h[:4], "big") / 0xFFFFFFFF
     return v * tau
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de gran círculo en metros entre dos puntos GPS (grados)."""
+    p1, p2 = radians(lat1), radians(lat2)
+    dp = p2 - p1
+    dl = radians(lon2 - lon1)
+    a = sin(dp / 2) ** 2 + cos(p1) * cos(p2) * sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(sqrt(a))
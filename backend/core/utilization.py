@@ -0,0 +1,183 @@
+from typing import List, Optional
+
+import numpy as np
+
+from .arrays import encode, group_argmin, str_array, to_list
+from .fiber_paths import FilamentPaths
+from .loss_budget import loss_model
+from .tables import Columns, load_columns, load_table
+from .topo_cache import TopologyCache
+
+
+class Utilization:
+    """
+    Ocupación de hilos por cable, por cable_span y por ruta, calculada con
+    arreglos sobre ids codificados como enteros.
+
+    Un hilo se considera usado si está conectorizado en un puerto ODF
+    (odf_port_fiber) o empalmado en alguna mufa (splice, lado A o B). En el
+    cable cuenta como usado; en cada span, sólo si lo recorre (tramo entre
+    sus mufas y su ODF, core.fiber_paths), así que los spans de un mismo
+    cable pueden tener ocupación distinta. La capacidad de un cable (y de
+    sus spans) es max(cable.fiber_count, hilos registrados).
+    """
+
+    def __init__(
+        self,
+        cables: List[dict],
+        filaments: Columns,
+        used_filaments: Columns,
+        spans: List[dict],
+        route_segments: Columns,
+        paths: FilamentPaths,
+    ):
+        # --- cables
+        cable_ids = str_array(cables, "id")
+        order = np.argsort(cable_ids)
+        self.cable_ids = cable_ids[order]
+        self.cable_codes = [cables[i].get("code") for i in order.tolist()]
+        fiber_count = np.array(
+            [int(cables[i].get("fiber_count") or 0) for i in order.tolist()], dtype=np.int64
+        )
+        nc = len(self.cable_ids)
+
+        # --- hilos -> cable, usados
+        fil_ids = str_array(filaments, "id")
+        fil_cable, fil_ok = encode(self.cable_ids, str_array(filaments, "cable_id"))
+        used_ids = np.unique(str_array(used_filaments, "fid"))
+        fil_used = np.isin(fil_ids, used_ids) & fil_ok
+        self.fil_ids, self.fil_cable, self.fil_used = fil_ids, np.where(fil_ok, fil_cable, -1), fil_used
+        registered = np.bincount(fil_cable[fil_ok], minlength=nc)
+        self.cable_used = np.bincount(fil_cable[fil_used], minlength=nc)
+        self.cable_capacity = np.maximum(fiber_count, registered)
+        self.cable_free = self.cable_capacity - self.cable_used
+
+        # --- spans -> cable
+        span_ids = str_array(spans, "id")
+        order = np.argsort(span_ids)
+        self.span_ids = span_ids[order]
+        span_cable, span_ok = encode(self.cable_ids, str_array(spans, "cable_id")[order])
+        self.span_cable = np.where(span_ok, span_cable, -1)
+        self.span_capacity = np.where(span_ok, self.cable_capacity[span_cable], 0)
+        # hilos usados que recorren cada span
+        self.paths = paths
+        used_fil, used_ok = encode(paths.fil_ids, self.fil_ids[fil_used])
+        load = paths.span_load(used_fil[used_ok])
+        slot_span, slot_ok = encode(self.span_ids, paths.span_ids)
+        self.span_used = np.zeros(len(self.span_ids), dtype=np.int64)
+        self.span_used[slot_span[slot_ok]] = load[slot_ok]
+        self.span_used[~span_ok] = 0
+        self.span_free = self.span_capacity - self.span_used
+
+        # --- rutas: cuello de botella = span con menos hilos libres
+        seg_route = str_array(route_segments, "odf_route_id")
+        seg_span, seg_ok = encode(self.span_ids, str_array(route_segments, "cable_span_id"))
+        self.route_ids, seg_route_ix = np.unique(seg_route[seg_ok], return_inverse=True)
+        seg_span = seg_span[seg_ok]
+        self.seg_route, self.seg_span = seg_route_ix, seg_span
+        nr = len(self.route_ids)
+        self.route_span_count = np.bincount(seg_route_ix, minlength=nr)
+        pick = group_argmin(seg_route_ix, self.span_free[seg_span], nr)
+        self.route_bottleneck_span = np.where(pick >= 0, seg_span[np.maximum(pick, 0)], -1)
+
+    @property
+    def filament_totals(self) -> dict:
+        cap = int(self.cable_capacity.sum())
+        used = int(self.cable_used.sum())
+        return {"capacity": cap, "used": used, "free": cap - used}
+
+    def _ratio(self, used: np.ndarray, cap: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(cap > 0, used / np.maximum(cap, 1), np.nan)
+        return np.round(r, 4)
+
+    def cables(self) -> List[dict]:
+        ratio = to_list(self._ratio(self.cable_used, self.cable_capacity))
+        return [
+            {
+                "cable_id": cid,
+                "code": code,
+                "capacity": cap,
+                "used": used,
+                "free": cap - used,
+                "utilization": r,
+            }
+            for cid, code, cap, used, r in zip(
+                self.cable_ids.tolist(),
+                self.cable_codes,
+                self.cable_capacity.tolist(),
+                self.cable_used.tolist(),
+                ratio,
+            )
+        ]
+
+    def spans(self, mask: Optional[np.ndarray] = None) -> List[dict]:
+        sel = np.arange(len(self.span_ids)) if mask is None else np.flatnonzero(mask)
+        cable_ids = self.cable_ids.tolist()
+        ratio = to_list(self._ratio(self.span_used[sel], self.span_capacity[sel]))
+        return [
+            {
+                "cable_span_id": sid,
+                "cable_id": cable_ids[c] if c >= 0 else None,
+                "capacity": cap,
+                "used": used,
+                "free": cap - used,
+                "utilization": r,
+            }
+            for sid, c, cap, used, r in zip(
+                self.span_ids[sel].tolist(),
+                self.span_cable[sel].tolist(),
+                self.span_capacity[sel].tolist(),
+                self.span_used[sel].tolist(),
+                ratio,
+            )
+        ]
+
+    def route_span_mask(self, route_id: str) -> np.ndarray:
+        mask = np.zeros(len(self.span_ids), dtype=bool)
+        hit = np.flatnonzero(self.route_ids == route_id)
+        if len(hit):
+            mask[self.seg_span[self.seg_route == hit[0]]] = True
+        return mask
+
+    def routes(self, route_id: Optional[str] = None) -> List[dict]:
+        if route_id is not None:
+            sel = np.flatnonzero(self.route_ids == route_id)
+        else:
+            sel = np.arange(len(self.route_ids))
+        out = []
+        span_ids = self.span_ids
+        for i in sel.tolist():
+            b = int(self.route_bottleneck_span[i])
+            item = {
+                "route_id": self.route_ids[i].item(),
+                "span_count": int(self.route_span_count[i]),
+                "bottleneck": None,
+            }
+            if b >= 0:
+                cap = int(self.span_capacity[b])
+                used = int(self.span_used[b])
+                c = int(self.span_cable[b])
+                item["bottleneck"] = {
+                    "cable_span_id": span_ids[b].item(),
+                    "cable_id": self.cable_ids[c].item() if c >= 0 else None,
+                    "capacity": cap,
+                    "used": used,
+                    "free": cap - used,
+                }
+            out.append(item)
+        return out
+
+
+def _build_utilization() -> Utilization:
+    return Utilization(
+        load_table("cable"),
+        load_columns("fiber_filament"),
+        load_columns("used_filament"),
+        load_table("cable_span"),
+        load_columns("odf_route_segment"),
+        loss_model.get().paths,
+    )
+
+
+utilization: TopologyCache[Utilization] = TopologyCache("utilization", _build_utilization)
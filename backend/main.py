@@ -1,15 +1,92 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from api.routes_graph import router as graph_router
+from api.routes_graph import (
+    build_overview_artifacts,
+    overview_artifacts,
+    router as graph_router,
+    warm_overview,
+)
 from api.routes_positions import router as pos_router
 from api.routes_topology import router as topo_router
 from api.routes_fibers import router as fibers_router
+from api.routes_events import router as events_router
+from api.routes_search import router as search_router
+from api.routes_import import router as import_router
+from api.routes_export import router as export_router
 
+from core.admission import AdmissionMiddleware, admission_status
+from core.analytics import analytics
 from core.config import settings
+from core.materialized import start_warm as warm_materialized
+from core.offload import OffloadError, offload
+from core.pole_index import pole_index
+from core.routing import pole_graph
+from core.singleflight import singleflight_status
+from core.snapshot import store as snapshot_store
+from core.timing import TimingMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Snapshot de topología: se sirve de inmediato y la BD se lee en segundo
+    # plano; cuando el overview e índices están armados desde BD se cambia.
+    if settings.SNAPSHOT_PATH:
+        try:
+            if snapshot_store.open(settings.SNAPSHOT_PATH):
+                snapshot_store.start_refresh([warm_overview, pole_index.get, pole_graph.get])
+        except Exception:
+            logger.exception("No se pudo abrir el snapshot %s", settings.SNAPSHOT_PATH)
+
+    # Pre-calentamos el pool para que los primeros requests no paguen el
+    # connect ODBC. Si la BD no responde, la app arranca igual. Con snapshot
+    # lo hace el hilo de refresco, para no demorar el arranque.
+    if settings.DB_POOL_WARMUP > 0 and not snapshot_store.active():
+        try:
+            n = await run_in_threadpool(warm_pool)
+            logger.info("Pool de BD pre-calentado con %s conexiones", n)
+        except Exception:
+            logger.exception("No se pudo pre-calentar el pool de BD")
+
+    if offload.enabled:
+        try:
+            await run_in_threadpool(offload.start)
+        except Exception:
+            logger.exception("No se pudieron iniciar los workers de armado")
+
+    if settings.DB_READ_REPLICAS:
+        try:
+            await run_in_threadpool(read_router.check_all)
+        except Exception:
+            logger.exception("No se pudieron chequear las réplicas de lectura")
+        read_router.start_checks()
 
-app = FastAPI(title="AUTIN Backbone API", version="0.1.0")
+    # Copia DuckDB para consultas analíticas: se exporta en segundo plano
+    analytics.start_refresh()
+    # Vistas materializadas (segmentos, backbone, resumen físico)
+    warm_materialized()
+    # Overview pre-comprimido en disco: se re-publica con cada versión nueva
+    overview_artifacts.start(build_overview_artifacts, settings.OVERVIEW_ARTIFACT_POLL_S)
+    yield
+    overview_artifacts.stop()
+    analytics.stop()
+    read_router.stop_checks()
+    offload.shutdown()
 
+
+app = FastAPI(title="AUTIN Backbone API", version="0.1.0", lifespan=lifespan)
+
+# Antes que CORS: CORS queda por fuera y también agrega headers a los 503
+app.add_middleware(AdmissionMiddleware)
+# Por fuera de la admisión: ?debug_timing también mide la espera en cola
+app.add_middleware(TimingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.CORS_ORIGINS] or ["*"],
@@ -18,19 +95,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(OffloadError)
+async def offload_error_handler(request: Request, exc: OffloadError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": "1"},
+    )
+
+
 app.include_router(graph_router)
 app.include_router(pos_router)
 app.include_router(topo_router)
 app.include_router(fibers_router)
+app.include_router(events_router)
+app.include_router(search_router)
+app.include_router(import_router)
+app.include_router(export_router)
 
 # Health
-from core.db import get_engine
+from core.db import connect, pool_status, read_router, warm_pool
 from sqlalchemy import text
 
 
 @app.get("/health/db")
 def health_db():
-    eng = get_engine()
-    with eng.connect() as conn:
+    with connect() as conn:
         conn.execute(text("SELECT 1"))
     return {"ok": True}
+
+
+@app.get("/health/db/pool")
+def health_db_pool():
+    """
+    Estadísticas del pool (engine.pool.status / checkedin / checkedout) sin
+    tomar ni abrir conexiones: el probe no compite con los requests por el
+    pool. `ok` es False sólo si el pool está saturado (todas las conexiones
+    en uso, incluido el overflow). La conectividad se prueba en /health/db.
+    """
+    status = pool_status()
+    saturated = bool(status["initialized"]) and (
+        status["checked_out"] >= status["size"] + status["max_overflow"]
+    )
+    return {"ok": not saturated, "saturated": saturated, "pool": status}
+
+
+@app.get("/health/db/replicas")
+def health_db_replicas():
+    """Réplicas de lectura: salud, lecturas servidas y tablas fijadas al primario."""
+    return read_router.status()
+
+
+@app.get("/health/analytics")
+def health_analytics():
+    """Backend analítico: frescura de la copia DuckDB y consultas por backend."""
+    return analytics.status()
+
+
+@app.get("/health/artifacts")
+def health_artifacts():
+    """Overview pre-comprimido: versión publicada, tamaños y requests servidos del disco."""
+    return overview_artifacts.status()
+
+
+@app.get("/health/snapshot")
+def health_snapshot():
+    """Estado del snapshot de arranque: si se está sirviendo y su antigüedad."""
+    return snapshot_store.status()
+
+
+@app.get("/health/offload")
+def health_offload():
+    """Estado y métricas del armado de grafos en procesos aparte."""
+    return offload.status()
+
+
+@app.get("/health/singleflight")
+def health_singleflight():
+    """Ejecuciones vs. requests coalescidos por endpoint."""
+    return singleflight_status()
+
+
+@app.get("/health/admission")
+def health_admission():
+    """Cupos, profundidad de cola, esperas y rechazos por clase de endpoint."""
+    return admission_status()